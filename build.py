@@ -15,10 +15,25 @@ if sys.version_info < (3,6):
 
 
 @click.command()
-def build_cmd():
-    data = load_data_processed()
+@click.option('--bulk', is_flag=True, help="Write rows using batched inserts instead of the ORM")
+@click.option('--fast', is_flag=True, help="Build in memory and write the database once complete")
+@click.option('--incremental', is_flag=True, help="Only rebuild tables whose source files changed")
+@click.option('--parallel', is_flag=True, help="Build each component in a separate process")
+@click.option('--parallel-validation', is_flag=True, help="Run the validators in separate processes")
+@click.option('--incremental-validation', is_flag=True,
+    help="Only validate entries that changed since the last successful validation")
+@click.option('--snapshots', type=click.Path(file_okay=False),
+    help="Also write a binary snapshot of each processed data map to this folder")
+def build_cmd(bulk, fast, incremental, parallel, parallel_validation, incremental_validation, snapshots):
+    data = load_data_processed(
+        parallel_validation=parallel_validation,
+        incremental_validation=incremental_validation)
     output_filename = 'mhw.db'
-    build.build_sql_database(output_filename, data)
+    build.build_sql_database(output_filename, data,
+        bulk=bulk, fast=fast, incremental=incremental, parallel=parallel)
+
+    if snapshots:
+        build.write_snapshots(snapshots, data)
     
 if __name__ == '__main__':
     build_cmd()
@@ -6,3 +6,4 @@ and can use it to create a build result
 """
 
 from .sql import build_sql_database
+from .snapshots import write_snapshots
@@ -0,0 +1,87 @@
+"""
+Tracks the source_data files a database was built from, to support incremental builds.
+
+The manifest is stored as an extra table in the built database.
+It maps each source file to a content hash and to the tables built from it,
+and stores a signature of the code the database was built with.
+The table is only written by incremental builds, regular builds do not contain it.
+"""
+
+import os
+
+import sqlalchemy
+from sqlalchemy import Table, Column, MetaData, Text
+
+from mhdata.util import hash_file
+
+manifest_metadata = MetaData()
+
+manifest_table = Table('build_manifest', manifest_metadata,
+    Column('path', Text, primary_key=True),
+    Column('hash', Text),
+    Column('tables', Text))
+
+# Path of the row storing the code signature. Colons can't appear in source file paths
+CODE_SIGNATURE_PATH = ':code_signature'
+
+
+def hash_source_files(data_path):
+    "Returns a dictionary of relative path -> content hash for every file in data_path"
+    results = {}
+    for root, dirs, files in os.walk(data_path):
+        dirs.sort()
+        for filename in sorted(files):
+            full_path = os.path.join(root, filename)
+            rel_path = os.path.relpath(full_path, data_path).replace(os.sep, '/')
+            results[rel_path] = hash_file(full_path)
+    return results
+
+
+def get_changed_files(old_hashes, new_hashes):
+    "Returns the set of paths that were added, removed, or modified"
+    all_paths = set(old_hashes.keys()) | set(new_hashes.keys())
+    return { path for path in all_paths if old_hashes.get(path) != new_hashes.get(path) }
+
+
+def _create_engine(db_filename):
+    return sqlalchemy.create_engine(f'sqlite:///{db_filename}', echo=False)
+
+
+def read_manifest(db_filename):
+    """Returns the stored manifest as (code signature, path -> (hash, list of tables)).
+    Returns None if the database or the manifest table doesn't exist."""
+    if not os.path.exists(db_filename):
+        return None
+
+    engine = _create_engine(db_filename)
+    if not engine.dialect.has_table(engine, manifest_table.name):
+        return None
+
+    code_signature = None
+    results = {}
+    for row in engine.execute(manifest_table.select()):
+        if row['path'] == CODE_SIGNATURE_PATH:
+            code_signature = row['hash']
+            continue
+        tables = row['tables'].split(',') if row['tables'] else []
+        results[row['path']] = (row['hash'], tables)
+    return (code_signature, results)
+
+
+def write_manifest(db_filename, hashes, tables_by_path, code_signature):
+    """Replaces the manifest stored in the database.
+    hashes is path -> hash, and tables_by_path is path -> list of table names.
+    code_signature identifies the build code, see mhdata.load.cache.get_code_signature()"""
+    engine = _create_engine(db_filename)
+    manifest_table.create(engine, checkfirst=True)
+
+    rows = [{
+        'path': path,
+        'hash': file_hash,
+        'tables': ','.join(tables_by_path.get(path, []))
+    } for path, file_hash in hashes.items()]
+    rows.append({ 'path': CODE_SIGNATURE_PATH, 'hash': code_signature, 'tables': '' })
+
+    with engine.begin() as connection:
+        connection.execute(manifest_table.delete())
+        connection.execute(manifest_table.insert(), rows)
@@ -0,0 +1,62 @@
+"""
+Support for building the database in parallel.
+
+Each build step is built into its own temporary SQLite file (a shard) in a separate process.
+The shards are then copied into the final database in a fixed order using ATTACH,
+so the generated ids and row order are the same as a sequential build.
+"""
+
+import multiprocessing
+import os.path
+
+import mhdata.sql as db
+
+# Worker process state, set by the pool initializer
+_worker_mhdata = None
+_worker_bulk = False
+
+def _init_worker(mhdata, bulk):
+    global _worker_mhdata, _worker_bulk
+    _worker_mhdata = mhdata
+    _worker_bulk = bulk
+
+def _build_shard(step, shard_filename):
+    "Runs in a worker process. Builds a single step into a shard database"
+    sessionbuilder = db.recreate_database(shard_filename, bulk=_worker_bulk)
+    with db.session_scope(sessionbuilder) as session:
+        step.build_fn(session, _worker_mhdata)
+    return shard_filename
+
+def build_shards(mhdata, steps, shard_dir, *, bulk=False, processes=None):
+    """Builds each step into a separate database in shard_dir using a process pool.
+    Returns a list of (step, shard filename) tuples in the same order as steps."""
+    shard_filenames = [
+        os.path.join(shard_dir, f'shard_{idx}_{step.build_fn.__name__}.db')
+        for idx, step in enumerate(steps)]
+
+    with multiprocessing.Pool(processes, _init_worker, (mhdata, bulk)) as pool:
+        pool.starmap(_build_shard, zip(steps, shard_filenames))
+
+    return list(zip(steps, shard_filenames))
+
+def _dbapi_connection(session):
+    "Returns the DBAPI connection used by an ORM session or BulkSession"
+    if isinstance(session, db.BulkSession):
+        return session.connection()
+    return session.connection().connection
+
+def merge_shards(session, shards):
+    """Copies the tables of each (step, shard filename) into the session's database.
+    Shards are copied in the given order, and rows are copied in rowid order.
+    The session is committed first, as ATTACH cannot run inside a transaction."""
+    session.commit()
+    connection = _dbapi_connection(session)
+
+    for step, shard_filename in shards:
+        connection.execute("ATTACH DATABASE ? AS shard", (shard_filename,))
+        for table_name in step.table_names():
+            connection.execute(
+                f'INSERT INTO main."{table_name}" ' +
+                f'SELECT * FROM shard."{table_name}" ORDER BY rowid')
+        connection.commit()
+        connection.execute("DETACH DATABASE shard")
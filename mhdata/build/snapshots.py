@@ -0,0 +1,20 @@
+"""
+Writes binary snapshots of the processed data maps (see mhdata.io.snapshot).
+
+Snapshots let other programs, like query workers, open the processed data
+without loading the source data or running the schemas.
+"""
+
+import os
+from os.path import join
+
+from mhdata.io import DataMap
+from mhdata.io.snapshot import write_snapshot
+
+
+def write_snapshots(output_dir, mhdata):
+    "Writes a snapshot file named <map name>.snapshot for every data map of the loaded data"
+    os.makedirs(output_dir, exist_ok=True)
+    for name, value in vars(mhdata).items():
+        if isinstance(value, DataMap):
+            write_snapshot(value, join(output_dir, f'{name}.snapshot'))
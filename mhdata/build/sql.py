@@ -1,42 +1,137 @@
+import collections
+import tempfile
 import sqlalchemy.orm
 import mhdata.sql as db
 
 from mhdata import cfg
-from mhdata.io import DataMap
+from mhdata.io import DataMap, create_reader
 from mhdata.util import ensure, ensure_warn, get_duplicates
 from mhdata.load import datafn
+from mhdata.load.cache import get_code_signature
 
+from . import manifest
+from . import parallel as build_parallel
 from .objectindex import ObjectIndex
 
 def get_translated(obj, attr, lang):
     value = obj[attr].get(lang, None)
     return value or obj[attr]['en']
 
-def build_sql_database(output_filename, mhdata):
-    "Builds a SQLite database and outputs to output_filename"
-    sessionbuilder = db.recreate_database(output_filename)
+def build_sql_database(output_filename, mhdata, *,
+        bulk=False, fast=False, incremental=False, parallel=False):
+    """Builds a SQLite database and outputs to output_filename.
+    If bulk is true, rows are written using batched inserts instead of the ORM.
+    If fast is true, the database is built in memory and written out once complete.
+    If incremental is true, an existing database is updated by only rebuilding
+    the steps whose source files changed since the last incremental build.
+    If the mhdata code changed since then, the database is fully rebuilt.
+    If parallel is true, each build step is built in a separate process and merged.
+    All modes produce the same database contents."""
+    if incremental:
+        source_hashes = manifest.hash_source_files(create_reader().data_path)
+        code_signature = get_code_signature()
+        if update_sql_database(output_filename, mhdata, source_hashes, code_signature,
+                bulk=bulk, parallel=parallel):
+            return
+
+    if fast:
+        with db.fast_build_database(output_filename, bulk=bulk) as sessionbuilder:
+            build_components(sessionbuilder, mhdata, bulk=bulk, parallel=parallel)
+    else:
+        sessionbuilder = db.recreate_database(output_filename, bulk=bulk)
+        build_components(sessionbuilder, mhdata, bulk=bulk, parallel=parallel)
+
+    if incremental:
+        manifest.write_manifest(output_filename, source_hashes,
+            get_tables_by_path(source_hashes), code_signature)
 
+    print("Finished build")
+
+def update_sql_database(output_filename, mhdata, source_hashes, code_signature, *,
+        bulk=False, parallel=False):
+    """Rebuilds the tables of an existing database whose source files changed.
+    Returns False if the database has no manifest or was built by different code,
+    and must be fully built."""
+    stored = manifest.read_manifest(output_filename)
+    if stored is None:
+        print("No build manifest found, performing a full build")
+        return False
+
+    old_signature, old_manifest = stored
+    if old_signature != code_signature:
+        print("Build code changed, performing a full build")
+        return False
+
+    old_hashes = { path:file_hash for (path, (file_hash, _)) in old_manifest.items() }
+    changed_files = manifest.get_changed_files(old_hashes, source_hashes)
+
+    # Tables fed by the changed files. New files use the current step definitions
+    new_tables = get_tables_by_path(source_hashes)
+    affected_tables = set()
+    for path in changed_files:
+        if path in old_manifest:
+            affected_tables.update(old_manifest[path][1])
+        affected_tables.update(new_tables.get(path, []))
+
+    steps = [step for step in build_steps if affected_tables.intersection(step.table_names())]
+    if not steps:
+        print("Database is up to date")
+        return True
+
+    step_names = ', '.join(step.build_fn.__name__ for step in steps)
+    print(f"Source files changed: {', '.join(sorted(changed_files))}")
+    print(f"Rebuilding {step_names}")
+
+    sessionbuilder = db.open_database(output_filename, bulk=bulk)
+    build_components(sessionbuilder, mhdata, steps=steps, bulk=bulk, parallel=parallel)
+
+    manifest.write_manifest(output_filename, source_hashes, new_tables, code_signature)
+    print("Finished incremental build")
+    return True
+
+def get_tables_by_path(source_hashes):
+    "Returns a mapping of source file path -> names of the tables built from it"
+    results = {}
+    for path in source_hashes.keys():
+        folder = path.split('/')[0]
+        tables = []
+        for step in build_steps:
+            if folder in step.sources:
+                tables.extend(step.table_names())
+        results[path] = tables
+    return results
+
+def build_components(sessionbuilder, mhdata, steps=None, *, bulk=False, parallel=False):
+    """Builds all data components within a single session.
+    If a list of build steps is given, the tables of those steps are cleared and rebuilt.
+    Otherwise all steps are built on an empty database.
+    If parallel is true, steps are built into shard databases by worker processes
+    and then copied into the session's database."""
     with db.session_scope(sessionbuilder) as session:
-        # Add languages before starting the build
-        for language in cfg.supported_languages:
-            session.add(db.Language(
-                id=language,
-                name=cfg.all_languages[language],
-                is_complete=(language not in cfg.incomplete_languages)
-            ))
+        if steps is None:
+            steps = build_steps
+
+            # Add languages before starting the build
+            for language in cfg.supported_languages:
+                session.add(db.Language(
+                    id=language,
+                    name=cfg.all_languages[language],
+                    is_complete=(language not in cfg.incomplete_languages)
+                ))
+        else:
+            for step in steps:
+                for table_class in step.tables:
+                    session.execute(table_class.__table__.delete())
 
         # Build the individual components
         # These functions are defined lower down in the file
-        build_items(session, mhdata)
-        build_locations(session, mhdata)
-        build_monsters(session, mhdata)
-        build_skills(session, mhdata)
-        build_armor(session, mhdata)
-        build_weapons(session, mhdata)
-        build_decorations(session, mhdata)
-        build_charms(session, mhdata)
-        
-    print("Finished build")
+        if parallel:
+            with tempfile.TemporaryDirectory() as shard_dir:
+                shards = build_parallel.build_shards(mhdata, steps, shard_dir, bulk=bulk)
+                build_parallel.merge_shards(session, shards)
+        else:
+            for step in steps:
+                step.build_fn(session, mhdata)
 
 
 def build_items(session : sqlalchemy.orm.Session, mhdata):
@@ -486,15 +581,10 @@ def build_weapons(session : sqlalchemy.orm.Session, mhdata):
 
     # Prepass to determine which weapons are "final"
     # All items that are a previous to another are "not final"
-    all_final = set(weapon_map.keys())
-    for entry in weapon_map.values():
-        if not entry.get('previous_en', None):
-            continue
-        try:
-            prev_id = weapon_map.id_of('en', entry['previous_en'])
-            all_final.remove(prev_id)
-        except KeyError:
-            pass
+    weapons_by_previous = weapon_map.group_by('previous_en')
+    all_final = set(
+        entry.id for entry in weapon_map.values()
+        if entry.name('en') not in weapons_by_previous)
 
     # now iterate over actual weapons
     for idx, entry in enumerate(weapon_map.values()):
@@ -673,3 +763,32 @@ def build_charms(session : sqlalchemy.orm.Session, mhdata):
         session.add(charm)
 
     print("Built Charms")
+
+
+class BuildStep(collections.namedtuple('BuildStep', ['build_fn', 'sources', 'tables'])):
+    """A single step of the build.
+    sources are the source_data folders read by the step, including those used for id lookups.
+    tables are the mapped classes whose tables are written by the step."""
+    def table_names(self):
+        return [table_class.__tablename__ for table_class in self.tables]
+
+"The ordered list of build steps. Incremental builds use this to determine what to rebuild"
+build_steps = [
+    BuildStep(build_items, ('items',), (db.Item, db.ItemText, db.ItemCombination)),
+    BuildStep(build_locations, ('locations', 'items'),
+        (db.Location, db.LocationItem, db.LocationCamp)),
+    BuildStep(build_monsters, ('monsters', 'items', 'locations'),
+        (db.MonsterRewardConditionText, db.Monster, db.MonsterText,
+            db.MonsterHitzone, db.MonsterHitzoneText, db.MonsterBreak, db.MonsterBreakText,
+            db.MonsterReward, db.MonsterHabitat)),
+    BuildStep(build_skills, ('skills',), (db.SkillTree, db.SkillTreeText, db.Skill)),
+    BuildStep(build_armor, ('armors', 'items', 'skills', 'monsters'),
+        (db.ArmorSetBonusText, db.ArmorSetBonusSkill, db.ArmorSet, db.ArmorSetText,
+            db.Armor, db.ArmorText, db.ArmorSkill, db.ArmorRecipe)),
+    BuildStep(build_weapons, ('weapons', 'items', 'skills'),
+        (db.WeaponAmmo, db.WeaponMelody, db.WeaponMelodyText, db.Weapon, db.WeaponText,
+            db.WeaponRecipe, db.WeaponSkill)),
+    BuildStep(build_decorations, ('decorations', 'skills'), (db.Decoration, db.DecorationText)),
+    BuildStep(build_charms, ('charms', 'items', 'skills'),
+        (db.Charm, db.CharmText, db.CharmSkill, db.CharmRecipe)),
+]
@@ -0,0 +1,588 @@
+"""
+Columnar storage for DataMap entries.
+
+A regular DataMap stores every entry as a DataRow holding its own dictionary,
+and translated fields (like name and description) as a dictionary per entry.
+A ColumnStore stores the entries as columns instead: typed arrays for int, float,
+and bool fields, interned strings for text fields, and one array per language
+for translated fields. Entries are returned as ColumnRow views that read and write
+the columns, so the Mapping and DataRow APIs keep working.
+
+Notes on behavior:
+ - Values are copied into the columns. Translated fields are returned as views,
+   so editing them updates the store, but dictionaries assigned to them are not kept.
+ - Key order is kept per entry. An entry (or translated field) whose key order
+   doesn't fit the column order is stored as a plain dictionary instead (detached).
+ - A column whose values stop matching its type becomes a plain list.
+"""
+
+import array
+import collections
+import sys
+
+from collections.abc import Mapping, MutableMapping
+
+from .datarow import DataRow
+from .functions import to_basic
+
+# Marks a key that is not set for a row
+_MISSING = object()
+
+
+class ObjectColumn:
+    "A column of arbitrary values, stored in a list"
+
+    def __init__(self, size=0):
+        self.values = [_MISSING] * size
+
+    def append(self):
+        self.values.append(_MISSING)
+
+    def has(self, idx):
+        return self.values[idx] is not _MISSING
+
+    def get(self, idx):
+        return self.values[idx]
+
+    def set(self, idx, value):
+        "Sets a value, returning False if the column can't store it"
+        self.values[idx] = value
+        return True
+
+    def delete(self, idx):
+        self.values[idx] = _MISSING
+
+    def accepts(self, value):
+        return True
+
+    def scan(self, value):
+        "Returns the row indices that have the given value"
+        return [idx for idx, v in enumerate(self.values) if v is not _MISSING and v == value]
+
+
+class StrColumn(ObjectColumn):
+    """A column of strings (or None).
+    If intern is true, strings are interned, so repeated values are stored once.
+    This suits fields with few distinct values, like a weapon type."""
+
+    def __init__(self, size=0, intern=True):
+        super().__init__(size)
+        self.intern = intern
+
+    def accepts(self, value):
+        return value is None or type(value) is str
+
+    def set(self, idx, value):
+        if value is None:
+            self.values[idx] = None
+        elif type(value) is str:
+            self.values[idx] = sys.intern(value) if self.intern else value
+        else:
+            return False
+        return True
+
+    def scan(self, value):
+        if not self.accepts(value):
+            return []
+        return super().scan(value)
+
+
+class ArrayColumn:
+    """A column of numbers stored in a typed array.
+    A separate state array tracks if the value is missing, None, or set."""
+
+    # states
+    STATE_MISSING = 0
+    STATE_NONE = 1
+    STATE_SET = 2
+
+    def __init__(self, typecode, pytype, size=0):
+        self.typecode = typecode
+        self.pytype = pytype
+        self.values = array.array(typecode, [0]) * size
+        self.states = bytearray(size)
+
+    def append(self):
+        self.values.append(0)
+        self.states.append(self.STATE_MISSING)
+
+    def has(self, idx):
+        return self.states[idx] != self.STATE_MISSING
+
+    def get(self, idx):
+        state = self.states[idx]
+        if state == self.STATE_SET:
+            return self.pytype(self.values[idx])
+        elif state == self.STATE_NONE:
+            return None
+        return _MISSING
+
+    def accepts(self, value):
+        return value is None or type(value) is self.pytype
+
+    def set(self, idx, value):
+        if value is None:
+            self.states[idx] = self.STATE_NONE
+            return True
+        if type(value) is not self.pytype:
+            return False
+
+        try:
+            self.values[idx] = value
+        except OverflowError:
+            return False
+        self.states[idx] = self.STATE_SET
+        return True
+
+    def delete(self, idx):
+        self.states[idx] = self.STATE_MISSING
+
+    def scan(self, value):
+        if value is None:
+            return [idx for idx, state in enumerate(self.states) if state == self.STATE_NONE]
+        if type(value) is not self.pytype:
+            return [idx for idx in range(len(self.states)) if self.has(idx) and self.get(idx) == value]
+        return [
+            idx for idx, (state, v) in enumerate(zip(self.states, self.values))
+            if state == self.STATE_SET and v == value]
+
+
+def IntColumn(size=0):
+    return ArrayColumn('q', int, size)
+
+def FloatColumn(size=0):
+    return ArrayColumn('d', float, size)
+
+def BoolColumn(size=0):
+    return ArrayColumn('b', bool, size)
+
+
+class MappingColumn:
+    """A column of translated fields, stored as one array per language (or other subkey).
+    Values are returned as MappingViews that read and write the arrays."""
+
+    def __init__(self, allowed_keys, size=0):
+        self.allowed_keys = allowed_keys
+        self.size = size
+        self.subcolumns = collections.OrderedDict()
+        self.present = bytearray(size)
+
+        # Row index -> dict for values whose key order doesn't fit the subcolumns
+        self.detached = {}
+
+    def _subcolumn(self, key):
+        subcolumn = self.subcolumns.get(key, None)
+        if subcolumn is None:
+            # translated text is mostly unique, so it isn't interned
+            subcolumn = StrColumn(self.size, intern=False)
+            self.subcolumns[key] = subcolumn
+        return subcolumn
+
+    def append(self):
+        self.size += 1
+        self.present.append(0)
+        for subcolumn in self.subcolumns.values():
+            subcolumn.append()
+
+    def has(self, idx):
+        return self.present[idx] == 1
+
+    def get(self, idx):
+        if not self.present[idx]:
+            return _MISSING
+        return MappingView(self, idx)
+
+    def accepts(self, value):
+        if not isinstance(value, Mapping):
+            return False
+        return all(k in self.allowed_keys and (v is None or type(v) is str) for k, v in value.items())
+
+    def fits_order(self, idx, key):
+        "Returns true if key can be set for row idx without breaking its key order"
+        found = False
+        for subkey, subcolumn in self.subcolumns.items():
+            if found and subcolumn.has(idx):
+                return False
+            if subkey == key:
+                found = True
+        return True
+
+    def set(self, idx, value):
+        if not self.accepts(value):
+            return False
+
+        items = list(value.items())
+        self.delete(idx)
+        self.present[idx] = 1
+        for key, subvalue in items:
+            self.set_subvalue(idx, key, subvalue)
+        return True
+
+    def set_subvalue(self, idx, key, value):
+        detached = self.detached.get(idx, None)
+        if detached is not None:
+            detached[key] = value
+            return
+
+        subcolumn = self._subcolumn(key)
+        if subcolumn.has(idx) or self.fits_order(idx, key):
+            if subcolumn.set(idx, value):
+                return
+
+        # Doesn't fit, so store this row's value as a plain dictionary
+        detached = dict(MappingView(self, idx).items())
+        for subcolumn in self.subcolumns.values():
+            subcolumn.delete(idx)
+        detached[key] = value
+        self.detached[idx] = detached
+
+    def delete(self, idx):
+        self.present[idx] = 0
+        self.detached.pop(idx, None)
+        for subcolumn in self.subcolumns.values():
+            subcolumn.delete(idx)
+
+    def scan(self, value):
+        if not isinstance(value, Mapping):
+            return []
+        return [idx for idx in range(self.size) if self.present[idx] and self.get(idx) == value]
+
+
+class MappingView(MutableMapping):
+    "A live view over a single row of a MappingColumn"
+
+    def __init__(self, column, idx):
+        self._column = column
+        self._idx = idx
+
+    def __getitem__(self, key):
+        detached = self._column.detached.get(self._idx, None)
+        if detached is not None:
+            return detached[key]
+
+        subcolumn = self._column.subcolumns.get(key, None)
+        value = subcolumn.get(self._idx) if subcolumn else _MISSING
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._column.set_subvalue(self._idx, key, value)
+
+    def __delitem__(self, key):
+        detached = self._column.detached.get(self._idx, None)
+        if detached is not None:
+            del detached[key]
+            return
+
+        subcolumn = self._column.subcolumns.get(key, None)
+        if not subcolumn or not subcolumn.has(self._idx):
+            raise KeyError(key)
+        subcolumn.delete(self._idx)
+
+    def __iter__(self):
+        detached = self._column.detached.get(self._idx, None)
+        if detached is not None:
+            return iter(list(detached.keys()))
+        return iter([k for k, c in self._column.subcolumns.items() if c.has(self._idx)])
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def __reduce__(self):
+        # copies and pickles become regular dictionaries
+        return (dict, (dict(self.items()),))
+
+
+def _create_column(value, translated_keys, size):
+    "Creates the best fitting empty column for a value"
+    value_type = type(value)
+    if value_type is bool:
+        return BoolColumn(size)
+    elif value_type is int:
+        return IntColumn(size)
+    elif value_type is float:
+        return FloatColumn(size)
+    elif value_type is str or value is None:
+        return StrColumn(size)
+
+    mapping_column = MappingColumn(translated_keys, size)
+    if mapping_column.accepts(value):
+        return mapping_column
+    return ObjectColumn(size)
+
+
+class ColumnStore(MutableMapping):
+    """Stores DataMap entries in columns.
+    Behaves like the ordered dictionary of id -> DataRow a regular DataMap uses,
+    but entries are returned as ColumnRow views.
+
+    translated_keys are the subkeys of a dictionary field that mark it as translated,
+    which is usually the list of supported languages.
+    """
+
+    def __init__(self, translated_keys):
+        self.translated_keys = frozenset(translated_keys)
+        self.columns = collections.OrderedDict()
+        self.size = 0
+
+        # id -> row index in entry order, and row index -> id
+        self.index = collections.OrderedDict()
+        self.ids = []
+
+        # Row index -> dict for rows whose key order doesn't fit the column order
+        self.detached = {}
+
+    # Row level operations
+
+    def _append_row(self, entry_id):
+        idx = self.size
+        self.size += 1
+        self.ids.append(entry_id)
+        for column in self.columns.values():
+            column.append()
+        self.index[entry_id] = idx
+        return idx
+
+    def _has_later_keys(self, idx, key):
+        "Returns true if the row has a value in a column after the key's column"
+        found = False
+        for column_key, column in self.columns.items():
+            if found and column.has(idx):
+                return True
+            if column_key == key:
+                found = True
+        return False
+
+    def _clear_row(self, idx):
+        self.detached.pop(idx, None)
+        for column in self.columns.values():
+            column.delete(idx)
+
+    def _detach_row(self, idx):
+        "Moves a row out of the columns into a plain dictionary, and returns it"
+        row = self.row_dict(idx)
+        self._clear_row(idx)
+        self.detached[idx] = row
+        return row
+
+    def _to_object_column(self, key):
+        "Converts a column to an ObjectColumn that can hold any value"
+        column = self.columns[key]
+        new_column = ObjectColumn(self.size)
+        for idx in range(self.size):
+            if column.has(idx):
+                value = column.get(idx)
+                if isinstance(value, MappingView):
+                    value = dict(value.items())
+                new_column.values[idx] = value
+        self.columns[key] = new_column
+        return new_column
+
+    def row_keys(self, idx):
+        detached = self.detached.get(idx, None)
+        if detached is not None:
+            return list(detached.keys())
+        return [key for key, column in self.columns.items() if column.has(idx)]
+
+    def row_dict(self, idx):
+        "Returns the row as a plain dictionary, with translated fields as dictionaries"
+        result = {}
+        for key in self.row_keys(idx):
+            value = self.get_value(idx, key)
+            if isinstance(value, MappingView):
+                value = dict(value.items())
+            result[key] = value
+        return result
+
+    def get_value(self, idx, key):
+        "Returns the row's value for a key, or _MISSING"
+        detached = self.detached.get(idx, None)
+        if detached is not None:
+            return detached.get(key, _MISSING)
+
+        column = self.columns.get(key, None)
+        if column is None:
+            return _MISSING
+        return column.get(idx)
+
+    def set_value(self, idx, key, value):
+        detached = self.detached.get(idx, None)
+        if detached is not None:
+            detached[key] = value
+            return
+
+        column = self.columns.get(key, None)
+        if column is None:
+            column = _create_column(value, self.translated_keys, self.size)
+            self.columns[key] = column
+        elif not column.has(idx) and self._has_later_keys(idx, key):
+            self._detach_row(idx)[key] = value
+            return
+
+        if not column.set(idx, value):
+            self._to_object_column(key).set(idx, value)
+
+    def delete_value(self, idx, key):
+        detached = self.detached.get(idx, None)
+        if detached is not None:
+            del detached[key]
+            return
+
+        column = self.columns.get(key, None)
+        if column is None or not column.has(idx):
+            raise KeyError(key)
+        column.delete(idx)
+
+    def set_row(self, idx, items):
+        "Replaces the contents of a row with the given (key, value) pairs, in order"
+        items = list(items)
+        self._clear_row(idx)
+        for key, value in items:
+            self.set_value(idx, key, value)
+
+    def scan(self, key, value):
+        "Returns the ids of the entries whose value for key equals value, in entry order"
+        matches = set()
+        column = self.columns.get(key, None)
+        if column is not None:
+            matches.update(column.scan(value))
+        for idx, row in self.detached.items():
+            if key in row and row[key] == value:
+                matches.add(idx)
+
+        ids = self.ids
+        return [ids[idx] for idx in sorted(matches) if ids[idx] is not None]
+
+    # Mapping of id -> row
+
+    def __getitem__(self, entry_id):
+        return ColumnRow(self, self.index[entry_id])
+
+    def __setitem__(self, entry_id, row):
+        idx = self.index.get(entry_id, None)
+        if idx is None:
+            idx = self._append_row(entry_id)
+        self.set_row(idx, row.items())
+
+    def __delitem__(self, entry_id):
+        # The row's values are kept, so that views of removed entries stay readable
+        idx = self.index.pop(entry_id)
+        self.ids[idx] = None
+
+    def __contains__(self, entry_id):
+        return entry_id in self.index
+
+    def __iter__(self):
+        return iter(self.index)
+
+    def __len__(self):
+        return len(self.index)
+
+    @classmethod
+    def from_rows(cls, rows, translated_keys):
+        """Creates a column store from a list of rows (DataRows or dictionaries with an id).
+        Column types are chosen by looking at all the values first"""
+        store = cls(translated_keys)
+        rows = list(rows)
+
+        # Choose the column order and type using all rows
+        key_order = {}
+        values_by_key = collections.defaultdict(list)
+        for row in rows:
+            for key, value in row.items():
+                key_order.setdefault(key, len(key_order))
+                values_by_key[key].append(value)
+
+        for key in key_order.keys():
+            values = values_by_key[key]
+            sample = next((v for v in values if v is not None), None)
+            column = _create_column(sample, store.translated_keys, 0)
+            if not all(column.accepts(v) for v in values):
+                column = ObjectColumn()
+            store.columns[key] = column
+
+        for row in rows:
+            idx = store._append_row(row['id'])
+            store.set_row(idx, row.items())
+
+        return store
+
+
+class ColumnRow(DataRow):
+    """A DataRow that is a view over a row of a ColumnStore.
+    Translated fields are returned as MappingViews."""
+
+    __slots__ = ('_store', '_idx')
+
+    def __init__(self, store: ColumnStore, idx):
+        self._store = store
+        self._idx = idx
+
+    def set_value(self, key, value, *, after=""):
+        """"Sets a value in this dictionary.
+        Same as using [key]=value, but allows an item to be placed after another"""
+        if not after:
+            self[key] = value
+            return
+
+        items = []
+        for item_key, item_value in self.items():
+            if item_key == key:
+                continue
+            items.append((item_key, item_value))
+            if item_key == after:
+                items.append((key, value))
+        if after not in self:
+            items.append((key, value))
+
+        items = [(k, dict(v.items()) if isinstance(v, MappingView) else v) for k, v in items]
+        self._store.set_row(self._idx, items)
+
+    def names(self):
+        for (lang, name) in self['name'].items():
+            yield (lang, name)
+
+    def name(self, lang_id):
+        return self['name'][lang_id]
+
+    def to_dict(self):
+        return to_basic(self)
+
+    def copy(self):
+        "Returns a copy of this row as a regular DataRow"
+        return DataRow(self.id, to_basic(self))
+
+    def get(self, key, default=None):
+        value = self._store.get_value(self._idx, key)
+        if value is _MISSING:
+            return default
+        return value
+
+    def __getitem__(self, key):
+        value = self._store.get_value(self._idx, key)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self._store.set_value(self._idx, key, value)
+
+    def __contains__(self, key):
+        return self._store.get_value(self._idx, key) is not _MISSING
+
+    def __delitem__(self, key):
+        self._store.delete_value(self._idx, key)
+
+    def __iter__(self):
+        return iter(self._store.row_keys(self._idx))
+
+    def __len__(self):
+        return len(self._store.row_keys(self._idx))
+
+    def __reduce__(self):
+        # copies and pickles become regular DataRows
+        return (DataRow, (self.id, self._store.row_dict(self._idx)))
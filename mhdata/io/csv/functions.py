@@ -1,4 +1,12 @@
+import collections
+import collections.abc
 import csv
+import decimal
+import filecmp
+import os
+import os.path
+import shutil
+import tempfile
 
 import mhdata.typecheck as typecheck
 import mhdata.util as util
@@ -7,66 +15,150 @@ def determine_fields(obj_list):
     """
     Returns the set of all possible keys in the object list
     """
-    fields = []
+    fields = collections.OrderedDict()
     for obj in obj_list:
         for key in obj.keys():
-            if key not in fields:
-                fields.append(key)
-
-    return fields
-
-def validate_csv(obj_list, filename):
-    "Minor validation. Warning for any key/value without whitespace"
-    warn_keys = False
-    warn_value_rows = []
-    for row_idx, item in enumerate(obj_list):
-        for key in item.keys():
-            if key.startswith(" ") or key.endswith(" "):
-                warn_keys = True
-
-        for column_idx, value in enumerate(item.values()):
-            if value is None:
-                continue
-
-            if value.startswith(" ") or value.endswith(" "):
-                warn_value_rows.append((row_idx + 1, column_idx + 1))
-                break
-                
-    if warn_keys:
-        print("Warning: Some keys in CSV are not trimmed: " + filename)
-    if warn_value_rows:
-        cell_strings = map(lambda c: "({0}, {1})".format(c[0], c[1]), warn_value_rows)
-        print("Warning: Some values in CSV are not trimmed: "
-            + filename + " cells: " + ", ".join(cell_strings))
+            fields[key] = True
+
+    return list(fields.keys())
+
+# Types that are always scalar, checked before falling back to typecheck.is_scalar
+_scalar_types = (str, int, float, bool, decimal.Decimal, type(None))
+
+def _write_rows(f, fields, obj_list):
+    """Writes the header and rows to a file, checking that each row is flat as it is written.
+    Returns False and stops if a row contains a key that isn't in fields."""
+    field_set = set(fields)
+    writer = csv.writer(f, lineterminator='\n')
+    writer.writerow(fields)
+    for obj in obj_list:
+        for key, value in obj.items():
+            if key not in field_set:
+                return False
+            if type(value) not in _scalar_types and not typecheck.is_scalar(value):
+                raise Exception("Cannot save CSV, the data is not completely flat")
+        writer.writerow([obj.get(key, None) for key in fields])
+    return True
+
+def create_staged(location):
+    """Creates a new temporary file next to location, to be moved into place with commit_staged().
+    The file gets the permissions of the file it replaces, or of a new file.
+    Returns a tuple (file descriptor, temporary path)."""
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(location)), suffix='.tmp')
+    try:
+        if os.path.exists(location):
+            shutil.copymode(location, temp_path)
+        else:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(temp_path, 0o666 & ~umask)
+    except:
+        os.close(fd)
+        os.remove(temp_path)
+        raise
+    return (fd, temp_path)
+
+def stage_csv(obj_list, location, *, fields=None):
+    """Writes a dict list as a CSV to a new temporary file next to location, doing some last minute validations.
+    Returns the path of the temporary file, which can be moved into place with commit_staged().
+
+    Fields are the given fields, or the keys of the first row.
+    If another row has keys the first one doesn't, fields are determined from all rows.
+    obj_list can be any iterable of rows. If fields are given, rows are written as they are iterated."""
+    if not fields and not isinstance(obj_list, collections.abc.Sequence):
+        obj_list = list(obj_list)
+
+    fd, temp_path = create_staged(location)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            header = fields or (list(obj_list[0].keys()) if obj_list else [])
+            if not _write_rows(f, header, obj_list):
+                if fields:
+                    raise ValueError("Cannot save CSV, a row contains fields not in the given fields")
+                f.seek(0)
+                f.truncate()
+                _write_rows(f, determine_fields(obj_list), obj_list)
+    except:
+        os.remove(temp_path)
+        raise
+    return temp_path
+
+def commit_staged(temp_path, location):
+    """Replaces the file at location with a staged file if the contents are different,
+    so unchanged files keep their modification time. Returns true if the file was changed."""
+    if os.path.exists(location) and filecmp.cmp(location, temp_path, shallow=False):
+        os.remove(temp_path)
+        return False
+
+    os.replace(temp_path, location)
+    return True
 
+def save_csv(obj_list, location, *, fields=None):
+    """Saves a dict list as a CSV, doing some last minute validations.
+    Returns true if the file was changed.
 
-def save_csv(obj_list, location):
-    """Saves a dict list as a  CSV, doing some last minute validations. 
-    Fields are auto-determined"""
+    The rows are written to a temporary file first (see stage_csv),
+    which only replaces the file at location if the contents are different."""
+    return commit_staged(stage_csv(obj_list, location, fields=fields), location)
 
-    if not typecheck.is_flat_dict_list(obj_list):
-        raise Exception("Cannot save CSV, the data is not completely flat")
 
-    fields = determine_fields(obj_list)
-    with open(location, 'w', encoding='utf-8') as f:
-        writer = csv.DictWriter(f, fields, lineterminator='\n')
-        writer.writeheader()
-        writer.writerows(obj_list)
+def _is_untrimmed(value):
+    return value.startswith(" ") or value.endswith(" ")
 
+def read_csv(location, *, column_types=None):
+    """Reads a csv file as an object list. Empty values are read as None.
 
-def read_csv(location):
-    "Reads a csv file as an object list without additional processing"
+    column_types is an optional function that receives the header,
+    and returns a dictionary of column name -> conversion function.
+    Conversion functions are applied to non empty values as they're read.
+
+    Rows are read, converted, and checked for untrimmed values in a single pass.
+    A warning is printed for any key or value that isn't trimmed.
+    """
     with open(location, encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        items = list(reader)
-
-        # CSV does not distinguish between empty string and null
-        # Set empties to null
-        for item in items:
-            for key, value in item.items():
-                if value == '':
+        reader = csv.reader(f)
+        header = next(reader, None)
+        if header is None:
+            return []
+
+        converters = (column_types(header) if column_types else None) or {}
+        conversions = [(idx, converters[key]) for idx, key in enumerate(header) if key in converters]
+        num_fields = len(header)
+
+        items = []
+        warn_value_rows = []
+        for row in reader:
+            if not row:
+                continue # blank lines are skipped, like DictReader
+
+            # Check for untrimmed cells using the joined row first, as most rows are fine
+            joined = '\0'.join(row)
+            if joined[:1] == " " or joined[-1:] == " " or "\0 " in joined or " \0" in joined:
+                untrimmed = [idx for idx, value in enumerate(row) if value and _is_untrimmed(value)]
+                if untrimmed:
+                    warn_value_rows.append((len(items) + 1, untrimmed[0] + 1))
+
+            # CSV does not distinguish between empty string and null
+            # Set empties to null
+            values = [value or None for value in row]
+
+            for idx, convert in conversions:
+                if idx < len(values) and values[idx] is not None:
+                    values[idx] = convert(values[idx])
+
+            item = collections.OrderedDict(zip(header, values))
+            if len(values) < num_fields:
+                for key in header[len(values):]:
                     item[key] = None
+            elif len(values) > num_fields:
+                item[None] = row[num_fields:]
+            items.append(item)
+
+    if items and any(_is_untrimmed(key) for key in header):
+        print("Warning: Some keys in CSV are not trimmed: " + location)
+    if warn_value_rows:
+        cell_strings = map(lambda c: "({0}, {1})".format(c[0], c[1]), warn_value_rows)
+        print("Warning: Some values in CSV are not trimmed: "
+            + location + " cells: " + ", ".join(cell_strings))
 
-        validate_csv(items, location)
-            
-        return items
+    return items
@@ -2,14 +2,29 @@ import typing
 import collections
 import itertools
 import copy
+import sys
 
 from collections.abc import Mapping, KeysView
 from mhdata.util import joindicts, extract_fields
 
-from .datarow import DataRow
+from .datarow import DataRow, RowLayout
+from .columnar import ColumnStore
+from .nameindex import NameSearchIndex
+from .shared import SharedDataMap
 from .functions import to_basic
 
 
+# A name keyed dictionary to merge into a DataMap, see DataMap.merge_all.
+# The source is a description of where the data came from (like a filename), used for errors.
+MergeSource = collections.namedtuple('MergeSource', ['data', 'lang', 'key', 'source'])
+
+
+def _translated_keys():
+    "Returns the subkeys that mark a dictionary field as translated, used for columnar storage"
+    from mhdata import cfg
+    return cfg.all_languages.keys()
+
+
 class NameSet(KeysView):
     "A 'set-like' object for iterating over the names of a DataMap in a single language"
     def __init__(self, backing_data, language_code):
@@ -26,6 +41,67 @@ class NameSet(KeysView):
         return False
 
 
+def _field_value(entry, field):
+    "Returns a tuple (value, found) for a field, which is a key or a tuple of keys"
+    path = field if isinstance(field, tuple) else (field,)
+    value = entry
+    for key in path:
+        if not isinstance(value, collections.abc.Mapping) or key not in value:
+            return None, False
+        value = value[key]
+    return value, True
+
+
+class FieldIndex:
+    """A secondary index of a DataMap, mapping the values of a field to entry ids.
+
+    The field is a key, or a tuple of keys for a nested value.
+    Entries that don't have the field, or have an unhashable value, are not indexed.
+    Each entry is stored with its position in the map, so results keep the map's order.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self.buckets = {}
+
+        # entry id -> (value, position)
+        self.entries = {}
+
+    def add(self, entry, position):
+        value, found = _field_value(entry, self.field)
+        if not found or not isinstance(value, collections.abc.Hashable):
+            return
+        self.buckets.setdefault(value, {})[entry.id] = position
+        self.entries[entry.id] = (value, position)
+
+    def remove(self, entry_id):
+        if entry_id not in self.entries:
+            return
+        value, position = self.entries.pop(entry_id)
+        bucket = self.buckets[value]
+        del bucket[entry_id]
+        if not bucket:
+            del self.buckets[value]
+
+    def update(self, entry, position):
+        "Reindexes an entry after its values changed"
+        self.remove(entry.id)
+        self.add(entry, position)
+
+    def copy(self):
+        result = FieldIndex(self.field)
+        result.buckets = { value:dict(bucket) for (value, bucket) in self.buckets.items() }
+        result.entries = dict(self.entries)
+        return result
+
+    def ids(self, value):
+        "Returns the ids of entries with the given value, in map order"
+        bucket = self.buckets.get(value, None)
+        if not bucket:
+            return []
+        return sorted(bucket, key=bucket.__getitem__)
+
+
 class DataMap(collections.abc.Mapping):
     """A collection of data entries key'd by an id.
 
@@ -35,11 +111,45 @@ class DataMap(collections.abc.Mapping):
     If languages is given, use those languages as the key languages.
     Key languages are used for associations and can be mapped, but require a uniqueness constraint.
     TODO: Allow existance check to work on non-key languages. Right now non-keys are "ignored".
+
+    If columnar is true, entries are stored in columns (see mhdata.io.columnar),
+    which uses less memory and allows field scans to run over arrays.
+
+    Fields given in indexes (or added with add_index) are indexed,
+    which speeds up where(), lookup(), and group_by() for those fields.
+
+    Names in lazy_languages are not indexed (or checked for uniqueness) as entries are added,
+    but the first time a name in that language is looked up. Use duplicate_names() to check them.
     """
 
-    def __init__(self, data: typing.Mapping[int, dict] = None, languages=None, start_id=1):
-        self._data = collections.OrderedDict()
+    def __init__(self, data: typing.Mapping[int, dict] = None, languages=None, start_id=1, *,
+            columnar=False, indexes=(), lazy_languages=()):
+        if columnar:
+            self._data = ColumnStore(_translated_keys())
+        else:
+            self._data = collections.OrderedDict()
+
+        # Reverse name index, language -> name -> id.
+        # Languages in _lazy_languages haven't been indexed yet,
+        # and languages in _shared_languages are shared with a copy, and must be copied before changing
         self._reverse_entries = {}
+        self._lazy_languages = set(lazy_languages)
+        self._shared_languages = set()
+
+        # Normalized name search index, created on first use
+        self._search_index = None
+
+        # Family of key layouts shared by the rows of this map
+        self._layouts = {}
+
+        # Secondary indexes, field -> FieldIndex (see the _indexes property).
+        # Once there are indexes, the position of each entry is tracked to keep results in order
+        self._field_indexes = {}
+        self._pending_index_fields = []
+        self._positions = {}
+        self._position_gen = itertools.count()
+        for field in indexes:
+            self.add_index(field)
 
         # List of languages that the data map can innately handle.
         # This distinction is required as some languages have duplicate entries for certain items.
@@ -56,14 +166,46 @@ class DataMap(collections.abc.Mapping):
 
     def id_of(self, language_code, name):
         "Returns the id of the map entry that contains the code+value. Otherwise returns None"
-        key = (language_code, name)
-        return self._reverse_entries.get(key, None)
+        names = self._reverse_entries.get(language_code, None)
+        if names is None:
+            if language_code not in self._lazy_languages:
+                return None
+            names = self._index_language(language_code)
+        return names.get(name, None)
 
     def entry_of(self, language_code, name):
         "Returns the entry that contains the code+value, which can be used to get other languages. Otherwise none"
         id_value = self.id_of(language_code, name)
         return self._data.get(id_value, None)
 
+    @property
+    def search_index(self) -> NameSearchIndex:
+        "Returns the normalized name search index of this map, creating it if it doesn't exist"
+        if self._search_index is None:
+            self._search_index = NameSearchIndex(self)
+        return self._search_index
+
+    def find_id(self, language_code, name):
+        """Returns the id of the entry with the name, ignoring differences in case, unicode form,
+        and alias forms like roman numerals (see mhdata.io.nameindex).
+        Exact matches are preferred. Returns None if there is no match or several."""
+        entry_id = self.id_of(language_code, name)
+        if entry_id is not None:
+            return entry_id
+
+        matches = self.search_index.find(language_code, name)
+        if len(matches) == 1:
+            return matches[0]
+        return None
+
+    def find_entry(self, language_code, name):
+        "Returns the entry found by find_id(), or None"
+        return self._data.get(self.find_id(language_code, name), None)
+
+    def search_prefix(self, language_code, prefix):
+        "Returns a list of entries whose normalized name in a language starts with the prefix, sorted by name"
+        return [self._data[entry_id] for entry_id in self.search_index.prefix(language_code, prefix)]
+
     @property
     def max_id(self):
         "Gets the max id value stored. Runs in linear time every time."
@@ -88,26 +230,76 @@ class DataMap(collections.abc.Mapping):
             self._id_gen = itertools.count(next_id)
             self._last_id = entry_id
 
+    def _index_language(self, lang):
+        "Internal function that adds a lazy language to the reverse mapping, and returns its names"
+        self._lazy_languages.discard(lang)
+        names = self._reverse_entries.setdefault(lang, {})
+        try:
+            for entry in self._data.values():
+                self._register_name(names, lang, entry['name'].get(lang, None), entry.id)
+        except:
+            # Leave the language unindexed, so that the error is raised on every lookup
+            del self._reverse_entries[lang]
+            self._lazy_languages.add(lang)
+            raise
+        return names
+
+    def duplicate_names(self):
+        """Returns a list of (lang, name) for the names of lazy languages used by more than one entry.
+        Other languages are checked as entries are added. Languages are checked without indexing them."""
+        seen = { lang:set() for lang in self._lazy_languages }
+        results = []
+        for entry in self._data.values():
+            for lang, name in entry.names():
+                names = seen.get(lang, None)
+                if names is None or name is None:
+                    continue
+                if name in names:
+                    results.append((lang, name))
+                names.add(name)
+        return results
+
+    def _writable_names(self, lang):
+        "Internal function that returns the reverse mapping of a language, ready to be changed"
+        names = self._reverse_entries.get(lang, None)
+        if names is None:
+            names = self._reverse_entries[lang] = {}
+        elif lang in self._shared_languages:
+            names = self._reverse_entries[lang] = dict(names)
+            self._shared_languages.discard(lang)
+        return names
+
+    def _register_name(self, names, lang, name, entry_id):
+        if name is None:
+            return
+        if name in names:
+            raise ValueError(f"Duplicate name ({lang}, {name}) in DataMap")
+        if type(name) is str:
+            name = sys.intern(name)
+        names[name] = entry_id
+
     def _unregister_entry(self, entry):
         "Internal function to remove the entry from the reverse mapping"
         for lang, name in entry.names():
             if name is None: continue
             if self.languages and lang not in self.languages: continue
+            if lang in self._lazy_languages: continue
 
-            key = (lang, name)
-            del self._reverse_entries[key]
+            del self._writable_names(lang)[name]
+
+        if self._search_index is not None:
+            self._search_index.remove(entry)
 
     def _register_entry(self, entry):
         "Internal function add the entry to the reverse mapping"
         for lang, name in entry.names():
-            if name is None: continue
             if self.languages and lang not in self.languages: continue
+            if lang in self._lazy_languages: continue
 
-            key = (lang, name)
-            if key in self._reverse_entries:
-                raise ValueError(f"Duplicate name ({lang}, {name}) in DataMap")
-           
-            self._reverse_entries[key] = entry.id
+            self._register_name(self._writable_names(lang), lang, name, entry.id)
+
+        if self._search_index is not None:
+            self._search_index.add(entry)
 
     def _add_entry(self, entry_id: int, entry: dict):
         "Internal: Adds an entry to the dict, and returns the entry"
@@ -117,13 +309,20 @@ class DataMap(collections.abc.Mapping):
         if entry_id in self._data:
             raise KeyError(f"An entry with the given key already exists: {entry_id}")
 
-        new_entry = DataRow(entry_id, entry)
+        new_entry = DataRow(entry_id, entry, layouts=self._layouts)
         self._register_entry(new_entry)
         
         self._data[entry_id] = new_entry
         self._revaluate_idgen(entry_id)
 
-        return new_entry
+        if self._indexes:
+            position = next(self._position_gen)
+            self._positions[entry_id] = position
+            for index in self._indexes.values():
+                index.add(new_entry, position)
+
+        # Columnar storage copies the entry, so return the stored view
+        return self._data[entry_id]
 
     def add_entry(self, entry_id: int, entry: dict):
         """"
@@ -155,22 +354,141 @@ class DataMap(collections.abc.Mapping):
         for entry in entries:
             self.insert(entry)
 
+    @property
+    def columnar(self):
+        "Returns true if the entries of this data map are stored in columns"
+        return isinstance(self._data, ColumnStore)
+
+    def to_columnar(self):
+        """Converts this data map to use columnar storage, in place.
+        Entries retrieved before the conversion are no longer part of the map.
+        Returns self to support chaining."""
+        if not self.columnar:
+            self._data = ColumnStore.from_rows(self._data.values(), _translated_keys())
+        return self
+
+    def scan(self, key, value):
+        """Returns a list of all entries whose value for key is equal to value.
+        With columnar storage, this scans a single column array."""
+        if self.columnar:
+            return [self._data[entry_id] for entry_id in self._data.scan(key, value)]
+        return [entry for entry in self._data.values() if key in entry and entry[key] == value]
+
+    @property
+    def _indexes(self):
+        "Internal property that returns the secondary indexes, building any that are pending"
+        if self._pending_index_fields:
+            fields = self._pending_index_fields
+            self._pending_index_fields = []
+            for field in fields:
+                self.add_index(field)
+        return self._field_indexes
+
+    def add_index(self, field):
+        """Adds a secondary index on a field (a key, or a tuple of keys for a nested value).
+        Indexes are kept up to date by insert, merge, and deletes.
+        If an entry's indexed field is edited directly, call reindex().
+        Does nothing if the index already exists. Returns self to support chaining."""
+        if field not in self._indexes:
+            if not self._indexes:
+                self._positions = { entry_id:next(self._position_gen) for entry_id in self._data }
+
+            index = FieldIndex(field)
+            for entry_id, entry in self._data.items():
+                index.add(entry, self._positions[entry_id])
+            self._indexes[field] = index
+        return self
+
+    def reindex(self, entry_id=None):
+        "Updates the secondary indexes for an entry, or for all entries if no id is given"
+        entry_ids = [entry_id] if entry_id is not None else list(self._data.keys())
+        for index in self._indexes.values():
+            for entry_id in entry_ids:
+                index.update(self._data[entry_id], self._positions[entry_id])
+
+    def lookup(self, field, value):
+        """Returns a list of all entries whose field is equal to value, in map order.
+        Uses the field's index if it exists, otherwise scans the entries."""
+        index = self._indexes.get(field, None)
+        if index is not None:
+            return [self._data[entry_id] for entry_id in index.ids(value)]
+        if not isinstance(field, tuple):
+            return self.scan(field, value)
+        return [e for e in self._data.values() if _field_value(e, field) == (value, True)]
+
+    def where(self, **conditions):
+        """Returns a list of all entries that match every field=value condition, in map order.
+        Indexed fields are looked up first, and the remaining ones are checked per entry."""
+        if not conditions:
+            return list(self._data.values())
+
+        indexed = [field for field in conditions if field in self._indexes]
+        if indexed:
+            # Start from the indexed field with the fewest matches
+            def match_count(field):
+                return len(self._indexes[field].buckets.get(conditions[field], ()))
+            field = min(indexed, key=match_count)
+        else:
+            field = next(iter(conditions))
+
+        return [
+            entry for entry in self.lookup(field, conditions[field])
+            if all(key in entry and entry[key] == value for key, value in conditions.items())]
+
+    def group_by(self, field):
+        """Returns an ordered dictionary of field value -> list of entries with that value.
+        Values are in order of first appearance, and entries without the field are skipped."""
+        index = self._indexes.get(field, None)
+        if index is None:
+            index = FieldIndex(field)
+            for position, entry in enumerate(self._data.values()):
+                index.add(entry, position)
+
+        groups = collections.OrderedDict()
+        for entry_id, (value, seq) in sorted(index.entries.items(), key=lambda item: item[1][1]):
+            groups.setdefault(value, []).append(self._data[entry_id])
+        return groups
+
     def names(self, language_code):
         "Returns a set like object of all the names in a given language"
         return NameSet(self, language_code)
 
     def to_dict(self):
         "Fully converts the data stored into a serializable dictionary, keyed by id"
-        return to_basic(self)
+        return { entry_id:entry.to_dict() for (entry_id, entry) in self._data.items() }
 
     def to_list(self):
         "Fully converts the data entries stored into a serializable list"
-        return to_basic(self.values())
+        return [entry.to_dict() for entry in self._data.values()]
 
     def copy(self):
-        "Returns a new DataMap object with all fields cloned"
-        clone_data = self.to_dict()
-        return DataMap(clone_data)
+        """Returns a new DataMap object with all fields cloned.
+
+        Rows and name indexes are copied on write: the copy shares them with this map,
+        and a row is only copied once it is changed (or a nested value is read) in either map."""
+        clone = DataMap(
+            languages=self.languages, start_id=self.start_id,
+            columnar=self.columnar, lazy_languages=self._lazy_languages)
+
+        if self.columnar:
+            for entry in self._data.values():
+                clone._add_entry(entry.id, entry.copy())
+        else:
+            clone._layouts = self._layouts
+            for entry_id, entry in self._data.items():
+                clone._data[entry_id] = entry.copy()
+
+            clone._reverse_entries = dict(self._reverse_entries)
+            self._shared_languages.update(self._reverse_entries.keys())
+            clone._shared_languages.update(self._reverse_entries.keys())
+
+        clone._id_gen = copy.copy(self._id_gen)
+        clone._last_id = self._last_id
+
+        clone._field_indexes = { field:index.copy() for (field, index) in self._indexes.items() }
+        clone._positions = dict(self._positions)
+        clone._position_gen = copy.copy(self._position_gen)
+        return clone
 
     def merge(self, data, *, lang="en", key=None):
         """Merges a dictionary keyed by the names in a language to this data map
@@ -180,33 +498,77 @@ class DataMap(collections.abc.Mapping):
 
         Returns self to support chaining.
         """
-        # validation, make sure it links
-        data_names = self.names(lang)
-        unlinked = [key for key in data.keys() if key not in data_names]
-        if unlinked:
-            raise Exception(
-                "Several invalid names found in sub data map. Invalid entries are " +
-                ','.join(unlinked))
-
-        # validation complete, it may not link to all base entries but thats ok
-        for data_key, data_entry in data.items():
-            base_entry = self.entry_of(lang, data_key)
-            
-            if key:
-                base_entry[key] = data_entry
-                
-            elif isinstance(data_entry, collections.Mapping):
-                if 'name' in data_entry:
+        return self.merge_all([MergeSource(data, lang, key, None)])
+
+    def merge_all(self, sources: typing.List[MergeSource]):
+        """Merges several name keyed dictionaries to this data map at once.
+        Each source is merged in order using the same rules as merge().
+
+        All names are resolved to entries before anything is changed,
+        so if any name fails to link, the data map is left untouched.
+        Each affected entry is then built in a single pass, and reindexed at most once.
+
+        Returns self to support chaining.
+        """
+        # Phase 1: resolve names to ids (names added by earlier sources can be joined on)
+        added_names = {}
+        updates = collections.OrderedDict()
+        for merge_source in sources:
+            lang = merge_source.lang
+            unlinked = []
+            for data_key, data_entry in merge_source.data.items():
+                entry_id = self.id_of(lang, data_key)
+                if entry_id is None:
+                    entry_id = added_names.get((lang, data_key), None)
+                if entry_id is None:
+                    unlinked.append(data_key)
+                    continue
+
+                if not merge_source.key:
+                    if not isinstance(data_entry, collections.Mapping):
+                        # We cannot merge a dictionary with a non-dictionary
+                        raise Exception("Invalid data, the data map must be a dictionary for a keyless merge")
+                    if isinstance(data_entry.get('name', None), collections.Mapping):
+                        for name_lang, name in data_entry['name'].items():
+                            if name is None: continue
+                            if self.languages and name_lang not in self.languages: continue
+                            added_names[(name_lang, name)] = entry_id
+
+                updates.setdefault(entry_id, []).append((merge_source, data_entry))
+
+            if unlinked:
+                source_name = merge_source.source or "sub data map"
+                raise Exception(
+                    f"Several invalid names found in {source_name}. Invalid entries are " +
+                    ','.join(unlinked))
+
+        # Phase 2: build each entry. Validation is complete, it may not link to all base entries but thats ok
+        for entry_id, entry_updates in updates.items():
+            base_entry = self._data[entry_id]
+            renamed = False
+            for merge_source, data_entry in entry_updates:
+                if merge_source.key:
+                    base_entry[merge_source.key] = data_entry
+                    continue
+
+                if 'name' in data_entry and not renamed:
                     self._unregister_entry(base_entry)
+                    renamed = True
+
+                try:
                     joindicts(base_entry, data_entry)
-                    self._register_entry(base_entry)
-                else:
-                    joindicts(base_entry, data_entry)
-                    
-            else:
-                # If we get here, its a key-less merge with a non-dict
-                # We cannot merge a dictionary with a non-dictionary
-                raise Exception("Invalid data, the data map must be a dictionary for a keyless merge")
+                except Exception as ex:
+                    if not merge_source.source:
+                        raise
+                    raise Exception(
+                        f"Failed to merge {merge_source.source} into {base_entry.name(merge_source.lang)}: " +
+                        str(ex)) from ex
+
+            if renamed:
+                self._register_entry(base_entry)
+
+            for index in self._indexes.values():
+                index.update(base_entry, self._positions[entry_id])
             
         return self
 
@@ -244,6 +606,64 @@ class DataMap(collections.abc.Mapping):
 
         return result
         
+    def export_shared(self):
+        """Writes this data map to shared memory (or a temporary file if there is none),
+        and returns a SharedDataMap handle that can be cheaply sent to other processes.
+        Processes that load the handle get a read only SnapshotMap backed by the same memory."""
+        return SharedDataMap.create(self)
+
+    def __getstate__(self):
+        """Returns the state used to pickle this data map.
+        Only the rows are sent: rows are stored as a layout index and a list of values,
+        and name and field indexes are rebuilt on first use after unpickling."""
+        layout_keys = {}
+        rows = []
+        for entry in self._data.values():
+            if self.columnar:
+                keys, values = zip(*((k, to_basic(v)) for (k, v) in entry.items()))
+            else:
+                keys, values = entry._layout.keys, entry._values
+            layout_idx = layout_keys.setdefault(keys, len(layout_keys))
+            rows.append((layout_idx, values))
+
+        # Languages that are indexed (or waiting to be) are indexed lazily on the other side
+        lazy_languages = set(self._lazy_languages)
+        lazy_languages.update(self._reverse_entries.keys())
+
+        return {
+            'languages': self.languages,
+            'start_id': self.start_id,
+            'next_id': next(copy.copy(self._id_gen)),
+            'last_id': self._last_id,
+            'columnar': self.columnar,
+            'lazy_languages': lazy_languages,
+            'indexes': list(self._field_indexes.keys()) + self._pending_index_fields,
+            'layouts': list(layout_keys.keys()),
+            'rows': rows
+        }
+
+    def __setstate__(self, state):
+        self.__init__(
+            languages=state['languages'], start_id=state['start_id'],
+            columnar=state['columnar'], lazy_languages=state['lazy_languages'])
+        self._id_gen = itertools.count(state['next_id'])
+        self._last_id = state['last_id']
+        self._pending_index_fields = list(state['indexes'])
+
+        layouts = [RowLayout.get(self._layouts, keys) for keys in state['layouts']]
+        if self.columnar:
+            rows = (dict(zip(layouts[idx].keys, values)) for (idx, values) in state['rows'])
+            self._data = ColumnStore.from_rows(rows, _translated_keys())
+            return
+
+        for layout_idx, values in state['rows']:
+            layout = layouts[layout_idx]
+            entry = DataRow.__new__(DataRow)
+            entry._layout = layout
+            entry._values = list(values)
+            entry._shared = False
+            self._data[values[layout.positions['id']]] = entry
+
     def pop(self, entry_id, default=None):
         """If key is in the dictionary, remove it and return its value, else return default.
         If default is not given and key is not in the directory, KeyError is raised.
@@ -269,7 +689,14 @@ class DataMap(collections.abc.Mapping):
     def __delitem__(self, id):
         entry = self._data[id]
         del self._data[id]
+        if self._indexes:
+            del self._positions[id]
+            for index in self._indexes.values():
+                index.remove(id)
         for lang, val in entry.names():
-            key = (lang, val)
-            if key in self._reverse_entries:
-                del self._reverse_entries[key]
+            names = self._reverse_entries.get(lang, None)
+            if names is not None and val in names:
+                del self._writable_names(lang)[val]
+
+        if self._search_index is not None:
+            self._search_index.remove(entry)
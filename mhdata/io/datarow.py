@@ -1,16 +1,103 @@
-from collections.abc import MutableMapping
+from collections.abc import Iterable, Mapping, MutableMapping
 from .functions import to_basic
 
+
+def _is_container(value):
+    "Returns true if to_basic() would copy the value"
+    return isinstance(value, (Mapping, Iterable)) and not isinstance(value, str)
+
+
+class RowLayout:
+    """The ordered keys of one or more DataRows, and the position of each key.
+
+    Rows store only a list of values, and share the layout of rows with the same keys.
+    Layouts belong to a family (a dictionary of key tuple -> layout, usually one per DataMap),
+    and adding or removing a key moves a row to another layout of the same family.
+    """
+    __slots__ = ('keys', 'positions', 'family', '_added')
+
+    def __init__(self, family: dict, keys: tuple):
+        self.keys = keys
+        self.positions = { key:idx for (idx, key) in enumerate(keys) }
+        self.family = family
+
+        # Cache of key -> layout with the key added to the end
+        self._added = {}
+
+    @classmethod
+    def get(cls, family: dict, keys: tuple):
+        "Returns the layout for the keys in the family, creating it if it doesn't exist"
+        layout = family.get(keys, None)
+        if layout is None:
+            layout = cls(family, keys)
+            family[keys] = layout
+        return layout
+
+    def with_key(self, key):
+        "Returns the layout with key added to the end"
+        layout = self._added.get(key, None)
+        if layout is None:
+            layout = RowLayout.get(self.family, self.keys + (key,))
+            self._added[key] = layout
+        return layout
+
+    def without_key(self, key):
+        "Returns the layout with key removed"
+        return RowLayout.get(self.family, tuple(k for k in self.keys if k != key))
+
+    def __getstate__(self):
+        return (self.family, self.keys)
+
+    def __setstate__(self, state):
+        family, keys = state
+        self.family = family
+        self.keys = keys
+        self.positions = { key:idx for (idx, key) in enumerate(keys) }
+        self._added = {}
+
+
 class DataRow(MutableMapping):
     """Defines a single row of a datamap object.
     These objects are regular dictionaries that can also get translated names.
+
+    Values are stored in a list, ordered by a RowLayout shared with other rows with the same keys.
+    If layouts (a layout family) is given, the row shares layouts with other rows of that family.
+
+    Rows created by copy() share their values with the original until either one is changed,
+    or a nested value (like a dictionary) is read from it. That row then makes its own copy.
     """
+    __slots__ = ('_layout', '_values', '_shared')
 
-    def __init__(self, row_id: int, datarowdict: dict):
-        self._data = { 'id': row_id }
+    def __init__(self, row_id: int, datarowdict: dict, *, layouts: dict = None):
+        keys = ['id']
+        values = [row_id]
         for key, value in datarowdict.items():
             if key != 'id':
-                self._data[key] = value
+                keys.append(key)
+                values.append(value)
+
+        if layouts is None:
+            layouts = {}
+        self._layout = RowLayout.get(layouts, tuple(keys))
+        self._values = values
+        self._shared = False
+
+    def copy(self):
+        """Returns a copy of this row, with nested values copied like to_basic().
+        The values are only copied when either row needs them"""
+        self._shared = True
+
+        result = DataRow.__new__(DataRow)
+        result._layout = self._layout
+        result._values = self._values
+        result._shared = True
+        return result
+
+    def _unshare(self):
+        "Makes a private copy of the values, if they are shared with another row"
+        if self._shared:
+            self._values = [to_basic(v) if _is_container(v) else v for v in self._values]
+            self._shared = False
 
     @property
     def id(self):
@@ -19,11 +106,12 @@ class DataRow(MutableMapping):
 
     def name(self, lang_id):
         "Returns the name of this data map row in a specific language"
-        return self['name'][lang_id]
+        return self._values[self._layout.positions['name']][lang_id]
 
     def names(self):
         "Returns a collection of (language, name) tuples for this row"
-        for (lang, name) in self['name'].items():
+        # Read the names directly, as reading through self['name'] would copy a shared row
+        for (lang, name) in self._values[self._layout.positions['name']].items():
             yield (lang, name)
 
     def set_value(self, key, value, *, after=""):
@@ -35,7 +123,7 @@ class DataRow(MutableMapping):
 
         keys_to_move = []
         found_item = False
-        for item_key in self._data.keys():
+        for item_key in self._layout.keys:
             if found_item:
                 keys_to_move.append(item_key)
             elif item_key == after:
@@ -44,29 +132,73 @@ class DataRow(MutableMapping):
         self[key] = value
 
         # Move every entry to the end of the list
-        for item_key in keys_to_move:
-            value = self._data[item_key]
-            del self._data[item_key]
-            self._data[item_key] = value
+        if keys_to_move:
+            items = { k:v for (k, v) in zip(self._layout.keys, self._values) }
+            for item_key in keys_to_move:
+                items[item_key] = items.pop(item_key)
+
+            self._layout = RowLayout.get(self._layout.family, tuple(items.keys()))
+            self._values = list(items.values())
 
     def to_dict(self):
-        return to_basic(self)
+        # to_basic() copies every value, so a shared row doesn't need to be copied first
+        return { key:to_basic(value) for (key, value) in zip(self._layout.keys, self._values) }
+
+    def get(self, key, default=None):
+        idx = self._layout.positions.get(key, None)
+        if idx is None:
+            return default
+        value = self._values[idx]
+        if self._shared and _is_container(value):
+            self._unshare()
+            value = self._values[idx]
+        return value
 
     def __getitem__(self, key):
-        return self._data[key]
+        idx = self._layout.positions[key]
+        value = self._values[idx]
+        if self._shared and _is_container(value):
+            self._unshare()
+            value = self._values[idx]
+        return value
 
     def __setitem__(self, key, value):
-        self._data[key] = value
+        self._unshare()
+        idx = self._layout.positions.get(key, None)
+        if idx is not None:
+            self._values[idx] = value
+        else:
+            self._layout = self._layout.with_key(key)
+            self._values.append(value)
 
     def __delitem__(self, key):
-        del self._data[key]
+        self._unshare()
+        idx = self._layout.positions[key]
+        self._layout = self._layout.without_key(key)
+        del self._values[idx]
+
+    def __contains__(self, key):
+        return key in self._layout.positions
 
     def __iter__(self):
-        return self._data.__iter__()
+        return iter(self._layout.keys)
 
     def __len__(self):
-        return self._data.__len__()
+        return len(self._values)
+
+    def __reduce__(self):
+        # Pickle only the keys and values, the layout is recreated on the other side
+        return (_restore_row, (self._layout.keys, self._values))
 
     def __repr__(self):
         # Show the repr of the shallow copy
         return repr({ k:v for (k, v) in self.items()})
+
+
+def _restore_row(keys, values):
+    "Recreates a pickled DataRow"
+    row = DataRow.__new__(DataRow)
+    row._layout = RowLayout.get({}, keys)
+    row._values = list(values)
+    row._shared = False
+    return row
@@ -1,65 +1,109 @@
 import typing
 import collections
+import collections.abc
 import copy
+import decimal
 
 import mhdata.typecheck as typecheck
 import mhdata.util as util
 
+# Types that to_basic() returns as is, checked before the slower abstract type checks
+_scalar_types = frozenset((str, int, float, bool, type(None), decimal.Decimal))
+
+def _basic_shell(value, pending):
+    """Returns the basic form of a value, where containers are returned empty.
+    Empty containers are added to pending along with the items that fill them."""
+    value_type = type(value)
+    if value_type in _scalar_types:
+        return value
+    if value_type is dict or isinstance(value, collections.abc.Mapping):
+        result = {}
+        pending.append((result, value.items()))
+        return result
+    if isinstance(value, str):
+        return value
+    if value_type is list or isinstance(value, collections.abc.Iterable):
+        result = []
+        pending.append((result, value))
+        return result
+    return value
+
 def to_basic(obj, *, collected={}):
-    """Converts an object to its most basic form, recursively.
+    """Converts an object to its most basic form, copying all dictionaries and lists.
+    Mappings become dictionaries and other iterables (except strings) become lists.
     Does not prevent infinite recursion, careful with usage.
     """
-    if isinstance(obj, collections.Mapping):
-        # This can be converted to a dictionary
-        return { k:to_basic(v) for (k, v) in obj.items()}
-    elif isinstance(obj, str):
-        return obj
-    elif isinstance(obj, collections.Iterable):
-        return [to_basic(v) for v in obj]
-    else:
-        return obj
-
-
-def flatten(obj, *, nest, prefix={}):
-    """Flattens a nested object into a list of flat dictionaries
-    nest is a list of fieldnames.
-    Do not use prefix, its internal.
-    """
-    # This is a recursive algorithm. 
-    # We iteratively step through "nest levels".
-
-    # BASE CASE
-    if not nest:
-        items = obj
-        if not typecheck.is_flat_iterable(obj):
-            items = [obj]
-        
-        # Extend all items with the prefix and return them
-        return [{**prefix, **item} for item in items]
-
-    # Validation
-    if not isinstance(obj, collections.Mapping):
+    pending = []
+    result = _basic_shell(obj, pending)
+
+    # Fill containers iteratively. Keys are added in order, so dictionary order is kept
+    while pending:
+        container, items = pending.pop()
+        if type(container) is dict:
+            for key, value in items:
+                container[key] = _basic_shell(value, pending)
+        else:
+            for value in items:
+                container.append(_basic_shell(value, pending))
+    return result
+
+
+def _nested_items(obj):
+    if not isinstance(obj, collections.abc.Mapping):
         raise ValueError("Object is not sufficiently deep for flattening")
+    return iter(obj.items())
 
-    # Return multiple results by stepping down one depth level,
-    # and recursively calling it for the sub-items
-    current_nest = nest[0]
-    remaining_nest = nest[1:]
-
-    results = []
-    for nest_value, remaining_data in obj.items():
-        sub_prefix = { **prefix, current_nest: nest_value }
-        
-        # RECURSIVE CALL
-        sub_flattened = flatten(remaining_data, nest=remaining_nest, prefix=sub_prefix)
-        results.extend(sub_flattened)
-
-    return results
+def iter_flatten(obj, *, nest):
+    """Flattens a nested object, yielding flat dictionaries.
+    nest is a list of fieldnames, one for each level of nesting.
+    Each level is iterated in order, and rows are yielded as they are reached.
+    """
+    if not nest:
+        items = obj if typecheck.is_flat_iterable(obj) else [obj]
+        for item in items:
+            yield {**item}
+        return
+
+    # A stack of item iterators, one per nest level, and the keys leading to the current one
+    leaf_level = len(nest)
+    stack = [_nested_items(obj)]
+    path = []
+    while stack:
+        entry = next(stack[-1], None)
+        if entry is None:
+            stack.pop()
+            if path:
+                path.pop()
+            continue
+
+        key, value = entry
+        if len(stack) < leaf_level:
+            stack.append(_nested_items(value))
+            path.append(key)
+            continue
+
+        prefix = dict(zip(nest, path))
+        prefix[nest[-1]] = key
+        if type(value) is list:
+            for item in value:
+                yield {**prefix, **item}
+        elif typecheck.is_flat_iterable(value):
+            for item in value:
+                yield {**prefix, **item}
+        else:
+            yield {**prefix, **value}
+
+def flatten(obj, *, nest):
+    """Flattens a nested object into a list of flat dictionaries
+    nest is a list of fieldnames. See iter_flatten().
+    """
+    return list(iter_flatten(obj, nest=nest))
 
 
 def unflatten(obj_list, *, nest, groups=[], leaftype):
     """Performs the reverse of flatten. 
     Turns a CSV (list of objects) into a nested object.
+    obj_list can be any iterable of rows, which are read once and not changed.
 
     Nest is a list of fields used to walk through the nesting.
 
@@ -69,38 +113,40 @@ def unflatten(obj_list, *, nest, groups=[], leaftype):
     if leaftype not in ['list', 'dict']:
         raise Exception("Unsupported leaf type")
 
-    # This is a recursive algorithm
     if not nest:
-        # BASE CASE: nothing more to nest, performs groups on entries
-        if leaftype is 'list':
-            return [util.group_fields(obj, groups=groups) for obj in obj_list]
-        if leaftype is 'dict':
-            return util.group_fields(obj_list[0], groups=groups)
-
-    else:
-        current_nest = nest[0]
-        remaining_nest = nest[1:]
-
-        # Phase one, start grouping rows
-        grouped_rows = {}
-        for mapping in obj_list:
-            key = mapping.pop(current_nest)
-            grouped_rows.setdefault(key, []).append(mapping)
-
-        # Phase 2, unflatten recursively
-        results = {}
-        for key, items in grouped_rows.items():
-            # Validation. Make sure it recurses correctly
-            if leaftype != 'list' and len(items) > 1:
-                raise Exception(
-                    f"Found multiple entries for {current_nest}:{key}, " +
-                    "which is invalid in this leaf type")
-
-            # Recursive call
-            results[key] = unflatten(
-                items, 
-                nest=remaining_nest, 
-                groups=groups, 
-                leaftype=leaftype)
-
-        return results
+        # Nothing to nest, performs groups on entries
+        rows = obj_list if isinstance(obj_list, list) else list(obj_list)
+        if leaftype == 'list':
+            return util.group_rows(rows, groups)
+        return util.group_fields(rows[0], groups=groups)
+
+    parent_nest, leaf_nest = nest[:-1], nest[-1]
+
+    # All rows share the same keys, so plan the grouping once for the leaf entries
+    plan = None
+    first_counts = collections.OrderedDict()
+
+    results = {}
+    for row in obj_list:
+        if plan is None:
+            plan = util.GroupPlan(row.keys(), groups, exclude=nest)
+
+        node = results
+        for nest_key in parent_nest:
+            node = node.setdefault(row[nest_key], {})
+
+        if leaftype == 'list':
+            node.setdefault(row[leaf_nest], []).append(plan.apply(row))
+        else:
+            first_key = row[nest[0]]
+            first_counts[first_key] = first_counts.get(first_key, 0) + 1
+            node[row[leaf_nest]] = plan.apply(row)
+
+    # Validation, dictionary leaves can't have multiple rows sharing a key
+    for key, count in first_counts.items():
+        if count > 1:
+            raise Exception(
+                f"Found multiple entries for {nest[0]}:{key}, " +
+                "which is invalid in this leaf type")
+
+    return results
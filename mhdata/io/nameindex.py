@@ -0,0 +1,140 @@
+"""
+A search index over the names of a DataMap.
+
+Names are normalized before they're indexed, so that lookups ignore differences
+in unicode form, case, spacing, and registered alias forms
+(like roman numerals vs digits, or α vs alpha). Normalized names are also kept sorted
+per language, which allows listing all names that start with a prefix.
+"""
+
+import bisect
+import re
+import unicodedata
+
+# Default aliases, mapping a normalized word to its canonical form
+# Our names use roman numerals, while other sources tend to use digits.
+# Our names use α/β/γ (see merge.binary.load_text), while other sources spell them out.
+default_aliases = {
+    '1': 'i', '2': 'ii', '3': 'iii', '4': 'iv', '5': 'v',
+    'alpha': 'α', 'beta': 'β', 'gamma': 'γ',
+}
+
+# Characters that are split into their own word even if they're attached to another.
+# For example "α+" and "Alpha +" both become the words α and +
+_separate_chars = re.compile(r"([αβγ+])")
+
+def _words(name: str):
+    name = unicodedata.normalize('NFKC', name).casefold()
+    return _separate_chars.sub(r" \1 ", name).split()
+
+def normalize_name(name: str, aliases=default_aliases):
+    "Returns the normalized form of a name, used as the key of a NameSearchIndex"
+    return ' '.join(aliases.get(word, word) for word in _words(name))
+
+
+class _LanguageIndex:
+    "Name search index for a single language"
+
+    def __init__(self):
+        # normalized name -> list of entry ids
+        self.entries = {}
+
+        # sorted list of normalized names, for prefix searches
+        self.sorted_keys = []
+
+    def add(self, key, entry_id):
+        ids = self.entries.get(key, None)
+        if ids is None:
+            self.entries[key] = [entry_id]
+            bisect.insort(self.sorted_keys, key)
+        elif entry_id not in ids:
+            ids.append(entry_id)
+
+    def remove(self, key, entry_id):
+        ids = self.entries.get(key, None)
+        if not ids or entry_id not in ids:
+            return
+        ids.remove(entry_id)
+        if not ids:
+            del self.entries[key]
+            idx = bisect.bisect_left(self.sorted_keys, key)
+            del self.sorted_keys[idx]
+
+    def prefix(self, key_prefix):
+        "Yields entry ids for all keys that start with the prefix, in sorted key order"
+        keys = self.sorted_keys
+        idx = bisect.bisect_left(keys, key_prefix)
+        while idx < len(keys) and keys[idx].startswith(key_prefix):
+            yield from self.entries[keys[idx]]
+            idx += 1
+
+
+class NameSearchIndex:
+    """Indexes the normalized names of a DataMap's entries, per language.
+
+    A language is indexed the first time it is searched, and is kept up to date
+    after that through add() and remove(), which the DataMap calls when entries
+    are added, renamed, or removed. Aliases can be given to replace default_aliases.
+    """
+
+    def __init__(self, data_map, aliases=None):
+        self._map = data_map
+        self.aliases = dict(default_aliases if aliases is None else aliases)
+        self._languages = {}
+
+    def normalize(self, name):
+        return normalize_name(name, self.aliases)
+
+    def _language(self, lang):
+        index = self._languages.get(lang, None)
+        if index is None:
+            index = _LanguageIndex()
+            for entry in self._map.values():
+                name = entry['name'].get(lang, None)
+                if name is not None:
+                    index.add(self.normalize(name), entry.id)
+            self._languages[lang] = index
+        return index
+
+    def add(self, entry):
+        "Adds the names of an entry, for all languages that are indexed"
+        for lang, name in entry.names():
+            index = self._languages.get(lang, None)
+            if index is not None and name is not None:
+                index.add(self.normalize(name), entry.id)
+
+    def remove(self, entry):
+        "Removes the names of an entry, for all languages that are indexed"
+        for lang, name in entry.names():
+            index = self._languages.get(lang, None)
+            if index is not None and name is not None:
+                index.remove(self.normalize(name), entry.id)
+
+    def find(self, lang, name):
+        "Returns a list of the ids of all entries whose normalized name matches"
+        return list(self._language(lang).entries.get(self.normalize(name), []))
+
+    def prefix(self, lang, prefix):
+        """Returns a list of the ids of all entries whose normalized name starts with the prefix.
+        Unless the prefix ends with a space, its last word may be incomplete,
+        so it matches both as typed and as an alias ("Sword 1" matches "Sword 10" and "Sword I")"""
+        words = _words(prefix)
+        if not words:
+            return list(self._language(lang).prefix(''))
+
+        aliases = self.aliases
+        start = ''.join(aliases.get(word, word) + ' ' for word in words[:-1])
+        last_word = words[-1]
+        if prefix[-1].isspace():
+            key_prefixes = [start + aliases.get(last_word, last_word) + ' ']
+        else:
+            key_prefixes = [start + last_word]
+            if last_word in aliases:
+                key_prefixes.append(start + aliases[last_word])
+
+        index = self._language(lang)
+        results = {}
+        for key_prefix in key_prefixes:
+            for entry_id in index.prefix(key_prefix):
+                results[entry_id] = None
+        return list(results.keys())
@@ -8,7 +8,7 @@ import re
 from mhdata.util import ensure, ensure_warn, joindicts
 
 from .datamap import DataMap
-from mhdata.util import group_fields
+from mhdata.util import group_rows
 from .functions import unflatten
 
 from mhdata.io.csv import read_csv
@@ -74,11 +74,16 @@ class DataReader:
             ', '.join(languages_with_errors) +
             f" While loading {fname}")
 
+    def _read_csv(self, data_file, schema=None):
+        """Internal helper to read a csv relative to the data path.
+        If the schema can type columns (see BaseSchema.get_column_types), values are typed while reading"""
+        column_types = getattr(schema, 'get_column_types', None)
+        return read_csv(self.get_data_path(data_file), column_types=column_types)
+
     def load_list_csv(self, data_file, *, schema=None):
         """Loads a simple csv without processing. 
         Accepts marshmallow schema to transform and validate it"""
-        data_file = self.get_data_path(data_file)
-        data = read_csv(data_file)
+        data = self._read_csv(data_file, schema)
 
         if schema:
             # When version 3 is released, this api will change
@@ -109,7 +114,7 @@ class DataReader:
         """Loads a simple csv file as a key map. 
         The key column becomes the map's key, and every entry gets an id field (accessed via variable).
         TODO: Polish, might need an interface tweak to be similar to datamap"""
-        items = self.load_list_csv(data_file)
+        items = self._read_csv(data_file, schema)
 
         keymap = { entry['key']:entry for entry in items }
         if schema:
@@ -129,7 +134,7 @@ class DataReader:
         groups = ['name'] + groups
 
         rows = read_csv(data_file)
-        rows = [group_fields(row, groups=groups) for row in rows]
+        rows = group_rows(rows, groups=groups)
 
         basemap = DataMap(languages=self.required_languages)
         basemap.extend(rows)
@@ -137,27 +142,28 @@ class DataReader:
 
         return basemap
 
+    def read_data_json(self, data_file):
+        "Reads a json data file keyed by name, without merging it to a map"
+        data_file = self.get_data_path(data_file)
+
+        with open(data_file, encoding="utf-8") as f:
+            return json.load(f)
+
     def load_data_json(self, parent_map : DataMap, data_file, *, lang="en", key=None):
         """Loads a data file, using a base map to anchor it to id
         The parent_map is updated to map id -> data row.
         Returns the parent_map to support chaining
         """
-        data_file = self.get_data_path(data_file)
-
-        with open(data_file, encoding="utf-8") as f:
-            data = json.load(f)
-
+        data = self.read_data_json(data_file)
         parent_map.merge(data, lang=lang, key=key)
         return parent_map
 
-    def load_data_csv(self, parent_map : DataMap, data_file, *, key=None, groups=[], leaftype):
-        """Loads a data file, using a base map to anchor it to id
-        The parent_map is updated to map id -> data row.
-        Returns the parent_map to support chaining.
-
-        Language is automatically determined by the name of the first column.
+    def read_data_csv(self, data_file, *, key=None, groups=[], leaftype):
+        """Reads a csv data file as a dictionary keyed by name, without merging it to a map.
+        Returns a tuple of (language, data). 
+        The language is automatically determined by the name of the first column,
+        and is None if the file has no rows.
         """
-        
         data_file = self.get_data_path(data_file)
 
         if leaftype == 'list' and not key:
@@ -166,7 +172,7 @@ class DataReader:
         rows = read_csv(data_file)
 
         if not rows:
-            return parent_map
+            return (None, {})
 
         # Auto detect language
         first_column = next(iter(rows[0].keys()))
@@ -177,6 +183,19 @@ class DataReader:
         lang = match.group(2)
         data = unflatten(rows, nest=[first_column], groups=groups, leaftype=leaftype)
 
+        return (lang, data)
+
+    def load_data_csv(self, parent_map : DataMap, data_file, *, key=None, groups=[], leaftype):
+        """Loads a data file, using a base map to anchor it to id
+        The parent_map is updated to map id -> data row.
+        Returns the parent_map to support chaining.
+
+        Language is automatically determined by the name of the first column.
+        """
+        lang, data = self.read_data_csv(data_file, key=key, groups=groups, leaftype=leaftype)
+        if not data:
+            return parent_map
+
         return parent_map.merge(data, lang=lang, key=key)
 
     def load_split_data_map(self, parent_map : DataMap, data_directory, lang="en", validate=True):
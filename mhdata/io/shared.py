@@ -0,0 +1,68 @@
+"""
+Exports DataMaps for read-only use by other processes.
+
+A DataMap is written once as a snapshot (see mhdata.io.snapshot) to shared memory
+(/dev/shm, or the temp folder if that doesn't exist), and only a small SharedDataMap handle
+is sent to each worker. Workers memory-map the snapshot, so every process reads the same pages,
+and rows are only decoded as they are accessed. Each process opens the snapshot at most once.
+"""
+
+import os
+import os.path
+import tempfile
+
+# Snapshots opened in this process, path -> SnapshotMap
+_loaded_maps = {}
+
+def _shared_dir():
+    if os.path.isdir('/dev/shm'):
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+class SharedDataMap:
+    """A handle to a DataMap exported with DataMap.export_shared().
+    Pickling the handle only sends the path of the export.
+    Use load() to get the map, and close() in the exporting process when done.
+    Can be used as a context manager, which closes the export on exit."""
+
+    def __init__(self, path):
+        self.path = path
+
+    @classmethod
+    def create(cls, data_map):
+        from .snapshot import write_snapshot
+
+        fd, path = tempfile.mkstemp(prefix='datamap-', suffix='.snapshot', dir=_shared_dir())
+        os.close(fd)
+        try:
+            write_snapshot(data_map, path)
+        except:
+            os.remove(path)
+            raise
+        return cls(path)
+
+    def load(self):
+        """Returns the exported map as a read only SnapshotMap.
+        The snapshot is only opened once per process"""
+        from .snapshot import open_snapshot
+
+        snapshot = _loaded_maps.get(self.path, None)
+        if snapshot is None:
+            snapshot = _loaded_maps[self.path] = open_snapshot(self.path)
+        return snapshot
+
+    def close(self):
+        """Removes the export, and closes it in this process.
+        Other processes that already loaded the map can keep using it"""
+        snapshot = _loaded_maps.pop(self.path, None)
+        if snapshot is not None:
+            snapshot.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
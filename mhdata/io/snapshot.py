@@ -0,0 +1,209 @@
+"""
+A binary snapshot format for DataMaps, which can be opened without loading the whole map.
+
+A snapshot file contains every row as a separately encoded payload, a table of id -> payload offset,
+and a name -> id table per language. Opening a snapshot memory-maps the file and reads only the tables.
+Rows are decoded the first time they are accessed, and name tables the first time a language is used.
+Processes that open the same snapshot share the file's pages instead of each loading a copy.
+
+File layout (all integers are little endian):
+    header: magic, version, row count, offset of the row table, offset and length of the metadata
+    row payloads: pickled dictionaries
+    name tables: pickled name -> id dictionary per language
+    row table: (id, offset, length) per row, in map order
+    metadata: pickled dictionary with the map settings and the name table locations
+"""
+
+import array
+import collections
+from collections.abc import Mapping
+import mmap
+import os
+import pickle
+import struct
+import tempfile
+
+from .datamap import DataMap, NameSet
+from .datarow import DataRow
+
+MAGIC = b'MHDS'
+VERSION = 1
+
+_header = struct.Struct('<4sIIQQQ')
+_row_entry = struct.Struct('<qQQ')
+
+
+def write_snapshot(data_map: DataMap, path):
+    """Writes a DataMap to a snapshot file.
+    Row ids must be integers. The file is replaced at the end, so readers never see a partial file."""
+    rows = []
+    body = bytearray()
+    offset = _header.size
+
+    def append(payload):
+        nonlocal offset
+        start = offset
+        body.extend(payload)
+        offset += len(payload)
+        return (start, len(payload))
+
+    for entry_id, entry in data_map.items():
+        payload = pickle.dumps(entry.to_dict(), pickle.HIGHEST_PROTOCOL)
+        rows.append((entry_id, *append(payload)))
+
+    # Name tables cover the map's key languages (or all languages if it has none).
+    # A language with a duplicate name gets no table, and raises when looked up,
+    # like a DataMap that indexes the language lazily
+    name_tables = collections.OrderedDict()
+    duplicates = {}
+    for entry in data_map.values():
+        for lang, name in entry.names():
+            if name is None: continue
+            if data_map.languages and lang not in data_map.languages: continue
+            if lang in duplicates: continue
+
+            names = name_tables.setdefault(lang, {})
+            if name in names:
+                duplicates[lang] = name
+                del name_tables[lang]
+                continue
+            names[name] = entry.id
+
+    name_locations = {}
+    for lang, names in name_tables.items():
+        name_locations[lang] = append(pickle.dumps(names, pickle.HIGHEST_PROTOCOL))
+
+    row_table_offset = offset
+    for row in rows:
+        append(_row_entry.pack(*row))
+
+    metadata = {
+        'languages': data_map.languages,
+        'start_id': data_map.start_id,
+        'names': name_locations,
+        'duplicates': duplicates,
+    }
+    metadata_offset, metadata_length = append(pickle.dumps(metadata, pickle.HIGHEST_PROTOCOL))
+
+    header = _header.pack(MAGIC, VERSION, len(rows), row_table_offset, metadata_offset, metadata_length)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(header)
+            f.write(body)
+        os.replace(temp_path, path)
+    except:
+        os.remove(temp_path)
+        raise
+
+
+class SnapshotMap(Mapping):
+    """A read only DataMap backed by a memory-mapped snapshot file (see write_snapshot).
+
+    Supports the lookup functions of a DataMap (id_of, entry_of, names, to_dict),
+    and rows are decoded into DataRows when first accessed.
+    Rows should be treated as read only, use to_datamap() to get a map that can be changed.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count, table_offset, meta_offset, meta_length = _header.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{path} is not a supported DataMap snapshot")
+
+        metadata = pickle.loads(self._mmap[meta_offset:meta_offset+meta_length])
+        self.languages = metadata['languages']
+        self.start_id = metadata['start_id']
+        self._name_locations = metadata['names']
+        self._duplicates = metadata.get('duplicates', {})
+
+        # Read the ids, which are the first field of each row table entry
+        table = self._mmap[table_offset:table_offset+count*_row_entry.size]
+        self._ids = array.array('q', (row[0] for row in _row_entry.iter_unpack(table)))
+
+        self._table_offset = table_offset
+        self._positions = { entry_id:idx for (idx, entry_id) in enumerate(self._ids) }
+
+        self._rows = {}
+        self._names = {}
+        self._layouts = {}
+
+    def _read(self, offset, length):
+        return pickle.loads(self._mmap[offset:offset+length])
+
+    def _names_for(self, language_code):
+        names = self._names.get(language_code, None)
+        if names is None:
+            if language_code in self._duplicates:
+                name = self._duplicates[language_code]
+                raise ValueError(f"Duplicate name ({language_code}, {name}) in DataMap")
+            location = self._name_locations.get(language_code, None)
+            names = self._read(*location) if location else {}
+            self._names[language_code] = names
+        return names
+
+    def id_of(self, language_code, name):
+        "Returns the id of the entry that has the name in the language. Otherwise returns None"
+        if self.languages and language_code not in self.languages:
+            return None
+        return self._names_for(language_code).get(name, None)
+
+    def entry_of(self, language_code, name):
+        "Returns the entry that has the name in the language. Otherwise returns None"
+        entry_id = self.id_of(language_code, name)
+        if entry_id is None:
+            return None
+        return self[entry_id]
+
+    def names(self, language_code):
+        "Returns a set like object of all the names in a given language"
+        return NameSet(self, language_code)
+
+    def to_dict(self):
+        return { entry_id:entry.to_dict() for (entry_id, entry) in self.items() }
+
+    def to_list(self):
+        return [entry.to_dict() for entry in self.values()]
+
+    def to_datamap(self):
+        "Decodes all rows into a regular DataMap"
+        return DataMap(self.to_dict(), languages=self.languages, start_id=self.start_id,
+            lazy_languages=self._duplicates.keys())
+
+    def close(self):
+        self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __getitem__(self, entry_id) -> DataRow:
+        row = self._rows.get(entry_id, None)
+        if row is None:
+            idx = self._positions[entry_id]
+            _, offset, length = _row_entry.unpack_from(
+                self._mmap, self._table_offset + idx * _row_entry.size)
+            row = DataRow(entry_id, self._read(offset, length), layouts=self._layouts)
+            self._rows[entry_id] = row
+        return row
+
+    def __contains__(self, entry_id):
+        return entry_id in self._positions
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+
+def open_snapshot(path) -> SnapshotMap:
+    "Opens a snapshot file written by write_snapshot()"
+    return SnapshotMap(path)
@@ -1,8 +1,8 @@
 import json
 import os.path
 
-from mhdata.util import joindicts, extract_fields, group_fields
-from .datamap import DataMap
+from mhdata.util import joindicts, extract_fields, GroupPlan
+from .datamap import DataMap, MergeSource
 from .reader import DataReader
 
 class DataStitcher:
@@ -15,6 +15,9 @@ class DataStitcher:
      - groups - If you have defense_base and defense_map, you can use group defense
                 to join them together as defense: { base: val, max: val}.
                 Not necessary if a schema is provided to get() that handles it.
+
+    Attached files are read immediately, but are only merged into the base map
+    when the result is needed. They are then all joined at once using DataMap.merge_all.
     """
 
     def __init__(self, reader: DataReader, *, join_lang='en', dir=''):
@@ -22,6 +25,7 @@ class DataStitcher:
         self.join_lang = join_lang
         self.dir = dir
         self._data_map = None
+        self._pending = []
 
     def _get_filename(self, filename):
         "Gets a filename relative to the internal dir, if any."
@@ -29,22 +33,36 @@ class DataStitcher:
             return os.path.join(self.dir, filename)
         return filename
 
+    def _attach(self, data, *, lang, key, filename):
+        "Internal: Queues name keyed data to be merged into the base map"
+        if self._data_map is None:
+            raise Exception("Data Map uninitialize, use a load datamap function first")
+        if data:
+            self._pending.append(MergeSource(data, lang, key, filename))
+
     @property
     def data_map(self):
+        "Returns the base map, with all attached data merged in"
         if self._data_map is None:
             raise Exception("Data Map uninitialize, use a load datamap function first")
+        if self._pending:
+            pending = self._pending
+            self._pending = []
+            self._data_map.merge_all(pending)
         return self._data_map
 
     def base_csv(self, data_file, *, groups=[]):
         """Sets the base map from a CSV file, and return self"""
         data_file = self._get_filename(data_file)
         self._data_map = self.reader.load_base_csv(data_file, groups=groups)
+        self._pending = []
         return self
 
     def base_json(self, data_file):
         # NOTE: this will be removed in a later version
         data_file = self._get_filename(data_file)
         self._data_map = self.reader.load_base_json(data_file)
+        self._pending = []
         return self
 
     def extend_base(self, filename, *, groups=[]):
@@ -60,6 +78,9 @@ class DataStitcher:
         # Get first column name, whose values will anchor the data to merge
         first_column_name = next(iter(dataitems[0].keys()))
 
+        # The columns are the same for every row, so the grouping is planned once
+        plan = GroupPlan([k for k in dataitems[0].keys() if k != first_column_name], list(groups))
+
         results = {}
         for item in dataitems:
             key = item[first_column_name]
@@ -67,9 +88,9 @@ class DataStitcher:
             # Remove the join from the subdata
             item.pop(first_column_name) 
             
-            results[key] = group_fields(item, groups=groups)
+            results[key] = plan.apply(item)
 
-        self.data_map.merge(results)
+        self._attach(results, lang='en', key=None, filename=filename)
 
         return self
 
@@ -81,11 +102,9 @@ class DataStitcher:
         Otherwise it will be merged without overwrite.
         """
 
-        self.reader.load_data_json(
-            parent_map=self.data_map, 
-            data_file=self._get_filename(data_file), 
-            lang=self.join_lang, 
-            key=key)
+        data_file = self._get_filename(data_file)
+        data = self.reader.read_data_json(data_file)
+        self._attach(data, lang=self.join_lang, key=key, filename=data_file)
 
         return self
 
@@ -98,12 +117,9 @@ class DataStitcher:
         Otherwise it will be merged without overwrite.
         """
 
-        self.reader.load_data_csv(
-            parent_map=self.data_map, 
-            data_file=self._get_filename(data_file),
-            key=key,
-            groups=groups,
-            leaftype="list")
+        data_file = self._get_filename(data_file)
+        lang, data = self.reader.read_data_csv(data_file, key=key, groups=groups, leaftype="list")
+        self._attach(data, lang=lang, key=key, filename=data_file)
 
         return self
 
@@ -116,12 +132,9 @@ class DataStitcher:
         Otherwise it will be merged without overwrite.
         """
 
-        self.reader.load_data_csv(
-            parent_map=self.data_map, 
-            data_file=self._get_filename(data_file),
-            key=key,
-            groups=groups,
-            leaftype="dict")
+        data_file = self._get_filename(data_file)
+        lang, data = self.reader.read_data_csv(data_file, key=key, groups=groups, leaftype="dict")
+        self._attach(data, lang=lang, key=key, filename=data_file)
 
         return self
     
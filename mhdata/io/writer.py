@@ -3,6 +3,8 @@
 
 import json
 import collections
+import collections.abc
+import multiprocessing
 import os
 import os.path
 
@@ -10,27 +12,44 @@ import mhdata.util as util
 from .datamap import DataMap
 from .reader import DataReader
 
-from .functions import flatten
-from mhdata.util import ungroup_fields
-from mhdata.io.csv import save_csv
+from .functions import iter_flatten
+from mhdata.util import ungroup_fields, extract_fields
+from mhdata.io.csv import save_csv, stage_csv, create_staged, commit_staged
 
 class DataReaderWriter(DataReader):
     "A data reader that can also be used to create and update data"
 
-    def save_csv(self, location, rows, *, schema=None):
-        "Saves a raw csv relative to the source data location"
+    def session(self, *, parallel=True):
+        """Returns a WriterSession, which queues files and writes them all at once.
+        If parallel is true, files are written in worker processes.
+        Use it as a context manager, the files are written when the block exits without errors."""
+        return WriterSession(self, parallel=parallel)
+
+    def _map_rows(self, data_map):
+        "Returns the rows of a data map as a list of dictionaries, which can be changed"
+        return data_map.to_list()
+
+    def _extract(self, data_map, key, fields, lang):
+        "Returns the result of data_map.extract(), which should not be changed"
+        return data_map.extract(key=key, fields=fields, lang=lang)
+
+    def save_csv(self, location, rows, *, schema=None, fields=None):
+        """Saves a raw csv relative to the source data location.
+        Returns true if the file changed (see mhdata.io.csv.save_csv)"""
         if schema:
             rows, errors = schema.dump(rows, many=True)
         location = self.get_data_path(location)
-        save_csv(rows, location)
+        return save_csv(rows, location, fields=fields)
+
+    def _save_json(self, location, data):
+        """Saves data as a json file at a full path.
+        Returns true if the file changed, unchanged files are left untouched"""
+        return commit_staged(_stage_json(location, data), location)
 
     def save_base_map(self, location, base_map):
-        "Writes a data map to a location in the data directory"
+        "Writes a data map to a location in the data directory. Returns true if the file changed"
         location = self.get_data_path(location)
-        result = base_map.to_list()
-
-        with open(location, 'w', encoding='utf-8') as f:
-            json.dump(result, f, indent=4, ensure_ascii=False)
+        return self._save_json(location, base_map.to_list())
 
     def save_base_map_csv(self, location, base_map, *, groups=['name'], schema=None, translation_filename=None, translation_extra=[]):
         """
@@ -42,7 +61,7 @@ class DataReaderWriter(DataReader):
         if 'name' not in groups:
             raise Exception("Name is a required group for base maps")
 
-        rows = base_map.to_list()
+        rows = self._map_rows(base_map)
 
         if translation_filename:
             translations = []
@@ -75,12 +94,12 @@ class DataReaderWriter(DataReader):
         If key is given, then the saving is restricted to what's inside that key.
         If fields are given, only fields within the list are exported.
 
-        At least one of key or fields is required
+        At least one of key or fields is required.
+        Returns true if the file changed.
         """
         location = self.get_data_path(location)
         result = data_map.extract(key=key, fields=fields, lang=lang)
-        with open(location, 'w', encoding='utf-8') as f:
-            json.dump(result, f, indent=4, ensure_ascii=False)
+        return self._save_json(location, result)
 
     def save_data_csv(self, location, data_map, *,
             lang='en',
@@ -98,16 +117,16 @@ class DataReaderWriter(DataReader):
 
         TODO: Write about nest_additional and groups
         """
-        extracted = data_map.extract(key=key, fields=fields, lang=lang)
-        flattened_rows = flatten(extracted, nest=['base_name_'+lang] + nest_additional)
+        extracted = self._extract(data_map, key, fields, lang)
+        flattened_rows = iter_flatten(extracted, nest=['base_name_'+lang] + nest_additional)
         flattened_rows = [ungroup_fields(v, groups=groups) for v in flattened_rows]
 
-        self.save_csv(location, flattened_rows, schema=schema)
+        return self.save_csv(location, flattened_rows, schema=schema)
 
     def save_keymap_csv(self, location, data: dict, schema=None):
         "Saves a dict as a csv, where the key becomes a value called key"
         data = [ { 'key': key, **value } for key, value in data.items() ]
-        self.save_csv(location, data, schema=schema)
+        return self.save_csv(location, data, schema=schema)
 
     def save_split_data_map(self, location, base_map, data_map, key_field, lang='en'):
         """Writes a DataMap to a folder as separated json files.
@@ -143,5 +162,138 @@ class DataReaderWriter(DataReader):
             if not os.path.commonprefix([location, file_location]):
                 raise Exception(f"Invalid Key Location {file_location}")
 
-            with open(file_location, 'w', encoding='utf-8') as f:
-                json.dump(items, f, indent=4, ensure_ascii=False)
+            self._save_json(file_location, items)
+
+
+def _stage_json(location, data):
+    "Writes data as json to a temporary file next to location, and returns its path"
+    fd, temp_path = create_staged(location)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=4, ensure_ascii=False)
+    except:
+        os.remove(temp_path)
+        raise
+    return temp_path
+
+def _stage_csv(location, rows, schema_class, fields):
+    "Dumps rows using the schema class, and writes them to a temporary csv file next to location"
+    if schema_class:
+        rows, errors = schema_class().dump(rows, many=True)
+    return stage_csv(rows, location, fields=fields)
+
+def _stage_output(output):
+    """Writes a queued file to a temporary file. Used as the target of worker processes.
+    Returns a tuple (temporary path, None), or (None, exception) if it failed."""
+    stage_fn, location, args = output
+    try:
+        return (stage_fn(location, *args), None)
+    except Exception as ex:
+        return (None, ex)
+
+
+class WriterSession(DataReaderWriter):
+    """A DataReaderWriter that queues files instead of writing them, created by DataReaderWriter.session().
+
+    Extracted data is read from the data maps without being copied,
+    and each map is converted to rows at most once, however many files are written from it.
+    On commit, files are dumped and written to temporary files (in worker processes if parallel),
+    and only once all of them succeed are they moved into place.
+    Files with unchanged contents are left untouched.
+    The save methods return None, as nothing is written until then. commit() returns the changed files.
+
+    Schemas are recreated from their class in the worker processes,
+    so schemas given to a session must not require constructor arguments.
+    """
+
+    def __init__(self, writer: DataReaderWriter, *, parallel=True):
+        super().__init__(
+            languages=writer.languages,
+            required_languages=writer.required_languages,
+            data_path=writer.data_path)
+        self.parallel = parallel
+        self._outputs = []
+        self._map_cache = {} # id -> (data map, rows)
+
+    def _cached_rows(self, data_map):
+        cached = self._map_cache.get(id(data_map), None)
+        if cached is None:
+            cached = self._map_cache[id(data_map)] = (data_map, data_map.to_list())
+        return cached[1]
+
+    def _map_rows(self, data_map):
+        # Rows are changed by the caller, so only the outer dictionary is copied
+        return [dict(row) for row in self._cached_rows(data_map)]
+
+    def _extract(self, data_map, key, fields, lang):
+        "Same as DataMap.extract(), but the results share values with the data map instead of copying them"
+        if not key and not fields:
+            raise ValueError(
+                "Either a key or a list of fields " +
+                "must be given when persisting a data map")
+
+        result = {}
+        for entry in data_map.values():
+            name = entry.name(lang)
+            if key:
+                if not entry.get(key, None):
+                    continue
+                entry = entry[key]
+
+            if not isinstance(entry, collections.abc.Mapping):
+                result[name] = entry
+            elif fields:
+                result[name] = extract_fields(entry, *fields)
+            else:
+                result[name] = entry
+        return result
+
+    def save_csv(self, location, rows, *, schema=None, fields=None):
+        "Queues a raw csv relative to the source data location, to be written on commit"
+        location = self.get_data_path(location)
+        self._outputs.append((_stage_csv, location, (rows, type(schema) if schema else None, fields)))
+
+    def _save_json(self, location, data):
+        "Queues a json file at a full path, to be written on commit"
+        self._outputs.append((_stage_json, location, (data,)))
+
+    def commit(self):
+        """Writes all queued files, and returns the list of files that changed (as full paths).
+        If any file can't be written, none of them are, and the error is raised"""
+        outputs, self._outputs = self._outputs, []
+        self._map_cache = {}
+
+        processes = min(len(outputs), os.cpu_count() or 1)
+        if self.parallel and processes > 1:
+            with multiprocessing.Pool(processes) as pool:
+                staged = pool.map(_stage_output, outputs)
+        else:
+            staged = [_stage_output(output) for output in outputs]
+
+        # Only move files into place if all of them were written
+        errors = [ex for (_, ex) in staged if ex is not None]
+        if errors:
+            for temp_path, _ in staged:
+                if temp_path:
+                    os.remove(temp_path)
+            raise errors[0]
+
+        changed = []
+        for (temp_path, _), (_, location, _) in zip(staged, outputs):
+            if commit_staged(temp_path, location):
+                changed.append(location)
+        return changed
+
+    def discard(self):
+        "Discards all queued files"
+        self._outputs = []
+        self._map_cache = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.discard()
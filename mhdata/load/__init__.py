@@ -4,22 +4,41 @@ This module can read and write data to and from the source_data/ folder,
 validate the data, and do postprocessing.
 
 Use load_data to load the source data as is, or load_data_processed
-to perform post processing and validation. Use the datafn submodule's
+to perform post processing and validation. Use load_data_lazy if only
+some of the data is needed. Use the datafn submodule's
 collection of helper functions to better read this data.
 """
 
-from .loaddata import load_data
+from .loaddata import load_data, LazyData
 from .validate import validate
 
-def load_data_processed():
-    "Loads data from source_data/ folder, and validates and post-processes it"
+def _get_processors():
+    "Returns a mapping of attribute -> post processing functions"
     from . import process
+    return {
+        'skill_map': [process.copy_skill_descriptions],
+        'decoration_map': [process.extend_decoration_chances]
+    }
 
+def load_data_processed(*, parallel_validation=False, incremental_validation=False):
+    """Loads data from source_data/ folder, and validates and post-processes it.
+    The validation options are passed to validate()."""
     mhdata = load_data()
-    process.copy_skill_descriptions(mhdata.skill_map)
-    process.extend_decoration_chances(mhdata.decoration_map)
+    for attribute, processors in _get_processors().items():
+        for processor in processors:
+            processor(getattr(mhdata, attribute))
 
-    if not validate(mhdata):
+    if not validate(mhdata, parallel=parallel_validation, incremental=incremental_validation):
         raise Exception("Validation Failed")
 
-    return mhdata
\ No newline at end of file
+    return mhdata
+
+def load_data_lazy(*, processed=False):
+    """Returns an object with the same attributes as load_data,
+    that only loads each part of the data the first time it is accessed.
+
+    If processed is true, post processing is performed as each part is loaded.
+    Validation is not performed, as it requires all data to be loaded.
+    """
+    processors = _get_processors() if processed else {}
+    return LazyData(processors=processors)
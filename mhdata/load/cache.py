@@ -0,0 +1,107 @@
+"""
+A persistent cache of loaded data, used to skip parsing and schema conversion.
+
+Loaded data is cached per domain (a source_data subfolder) as a pickle file.
+Each cache file stores the signature of every file in the domain folder
+(path, modification time, size, and content hash) as well as a signature of the loading code.
+A cache entry is used only if all of these still match.
+If only the modification time changed, the content hash decides.
+"""
+
+import hashlib
+import os
+import os.path
+import pickle
+import tempfile
+
+from mhdata.util import hash_file
+
+def get_code_signature():
+    "Returns a hash of the mhdata package source, so that code changes invalidate the cache"
+    package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sha = hashlib.sha256()
+    for root, dirs, files in os.walk(package_dir):
+        dirs.sort()
+        for filename in sorted(files):
+            if not filename.endswith('.py'):
+                continue
+            path = os.path.join(root, filename)
+            sha.update(os.path.relpath(path, package_dir).encode('utf-8'))
+            sha.update(hash_file(path).encode('utf-8'))
+    return sha.hexdigest()
+
+class LoadCache:
+    """Reads and writes cached domain data.
+    data_path is the source data folder, and cache_dir is where cache files are written."""
+
+    def __init__(self, data_path, cache_dir):
+        self.data_path = data_path
+        self.cache_dir = cache_dir
+        self._code_signature = None
+
+    @property
+    def code_signature(self):
+        if self._code_signature is None:
+            self._code_signature = get_code_signature()
+        return self._code_signature
+
+    def _cache_filename(self, domain):
+        return os.path.join(self.cache_dir, f'{domain}.pickle')
+
+    def _domain_files(self, domain):
+        "Returns a mapping of relative path -> os.stat result for all files in the domain folder"
+        results = {}
+        domain_path = os.path.join(self.data_path, domain)
+        for root, dirs, files in os.walk(domain_path):
+            for filename in files:
+                path = os.path.join(root, filename)
+                rel_path = os.path.relpath(path, self.data_path).replace(os.sep, '/')
+                results[rel_path] = os.stat(path)
+        return results
+
+    def signatures(self, domain, previous={}):
+        """Returns relative path -> (mtime, size, hash) for the domain's files.
+        Hashes are reused from previous signatures if the mtime and size are unchanged."""
+        results = {}
+        for rel_path, stat in self._domain_files(domain).items():
+            old_mtime, old_size, old_hash = previous.get(rel_path, (None, None, None))
+            if old_mtime == stat.st_mtime_ns and old_size == stat.st_size:
+                file_hash = old_hash
+            else:
+                file_hash = hash_file(os.path.join(self.data_path, rel_path))
+            results[rel_path] = (stat.st_mtime_ns, stat.st_size, file_hash)
+        return results
+
+    def get(self, domain):
+        "Returns the cached data for a domain, or None if there is no valid cache entry"
+        try:
+            with open(self._cache_filename(domain), 'rb') as f:
+                code_signature, signatures = pickle.load(f)
+                if code_signature != self.code_signature:
+                    return None
+
+                current = self.signatures(domain, signatures)
+                stored_hashes = { path:sig[2] for (path, sig) in signatures.items() }
+                current_hashes = { path:sig[2] for (path, sig) in current.items() }
+                if stored_hashes != current_hashes:
+                    return None
+
+                return pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def put(self, domain, signatures, data):
+        """Stores the data for a domain, keyed by file signatures.
+        Signatures should be taken before loading, so that edits made during the load are caught."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        # Write to a temporary file first, so a failed write doesn't leave a broken cache
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((self.code_signature, signatures), f, pickle.HIGHEST_PROTOCOL)
+                pickle.dump(data, f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._cache_filename(domain))
+        except:
+            os.remove(temp_path)
+            raise
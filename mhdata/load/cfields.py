@@ -4,6 +4,7 @@ Custom fields used by the marshmallow schema
 
 import collections
 from marshmallow import fields, ValidationError, Schema, pre_load, post_dump
+from marshmallow.schema import MarshalResult, UnmarshalResult
 
 from mhdata.util import group_fields, ungroup_fields
 
@@ -46,17 +47,93 @@ class ExcelBool(NullableBool):
         else:
             return 'FALSE'
 
+def _to_int(value):
+    "Converts a csv value to int. Invalid values are left as is for the schema to report"
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+def _bool_converter(field):
+    "Returns a function that converts a csv value to a boolean using the field's values"
+    def to_bool(value):
+        if value in field.truthy:
+            return True
+        elif value in field.falsy:
+            return False
+        return value
+    return to_bool
+
 class NestedPrefix(fields.Nested):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **{ 'many': False, **kwargs })
         self.prefix = kwargs.get('prefix', None)
 
 class BaseSchema(Schema):
-    "Base class for all schemas in this project"
+    """Base class for all schemas in this project.
+    Loads and dumps go through a compiled version of the schema (see compiler.py),
+    falling back to marshmallow if the compiled version can't handle the data."""
     __groups__ = ()
+    _compiled = False # False means not compiled yet, None means it can't be compiled
     class Meta:
         ordered = True
 
+    def get_compiled(self):
+        "Returns the compiled version of this schema, or None if it can't be compiled"
+        if self._compiled is False:
+            from .compiler import compile_schema
+            self._compiled = compile_schema(self)
+        return self._compiled
+
+    def get_column_types(self, header):
+        """Returns a mapping of csv column -> conversion function for the columns in header
+        that this schema loads as ints or booleans. Used to type values as a csv is read.
+        Columns are matched to fields the same way group_fields does it."""
+        groups = list(self.__groups__ or []) + self.identify_prefixes()
+        columns_by_group = {}
+        for column in header:
+            group = next((g for g in groups if column.startswith(g + '_')), None)
+            columns_by_group.setdefault(group, []).append(column)
+
+        ungrouped = columns_by_group.get(None, [])
+        results = {}
+        for name, field in self.fields.items():
+            if isinstance(field, NestedPrefix):
+                prefix = field.prefix or name
+                subcolumns = { c[len(prefix)+1:]:c for c in columns_by_group.get(prefix, []) }
+                nested_types = field.schema.get_column_types(list(subcolumns.keys()))
+                for subcolumn, converter in nested_types.items():
+                    results[subcolumns[subcolumn]] = converter
+            elif name not in ungrouped:
+                continue
+            elif type(field) is fields.Integer:
+                results[name] = _to_int
+            elif isinstance(field, fields.Boolean) and field.truthy:
+                results[name] = _bool_converter(field)
+        return results
+
+    def load(self, data, many=None, partial=None):
+        compiled = self.get_compiled()
+        if compiled and partial is None:
+            many = self.many if many is None else bool(many)
+            try:
+                return UnmarshalResult(compiled.load(data, many), {})
+            except Exception:
+                pass # rerun through marshmallow, which reports the errors
+
+        return super().load(data, many=many, partial=partial)
+
+    def dump(self, obj, many=None, update_fields=True, **kwargs):
+        compiled = self.get_compiled()
+        if compiled and not kwargs:
+            many = self.many if many is None else bool(many)
+            try:
+                return MarshalResult(compiled.dump(obj, many), {})
+            except Exception:
+                pass # rerun through marshmallow, which reports the errors
+
+        return super().dump(obj, many=many, update_fields=update_fields, **kwargs)
+
     def identify_prefixes(self):
         "Identifies all potential prefixes by examining the fields"
         # note: could be made more efficient via caching? See if there is a way to dirty check fields
@@ -0,0 +1,220 @@
+"""
+Compiles marshmallow schemas into specialized converter functions.
+
+Marshmallow runs every row through generic machinery (processors, the unmarshaller,
+error stores, and per-field wrappers), and our BaseSchema recomputes its groups per row.
+A compiled schema precomputes the groups and a conversion plan for every field,
+and performs the same conversions with as little per-row work as possible.
+
+Compiled converters only implement the success path. If anything goes wrong,
+they raise and the schema falls back to marshmallow, which reruns the conversion
+and reports errors the usual way. This keeps results and error messages identical.
+"""
+
+import collections
+
+from marshmallow import fields, missing, utils, Schema
+from marshmallow.decorators import PRE_LOAD, POST_DUMP, VALIDATES
+
+from mhdata.util import ungroup_fields
+
+# Processors that BaseSchema registers, which the compiled converters reproduce
+supported_processors = {
+    (PRE_LOAD, False): ['group_fields'],
+    (POST_DUMP, False): ['ungroup_fields'],
+}
+
+class ConversionFailed(Exception):
+    "Raised by compiled converters when a value needs to go through marshmallow"
+
+def _fail(*args):
+    raise ConversionFailed()
+
+def _field_is_compilable(name, field):
+    return (
+        '.' not in name
+        and field.attribute is None
+        and field.load_from is None
+        and field.dump_to is None
+        and not field.load_only
+        and not field.dump_only)
+
+def _schema_is_compilable(schema):
+    "Returns true if the schema doesn't use any options the compiler doesn't handle"
+    if (schema.only is not None or schema.exclude or schema.opts.exclude
+            or schema.opts.fields or schema.opts.additional
+            or schema.load_only or schema.dump_only
+            or schema.partial or schema.extra or schema.prefix):
+        return False
+
+    if type(schema).get_attribute is not Schema.get_attribute:
+        return False
+    if schema.__accessor__ or schema.__error_handler__:
+        return False
+
+    for tag, names in schema.__processors__.items():
+        if tag == (VALIDATES, False):
+            continue
+        if names and supported_processors.get(tag) != names:
+            return False
+
+    return all(_field_is_compilable(name, field) for name, field in schema.fields.items())
+
+def _compile_deserialize(name, field):
+    "Returns a function (value, data) -> deserialized value for a field"
+    field_type = type(field)
+    validators = list(field.validators)
+
+    if field_type is fields.Integer:
+        convert = lambda value, data: int(value)
+    elif field_type is fields.String:
+        convert = lambda value, data: value if isinstance(value, str) else _fail()
+    elif field_type is fields.Dict:
+        mapping_type = collections.Mapping
+        convert = lambda value, data: value if isinstance(value, mapping_type) else _fail()
+    else:
+        # Any other field (nested, booleans, lists) uses the field's own deserialize
+        return lambda value, data: field.deserialize(value, name, data)
+
+    allow_none = field.allow_none is True
+
+    def deserialize(value, data):
+        if value is None:
+            if allow_none:
+                return None
+            _fail()
+        result = convert(value, data)
+        for validator in validators:
+            if validator(result) is False:
+                _fail()
+        return result
+    return deserialize
+
+def _compile_serialize(name, field):
+    "Returns a function (value, obj) -> serialized value for a field"
+    field_type = type(field)
+
+    if field_type is fields.Integer and not field.as_string:
+        return lambda value, obj: None if value is None else int(value)
+    elif field_type is fields.String:
+        def serialize_str(value, obj):
+            if value is None or type(value) is str:
+                return value
+            return field._serialize(value, name, obj)
+        return serialize_str
+    elif field_type._serialize is fields.Field._serialize:
+        return lambda value, obj: value
+    else:
+        return lambda value, obj: field._serialize(value, name, obj)
+
+class CompiledSchema:
+    """Converter functions compiled from a marshmallow schema instance.
+    Use load_one and dump_one, which raise ConversionFailed (or any other exception)
+    if the value must be converted by marshmallow instead."""
+
+    def __init__(self, schema):
+        self.groups = list(schema.__groups__ or []) + schema.identify_prefixes()
+        self.dict_class = schema.dict_class
+
+        # Maps each key seen so far to the groups it could belong to, in order
+        self.key_groups = {}
+
+        self.load_plan = []
+        self.dump_plan = []
+        for name, field in schema.fields.items():
+            self.load_plan.append(
+                (name, field.missing, field.required, _compile_deserialize(name, field)))
+            self.dump_plan.append((name, field.default, _compile_serialize(name, field)))
+
+        self.field_validators = []
+        for attr_name in schema.__processors__[(VALIDATES, False)]:
+            validator = getattr(schema, attr_name)
+            field_name = validator.__marshmallow_kwargs__[(VALIDATES, False)]['field_name']
+            self.field_validators.append((field_name, validator))
+
+    def _key_groups(self, key):
+        matches = tuple(g for g in self.groups if key.startswith(g + '_'))
+        self.key_groups[key] = matches
+        return matches
+
+    def group_fields(self, data):
+        "Same as mhdata.util.group_fields, but remembers which group each key belongs to"
+        key_groups = self.key_groups
+        already_grouped = [g for g in self.groups if isinstance(data.get(g), collections.Mapping)]
+
+        result = {}
+        for key, value in data.items():
+            matches = key_groups.get(key)
+            if matches is None:
+                matches = self._key_groups(key)
+            if already_grouped:
+                matches = [g for g in matches if g not in already_grouped]
+            if not matches:
+                result[key] = value
+                continue
+
+            group_name = matches[0]
+            subkey = key[len(group_name)+1:]
+            result.setdefault(group_name, {})[subkey] = value
+
+        return result
+
+    def load_one(self, data):
+        if not isinstance(data, collections.Mapping):
+            _fail()
+        data = self.group_fields(data)
+        get_value = data.get
+
+        result = self.dict_class()
+        for name, default, required, deserialize in self.load_plan:
+            value = get_value(name, missing)
+            if value is missing:
+                value = default() if callable(default) else default
+                if value is missing:
+                    if required:
+                        _fail()
+                    continue
+            result[name] = deserialize(value, data)
+
+        for name, validator in self.field_validators:
+            if name in result and validator(result[name]) is missing:
+                result.pop(name)
+
+        return result
+
+    def dump_one(self, obj):
+        result = self.dict_class()
+        for name, default, serialize in self.dump_plan:
+            try:
+                value = obj[name]
+            except (KeyError, AttributeError, IndexError, TypeError):
+                value = utils.get_value(name, obj, missing)
+
+            if value is missing:
+                value = default() if callable(default) else default
+                if value is not missing:
+                    result[name] = value
+                continue
+            result[name] = serialize(value, obj)
+
+        return ungroup_fields(result, groups=self.groups)
+
+    def load(self, data, many):
+        if many:
+            return [self.load_one(item) for item in data]
+        return self.load_one(data)
+
+    def dump(self, obj, many):
+        if many:
+            if not utils.is_iterable_but_not_string(obj):
+                _fail()
+            return [self.dump_one(item) for item in obj]
+        if not isinstance(obj, collections.Mapping):
+            _fail()
+        return self.dump_one(obj)
+
+def compile_schema(schema):
+    "Compiles a schema instance. Returns None if the schema uses unsupported features"
+    if not _schema_is_compilable(schema):
+        return None
+    return CompiledSchema(schema)
@@ -1,3 +1,6 @@
+import collections
+import multiprocessing
+import os
 import os.path
 from os.path import abspath, join, dirname
 from types import SimpleNamespace
@@ -7,13 +10,16 @@ from mhdata.io import DataMap, DataReader, DataStitcher, create_reader
 from mhdata.io.csv import read_csv
 
 from . import schema
+from .cache import LoadCache
 
 reader = create_reader()
 
 def transform_dmap(dmap: DataMap, obj_schema):
     """Returns a new datamap, 
-    where the items in the original have run through the marshmallow schema."""
-    results = DataMap()
+    where the items in the original have run through the marshmallow schema.
+    Only the required languages are indexed upfront, the others are indexed when first looked up."""
+    lazy_languages = [lang for lang in cfg.all_languages if lang not in cfg.required_languages]
+    results = DataMap(lazy_languages=lazy_languages)
     for entry_id, entry in dmap.items():
         data = entry.to_dict()
         (converted, errors) = obj_schema.load(data, many=False) # converted
@@ -24,45 +30,49 @@ def transform_dmap(dmap: DataMap, obj_schema):
         results.add_entry(entry_id, converted)
     return results
 
-def load_data():
-    """Loads all data from the source_data/ directory
-    
-    All data is merged together using data stitchers and run through a schema.
-    The schemas perform additional type transformations, column merging into dicts (groups),
-    and minor validations.
-    """
-    result = SimpleNamespace()
-
-    result.item_map = (DataStitcher(reader, dir="items")
+def load_items():
+    item_map = (DataStitcher(reader, dir="items")
                     .base_csv("item_base.csv")
                     .extend_base("item_base_translations.csv")
                     .get(schema=schema.ItemSchema()))
 
-    result.item_combinations = reader.load_list_csv(
+    item_combinations = reader.load_list_csv(
         'items/item_combination_list.csv',
         schema=schema.ItemCombinationSchema())
 
-    result.location_map = (DataStitcher(reader, dir="locations/")
+    return { 'item_map': item_map, 'item_combinations': item_combinations }
+
+def load_locations():
+    location_map = (DataStitcher(reader, dir="locations/")
                     .base_csv('location_base.csv')
                     .add_csv("location_items.csv", key="items")
                     .add_csv("location_camps.csv", key="camps")
                     .get(schema=schema.LocationSchema()))
 
-    result.skill_map = (DataStitcher(reader, dir="skills/")
+    return { 'location_map': location_map }
+
+def load_skills():
+    skill_map = (DataStitcher(reader, dir="skills/")
                     .base_csv("skill_base.csv")
                     .extend_base('skill_base_translations.csv')
                     .add_csv("skill_levels.csv", key="levels")
                     .get(schema=schema.SkillSchema()))
 
-    result.charm_map = (DataStitcher(reader, dir="charms/")
+    return { 'skill_map': skill_map }
+
+def load_charms():
+    charm_map = (DataStitcher(reader, dir="charms/")
                     .base_csv("charm_base.csv")
                     .extend_base('charm_base_translations.csv')
                     .add_json("charm_ext.json")
                     .get(schema=schema.CharmSchema()))
 
-    result.monster_reward_conditions_map = reader.load_base_csv("monsters/reward_conditions_base.csv")
+    return { 'charm_map': charm_map }
 
-    result.monster_map = (DataStitcher(reader, dir="monsters/")
+def load_monsters():
+    monster_reward_conditions_map = reader.load_base_csv("monsters/reward_conditions_base.csv")
+
+    monster_map = (DataStitcher(reader, dir="monsters/")
                     .base_csv("monster_base.csv")
                     .extend_base("monster_base_translations.csv")
                     .add_json("monster_weaknesses.json", key="weaknesses")
@@ -73,28 +83,41 @@ def load_data():
                     .add_csv("monster_rewards.csv", key="rewards")
                     .get(schema=schema.MonsterSchema()))
 
-    result.armor_map = (DataStitcher(reader, dir="armors/")
+    return {
+        'monster_reward_conditions_map': monster_reward_conditions_map,
+        'monster_map': monster_map
+    }
+
+def load_armor():
+    armor_map = (DataStitcher(reader, dir="armors/")
                     .base_csv("armor_base.csv")
                     .extend_base("armor_base_translations.csv")
                     .add_csv_ext("armor_craft_ext.csv", key="craft")
                     .add_csv_ext("armor_skills_ext.csv", key="skills")
                     .get(schema=schema.ArmorSchema()))
 
-    result.armorset_map = (DataStitcher(reader, dir="armors/")
+    armorset_map = (DataStitcher(reader, dir="armors/")
                     .base_csv("armorset_base.csv")
                     .extend_base("armorset_base_translations.csv")
                     .get(schema=schema.ArmorSetSchema()))
 
-    result.armorset_bonus_map = (DataStitcher(reader, dir="armors/")
+    armorset_bonus_map = (DataStitcher(reader, dir="armors/")
                     .base_csv("armorset_bonus_base.csv")
                     .extend_base("armorset_bonus_base_translations.csv")
                     .get(schema=schema.ArmorSetBonus()))
 
+    return {
+        'armor_map': armor_map,
+        'armorset_map': armorset_map,
+        'armorset_bonus_map': armorset_bonus_map
+    }
+
+def load_weapons():
     # Load Ammo config.
-    result.weapon_ammo_map = reader.load_keymap_csv("weapons/weapon_ammo.csv", schema.WeaponAmmoSchema())
+    weapon_ammo_map = reader.load_keymap_csv("weapons/weapon_ammo.csv", schema.WeaponAmmoSchema())
 
     # Load weapon data
-    result.weapon_map = (DataStitcher(reader, dir="weapons/")
+    weapon_map = (DataStitcher(reader, dir="weapons/")
                     .base_csv("weapon_base.csv")
                     .extend_base('weapon_base_translations.csv')
                     .add_csv_ext("weapon_sharpness.csv", key="sharpness")
@@ -103,12 +126,145 @@ def load_data():
                     .get(schema=schema.WeaponSchema()))
 
     # Load weapon hunting horn songs
-    result.weapon_melodies = reader.load_list_csv("weapons/weapon_melodies.csv", schema=schema.WeaponMelodySchema())
+    weapon_melodies = reader.load_list_csv("weapons/weapon_melodies.csv", schema=schema.WeaponMelodySchema())
 
-    # Load decoration data
-    result.decoration_map = (DataStitcher(reader, dir="decorations/")
+    return {
+        'weapon_ammo_map': weapon_ammo_map,
+        'weapon_map': weapon_map,
+        'weapon_melodies': weapon_melodies
+    }
+
+def load_decorations():
+    decoration_map = (DataStitcher(reader, dir="decorations/")
                     .base_csv("decoration_base.csv")
                     .extend_base('decoration_base_translations.csv')
                     .get(schema=schema.DecorationSchema()))
 
-    return result
\ No newline at end of file
+    return { 'decoration_map': decoration_map }
+
+"""A mapping of domain -> loader function.
+The domain is the source_data subfolder the loader reads from.
+Loaders return a dictionary of the attributes they add to the loaded data."""
+domain_loaders = collections.OrderedDict([
+    ('items', load_items),
+    ('locations', load_locations),
+    ('skills', load_skills),
+    ('charms', load_charms),
+    ('monsters', load_monsters),
+    ('armors', load_armor),
+    ('weapons', load_weapons),
+    ('decorations', load_decorations),
+])
+
+"A mapping of attribute -> the domain that loads it. Used by LazyData"
+attribute_domains = {
+    'item_map': 'items',
+    'item_combinations': 'items',
+    'location_map': 'locations',
+    'skill_map': 'skills',
+    'charm_map': 'charms',
+    'monster_reward_conditions_map': 'monsters',
+    'monster_map': 'monsters',
+    'armor_map': 'armors',
+    'armorset_map': 'armors',
+    'armorset_bonus_map': 'armors',
+    'weapon_ammo_map': 'weapons',
+    'weapon_map': 'weapons',
+    'weapon_melodies': 'weapons',
+    'decoration_map': 'decorations',
+}
+
+def create_cache():
+    "Creates a LoadCache that stores cached data in the project's .cache folder"
+    cache_dir = join(dirname(abspath(__file__)), '../../.cache/load_data')
+    return LoadCache(reader.data_path, os.path.normpath(cache_dir))
+
+def _load_domain(domain):
+    "Loads a single domain by name. Used as the target of worker processes"
+    return domain_loaders[domain]()
+
+def load_domain(domain, cache=None):
+    """Loads a single domain, returning a dictionary of attribute -> value.
+    If a LoadCache is given, it is used to read and store the result."""
+    values = cache.get(domain) if cache else None
+    if values is None:
+        signatures = cache.signatures(domain) if cache else None
+        values = _load_domain(domain)
+        if cache:
+            cache.put(domain, signatures, values)
+    return values
+
+class LazyData:
+    """A namespace of loaded data, where each domain is loaded the first time
+    one of its attributes is accessed. Has the same attributes as load_data's result.
+
+    processors is a mapping of attribute -> list of functions.
+    Each function is called with the attribute's value once its domain loads.
+    """
+
+    def __init__(self, *, use_cache=True, processors={}):
+        self._cache = create_cache() if use_cache else None
+        self._processors = processors
+        self._loaded_domains = []
+
+    def __getattr__(self, name):
+        # Only called for attributes that haven't been set yet
+        domain = attribute_domains.get(name, None)
+        if name.startswith('_') or domain is None:
+            raise AttributeError(f"Loaded data has no attribute {name}")
+
+        values = load_domain(domain, self._cache)
+        self._loaded_domains.append(domain)
+        for key, value in values.items():
+            setattr(self, key, value)
+        for key, value in values.items():
+            for processor in self._processors.get(key, []):
+                processor(value)
+
+        return self.__dict__[name]
+
+    def loaded_domains(self):
+        "Returns the list of domains that have been loaded so far"
+        return list(self._loaded_domains)
+
+def load_data(*, use_cache=True, parallel=False):
+    """Loads all data from the source_data/ directory
+    
+    All data is merged together using data stitchers and run through a schema.
+    The schemas perform additional type transformations, column merging into dicts (groups),
+    and minor validations.
+
+    If use_cache is true, each domain is read from the load cache if its files are unchanged,
+    and the cache is updated for the domains that had to be loaded.
+
+    If parallel is true, domains that need to be loaded are loaded in a process pool.
+    The result is the same as a sequential load.
+    """
+    cache = create_cache() if use_cache else None
+
+    # Domain -> loaded values. Anything still None needs to be loaded
+    loaded = collections.OrderedDict((domain, None) for domain in domain_loaders)
+    if cache:
+        for domain in loaded:
+            loaded[domain] = cache.get(domain)
+
+    missing = [domain for domain, values in loaded.items() if values is None]
+    signatures = { domain: cache.signatures(domain) for domain in missing } if cache else {}
+
+    if parallel and len(missing) > 1:
+        with multiprocessing.Pool(min(len(missing), os.cpu_count() or 1)) as pool:
+            results = pool.map(_load_domain, missing)
+    else:
+        results = [_load_domain(domain) for domain in missing]
+
+    for domain, values in zip(missing, results):
+        loaded[domain] = values
+        if cache:
+            cache.put(domain, signatures[domain], values)
+
+    result = SimpleNamespace()
+    for values in loaded.values():
+        for key, value in values.items():
+            setattr(result, key, value)
+
+    return result
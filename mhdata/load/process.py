@@ -58,10 +58,12 @@ def extend_decoration_chances(decoration_map: DataMap):
     drop_tables = rarity_to_table.values()
     
     # Calculate how many entries there are per drop table type
+    entries_by_rarity = decoration_map.group_by('rarity')
+
     table_counts = { table:0 for table in drop_tables }
-    for entry in decoration_map.values():
-        table = rarity_to_table[entry['rarity']]
-        table_counts[table] += 1
+    for rarity, entries in entries_by_rarity.items():
+        table = rarity_to_table[rarity]
+        table_counts[table] += len(entries)
 
     # Create an odds map for each drop table level
     # This maps droptable -> feystone -> probability
@@ -74,6 +76,7 @@ def extend_decoration_chances(decoration_map: DataMap):
             odds_map[table][feystone] = value.quantize(Decimal('1.00000'))
 
     # Assign the odds map for the drop table level to the decoration itself
-    for entry in decoration_map.values():
-        table_name = rarity_to_table[entry['rarity']]
-        entry['chances'] = odds_map[table_name]
+    for rarity, entries in entries_by_rarity.items():
+        table_name = rarity_to_table[rarity]
+        for entry in entries:
+            entry['chances'] = odds_map[table_name]
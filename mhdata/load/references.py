@@ -0,0 +1,133 @@
+"""
+Declarative reference checks between loaded data.
+
+A Reference describes a field of one part of the data (like the items of a recipe)
+that must contain names from another DataMap (like item_map).
+Each reference gathers every referenced name into a set, and looks up each distinct
+name in the target once. Rows are only revisited to build error messages
+when a name is missing.
+"""
+
+import collections
+import collections.abc
+
+from mhdata.io import DataRow
+
+
+def _iter_path(value, path):
+    "Iterates over the values at the path (a tuple of keys), going into every list along the way"
+    if isinstance(value, collections.abc.Mapping):
+        if not path:
+            yield value
+            return
+        key, rest = path[0], path[1:]
+        if key not in value:
+            return
+        yield from _iter_path(value[key], rest)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _iter_path(item, path)
+    elif not path:
+        yield value
+
+
+class Reference:
+    """A rule that the names found in a part of the data exist in a target DataMap.
+
+    source and target are attribute names of the loaded data. The names are found using either
+    a field, which is a key or tuple of keys (lists are traversed automatically),
+    or a function that iterates over an entry. Functions may return tuples,
+    in which case the first value is the name (like the iterators in datafn).
+
+    The names are checked in the lang language. If lang_field is given,
+    the language is instead read from that key of the object containing the field.
+
+    The message is formatted with the missing {name},
+    and the english name of the source {entry}, if the source is a DataMap.
+    """
+
+    def __init__(self, source, target, message, *, field=None, fn=None, lang='en', lang_field=None):
+        if (field is None) == (fn is None):
+            raise ValueError("A reference requires either a field or a fn")
+        if lang_field and not field:
+            raise ValueError("lang_field can only be used with a field")
+
+        self.source = source
+        self.target = target
+        self.message = message
+        self.field = field if isinstance(field, tuple) or field is None else (field,)
+        self.fn = fn
+        self.lang = lang
+        self.lang_field = lang_field
+
+    def iter_names(self, entry):
+        "Iterates over the (lang, name) pairs referenced by an entry. Empty names are skipped"
+        if self.fn:
+            for value in self.fn(entry):
+                name = value[0] if isinstance(value, tuple) else value
+                if name:
+                    yield (self.lang, name)
+            return
+
+        if not self.lang_field:
+            for name in _iter_path(entry, self.field):
+                if name:
+                    yield (self.lang, name)
+            return
+
+        parent_path, key = self.field[:-1], self.field[-1]
+        for parent in _iter_path(entry, parent_path):
+            name = parent.get(key, None)
+            if name:
+                yield (parent.get(self.lang_field, self.lang), name)
+
+    def _entries(self, mhdata):
+        source = getattr(mhdata, self.source)
+        if isinstance(source, collections.abc.Mapping):
+            return source.values()
+        return source
+
+    def missing(self, mhdata, entries=None):
+        """Returns a list of (entry, name) for every reference to a name that doesn't exist.
+        Entry is the row of the source that contains the reference.
+        If entries is given, only those entries of the source are checked."""
+        if entries is None:
+            entries = self._entries(mhdata)
+
+        names_by_lang = collections.defaultdict(set)
+        for entry in entries:
+            for lang, name in self.iter_names(entry):
+                names_by_lang[lang].add(name)
+
+        # Each distinct name is looked up once using the target's name index.
+        # A language the target doesn't index has no names, so they are all missing
+        target = getattr(mhdata, self.target)
+        missing = set()
+        for lang, names in names_by_lang.items():
+            missing.update((lang, name) for name in names if target.id_of(lang, name) is None)
+
+        if not missing:
+            return []
+
+        results = []
+        for entry in entries:
+            for lang, name in self.iter_names(entry):
+                if (lang, name) in missing:
+                    results.append((entry, name))
+        return results
+
+    def errors(self, mhdata, entries=None):
+        "Returns the error messages for every missing reference, without duplicates"
+        errors = collections.OrderedDict()
+        for entry, name in self.missing(mhdata, entries):
+            entry_name = entry.name('en') if isinstance(entry, DataRow) else None
+            errors[self.message.format(name=name, entry=entry_name)] = True
+        return list(errors.keys())
+
+
+def check_references(mhdata, references):
+    "Checks every reference, returning a list of error messages"
+    errors = []
+    for reference in references:
+        errors.extend(reference.errors(mhdata))
+    return errors
@@ -1,23 +1,93 @@
-import itertools
 import collections
+import os.path
 
 from mhdata import cfg
 from mhdata.io import DataMap
 from mhdata.util import ensure_warn
 
 from . import datafn
-
-def validate(mhdata):
-    "Perform all validations, print out the errors, and return if it succeeded or not"
-    errors = []
-    errors.extend(validate_items(mhdata))
-    errors.extend(validate_locations(mhdata))
-    errors.extend(validate_monsters(mhdata))
-    errors.extend(validate_monster_rewards(mhdata))
-    errors.extend(validate_skills(mhdata))
-    errors.extend(validate_armor(mhdata))
-    errors.extend(validate_weapons(mhdata))
-    errors.extend(validate_charms(mhdata))
+from .references import Reference
+from .validation import Validator, ValidationState, run_validators
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def _iter_combination_items(combo):
+    "Iterates over the items of an item combination"
+    return (combo['result'], combo['first'], combo['second'])
+
+def _iter_weapon_craft(weapon):
+    "Iterates over the items of all recipes of a weapon. Kulve weapons aren't crafted, so are skipped"
+    if weapon['category'] == 'Kulve':
+        return
+    for recipe in weapon.get('craft', None) or []:
+        yield from datafn.iter_weapon_recipe(recipe)
+
+
+# References between the loaded data, checked with every validation
+references = [
+    Reference('item_combinations', 'item_map', "{name} in combinations doesn't exist",
+        fn=_iter_combination_items),
+    Reference('location_map', 'item_map', "{name} in location items doesn't exist",
+        field=('items', 'item'), lang_field='item_lang'),
+    Reference('armorset_map', 'monster_map', "Armorset {entry} has invalid monster {name}",
+        field='monster'),
+    Reference('armor_map', 'item_map', "Item {name} in armors does not exist",
+        fn=datafn.iter_armor_recipe),
+    Reference('armor_map', 'skill_map', "Skill {name} in armors does not exist",
+        fn=datafn.iter_skill_points),
+    Reference('armorset_bonus_map', 'skill_map', "Skill {name} in set bonuses does not exist",
+        fn=datafn.iter_setbonus_skills),
+    Reference('weapon_map', 'item_map', "Weapon {entry} has invalid item {name} in a recipe",
+        fn=_iter_weapon_craft),
+    Reference('weapon_map', 'weapon_map', "Weapon {entry} has invalid previous weapon {name}",
+        field='previous_en'),
+    Reference('charm_map', 'charm_map', "Charm {name} for previous_en does not exist",
+        field='previous_en'),
+]
+
+# References of monster rewards. Monsters with invalid rewards skip the percentage checks.
+reward_references = [
+    Reference('monster_map', 'monster_reward_conditions_map', "Invalid condition {name} in monster {entry}",
+        field=('rewards', 'condition_en')),
+    Reference('monster_map', 'item_map', "Monster reward item {name} doesn't exist",
+        field=('rewards', 'item_en')),
+]
+
+
+def create_validation_state():
+    "Creates a ValidationState stored in the project's .cache folder"
+    state_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '../../.cache/validate')
+    return ValidationState(os.path.normpath(state_dir))
+
+def get_validators():
+    "Returns the list of all validators. Each one can run independently of the others"
+    validators = [
+        Validator(reference.errors, source=reference.source, depends=[reference.target])
+            for reference in references]
+    validators.extend([
+        Validator(validate_monsters, source='monster_map'),
+        Validator(validate_monster_rewards, source='monster_map',
+            depends=['item_map', 'monster_reward_conditions_map']),
+        Validator(validate_skills, source='skill_map'),
+        Validator(validate_armor, depends=['armorset_map', 'armor_map']),
+        Validator(validate_weapons, source='weapon_map', depends=['weapon_ammo_map']),
+        Validator(validate_weapon_ammo, depends=['weapon_ammo_map']),
+        Validator(validate_unique_names, depends=unique_name_maps),
+    ])
+    return validators
+
+def validate(mhdata, *, parallel=False, incremental=False):
+    """Perform all validations, print out the errors, and return if it succeeded or not.
+
+    If parallel is true, validators run in a process pool.
+    If incremental is true, only entries that changed since the last successful
+    incremental validation are checked. Otherwise everything is validated."""
+    state = create_validation_state() if incremental else None
+    errors = run_validators(mhdata, get_validators(), parallel=parallel, state=state)
 
     if errors:
         for error in errors:
@@ -27,42 +97,32 @@ def validate(mhdata):
     return True
 
 
-def validate_items(mhdata):
-    errors = []
+"The data maps whose names must be unique in every language"
+unique_name_maps = [
+    'item_map', 'location_map', 'skill_map', 'charm_map', 'monster_reward_conditions_map',
+    'monster_map', 'armor_map', 'armorset_map', 'armorset_bonus_map', 'weapon_map', 'decoration_map'
+]
 
-    # check for existance in item combinations
-    for combo in mhdata.item_combinations:
-        items = (combo['result'], combo['first'], combo['second'])
-        items = filter(None, items)  # removes nulls
-        for item in items:
-            if item not in mhdata.item_map.names('en'):
-                errors.append(f"{item} in combinations doesn't exist")
-
-    return errors
-
-
-def validate_locations(mhdata):
+def validate_unique_names(mhdata):
+    "Checks for duplicate names in the languages that the data maps don't index upfront"
     errors = []
-
-    for location_entry in mhdata.location_map.values():
-        for item_entry in location_entry['items']:
-            item_lang = item_entry['item_lang']
-            item_name = item_entry['item']
-            if item_name not in mhdata.item_map.names(item_lang):
-                errors.append(f"{item_name} in location items doesn't exist")
-
+    for attr in unique_name_maps:
+        for lang, name in getattr(mhdata, attr).duplicate_names():
+            errors.append(f"Duplicate name ({lang}, {name}) in {attr}")
     return errors
 
 
-def validate_monsters(mhdata):
+def validate_monsters(mhdata, entries=None):
     errors = []
+    if entries is None:
+        entries = mhdata.monster_map.values()
 
     # Check that all monsters have hitzones
-    for entry in mhdata.monster_map.values():
+    for entry in entries:
         ensure_warn('hitzones' in entry, f"Monster {entry.name('en')} missing hitzones")
     
     # Check that large monsters have weakness and normal is included
-    for entry in mhdata.monster_map.values():
+    for entry in entries:
         if entry['size'] == 'small':
             continue
 
@@ -78,10 +138,33 @@ def validate_monsters(mhdata):
     return errors
 
 
-def validate_monster_rewards(mhdata):
+def _failed_group_sums(codes, values, capped):
+    """Sums values by group code, and returns the codes of the groups that fail.
+    Groups that are capped must sum to exactly 100, the others to at least 100."""
+    if np is not None:
+        sums = np.bincount(
+            np.array(codes, dtype=np.intp),
+            weights=np.array(values, dtype=np.float64),
+            minlength=len(capped))
+        failed = np.where(np.array(capped, dtype=bool), sums != 100, sums < 100)
+        return np.flatnonzero(failed).tolist()
+
+    sums = [0] * len(capped)
+    for code, value in zip(codes, values):
+        sums[code] += value
+    return [code for (code, (total, is_capped)) in enumerate(zip(sums, capped))
+                if (total != 100 if is_capped else total < 100)]
+
+
+def validate_monster_rewards(mhdata, entries=None):
     """Validates monster rewards for sane values. 
     Certain fields (like carve) sum to 100, 
-    Others (like quest rewards) must be at least 100%"""
+    Others (like quest rewards) must be at least 100%
+
+    All rewards are gathered into one table of monster, rank, condition and percentage,
+    and the percentages are summed per (monster, rank, condition) group in a single pass
+    (using numpy if it is installed).
+    If entries is given, only those monsters are validated."""
 
     # Those other than these are validated for 100% drop rate EXACT.
     # Quest rewards sometimes contain a guaranteed reward.
@@ -90,61 +173,76 @@ def validate_monster_rewards(mhdata):
     uncapped_conditions = ("Quest Reward (Bronze)")
 
     errors = set()
-    
-    for monster_id, entry in mhdata.monster_map.items():
+    invalid_monsters = set()
+    if entries is None:
+        entries = mhdata.monster_map.values()
+
+    for reference in reward_references:
+        for entry, name in reference.missing(mhdata, entries):
+            errors.add(reference.message.format(name=name, entry=entry.name('en')))
+            invalid_monsters.add(entry.id)
+
+    # Reward table, with one column per field
+    monsters = []
+    ranks = []
+    conditions = []
+    percentages = []
+
+    for entry in entries:
         if 'rewards' not in entry:
             continue
 
-        monster_name = entry.name('en') # used for error display
-
-        # accumulates percentages by rank
-        reward_percentages = { rank:[] for rank in cfg.supported_ranks }
-
-        valid = True
+        monster_id = entry.id
         for reward in entry['rewards']:
-            condition = reward['condition_en']
             rank = reward['rank']
-
-            # ensure condition exists
-            if condition not in mhdata.monster_reward_conditions_map.names('en'):
-                errors.add(f"Invalid condition {condition} in monster {monster_name}")
-                valid = False
-
-            if reward['item_en'] not in mhdata.item_map.names('en'):
-                errors.add(f"Monster reward item {reward['item_en']} doesn't exist")
-                valid = False
-
             if rank not in cfg.supported_ranks:
-                errors.add(f"Unsupported rank {rank} in {monster_name} rewards")
-                valid = False
-
-        if not valid:
+                errors.add(f"Unsupported rank {rank} in {entry.name('en')} rewards")
+                invalid_monsters.add(monster_id)
+
+            monsters.append(monster_id)
+            ranks.append(rank)
+            conditions.append(reward['condition_en'])
+            percentages.append(int(reward['percentage']))
+
+    # Assign a code to every (monster, rank, condition) group of a valid monster
+    group_codes = collections.OrderedDict()
+    codes = []
+    values = []
+    for monster_id, rank, condition, percentage in zip(monsters, ranks, conditions, percentages):
+        if monster_id in invalid_monsters:
             continue
-        
-        # Ensure percentage is correct (at or greater than 100)
-        rank_reward_key_fn = lambda r: (r['rank'], r['condition_en'])
-        sorted_rewards = sorted(entry['rewards'], key=rank_reward_key_fn)
-        for (rank, condition), items in itertools.groupby(sorted_rewards, rank_reward_key_fn):
-            percentage_sum = sum((int(r['percentage']) for r in items), 0)
-
-            key_str = f"(rank {rank} condition {condition})"
-            error_start = f"Rewards %'s for monster {monster_name} {key_str}"
-            if condition not in uncapped_conditions:
-                ensure_warn(
-                    percentage_sum == 100, 
-                    f"{error_start} does not sum to 100")
-            else:
-                ensure_warn(
-                    percentage_sum >= 100, 
-                    f"{error_start} does not sum to at least 100")
+        key = (monster_id, rank, condition)
+        code = group_codes.get(key, None)
+        if code is None:
+            code = group_codes[key] = len(group_codes)
+        codes.append(code)
+        values.append(percentage)
+
+    group_keys = list(group_codes.keys())
+    capped = [condition not in uncapped_conditions for (_, _, condition) in group_keys]
+    failed = [group_keys[code] for code in _failed_group_sums(codes, values, capped)]
+
+    # Warn in map order, and by rank and condition within a monster
+    monster_order = { monster_id:idx for (idx, monster_id) in enumerate(mhdata.monster_map.keys()) }
+    failed.sort(key=lambda key: (monster_order[key[0]], key[1], key[2]))
+    for monster_id, rank, condition in failed:
+        monster_name = mhdata.monster_map[monster_id].name('en')
+        key_str = f"(rank {rank} condition {condition})"
+        error_start = f"Rewards %'s for monster {monster_name} {key_str}"
+        if condition not in uncapped_conditions:
+            ensure_warn(False, f"{error_start} does not sum to 100")
+        else:
+            ensure_warn(False, f"{error_start} does not sum to at least 100")
 
     return errors
 
 
-def validate_skills(mhdata):
+def validate_skills(mhdata, entries=None):
     errors = []
+    if entries is None:
+        entries = mhdata.skill_map.values()
 
-    for skill in mhdata.skill_map.values():
+    for skill in entries:
         skill_name = skill['name']['en']
         expected_max = len(skill['levels'])
         encountered_levels = set()
@@ -170,10 +268,6 @@ def validate_armor(mhdata):
     for setentry in mhdata.armorset_map.values():
         setname = setentry.name('en')
 
-        monster_name = setentry['monster']
-        if monster_name and not monster_name in mhdata.monster_map.names('en'):
-            errors.append(f"Armorset {setname} has invalid monster {monster_name}")
-        
         # All armor pieces in the set
         armor_names = [setentry[part] for part in cfg.armor_parts]
         armor_names = list(filter(None, armor_names))
@@ -199,39 +293,19 @@ def validate_armor(mhdata):
         if armor_entry.id not in encountered_armors:
             errors.append(f"Armor {armor_entry.name('en')} is not in an armor set")
 
-        # Ensure items exist
-        for item_name, _ in datafn.iter_armor_recipe(armor_entry):
-            if item_name not in mhdata.item_map.names('en'):
-                errors.append(f"Item {item_name} in armors does not exist")
-
-        # Ensure skills exist
-        for skill_name, _ in datafn.iter_skill_points(armor_entry):
-            if skill_name not in mhdata.skill_map.names('en'):
-                errors.append(f"Skill {skill_name} in armors does not exist")
-
-    # Validate Armorset bonuses
-    for bonus_entry in mhdata.armorset_bonus_map.values():
-        for skill_name, _ in datafn.iter_setbonus_skills(bonus_entry):
-            if skill_name not in mhdata.skill_map.names('en'):
-                errors.append(f"Skill {skill_name} in set bonuses does not exist")
-
     return errors
 
-def validate_weapons(mhdata):
+def validate_weapons(mhdata, entries=None):
     errors = []
-    for entry in mhdata.weapon_map.values():
+    if entries is None:
+        entries = mhdata.weapon_map.values()
+
+    for entry in entries:
         name = entry.name('en')
         weapon_type = entry['weapon_type']
 
-        if entry['category'] != 'Kulve':
-            if not entry.get('craft', {}):
-                errors.append(f"Weapon {name} does not have any recipes")
-            else:
-                # Check if items in the recipe exist
-                for recipe in entry['craft']:
-                    for item, quantity in datafn.iter_weapon_recipe(recipe):
-                        if item not in mhdata.item_map.names('en'):
-                            errors.append(f"Weapon {name} has invalid item {item} in a recipe")
+        if entry['category'] != 'Kulve' and not entry.get('craft', {}):
+            errors.append(f"Weapon {name} does not have any recipes")
         
         if weapon_type in cfg.weapon_types_melee and not entry.get('sharpness', None):
             errors.append(f"Melee weapon {name} does not have a sharpness value")
@@ -260,6 +334,11 @@ def validate_weapons(mhdata):
         if int(true_attack) != true_attack:
             print(f"WARNING: Weapon {name} has a suspicious true attack value {true_attack}")
 
+    return errors
+
+def validate_weapon_ammo(mhdata):
+    errors = []
+
     # Validate weapon ammo settings. Bullet types with clip size zero must have "null state" other attributes.
     for name, ammo_entry in mhdata.weapon_ammo_map.items():
         for key, data in ammo_entry.items():
@@ -281,14 +360,3 @@ def validate_weapons(mhdata):
                     errors.append(f"{name} is missing reload value for {key}") 
 
     return errors
-
-def validate_charms(mhdata):
-    errors = []
-
-    names = mhdata.charm_map.names("en")
-    for entry in mhdata.charm_map.values():
-        previous_entry = entry['previous_en']
-        if previous_entry is not None and previous_entry not in names:
-            errors.append(f"Charm {previous_entry} for previous_en does not exist")
-
-    return errors
\ No newline at end of file
@@ -0,0 +1,176 @@
+"""
+Runs validators over loaded data, in parallel and incrementally.
+
+Each Validator declares the parts of the loaded data it reads.
+Validators don't depend on each other, so they can run in a process pool.
+Anything a validator prints is captured and printed in validator order.
+
+For incremental runs, a content hash of every entry is stored after a run without errors.
+The next run only checks the source entries that were added or changed.
+A validator is run in full if any of the other data it reads changed.
+"""
+
+import collections.abc
+import contextlib
+import hashlib
+import io
+import multiprocessing
+import os
+import os.path
+import pickle
+import tempfile
+
+from .cache import get_code_signature
+
+
+class Validator:
+    """A validation function, along with the attributes of the loaded data it reads.
+
+    If source is given, the function is called as fn(mhdata, entries),
+    where entries are the values of the source to check, or None to check all of them.
+    Otherwise the function is called as fn(mhdata).
+    depends are the other attributes the function reads.
+    """
+
+    def __init__(self, fn, *, source=None, depends=()):
+        self.fn = fn
+        self.source = source
+        self.depends = tuple(depends)
+
+    @property
+    def attributes(self):
+        "All attributes of the loaded data that this validator reads"
+        return ((self.source,) if self.source else ()) + self.depends
+
+    def run(self, mhdata, keys=None):
+        """Runs the validator, returning a list of errors.
+        keys limits the check to those keys (or list indices) of the source."""
+        if not self.source:
+            return list(self.fn(mhdata))
+
+        entries = None
+        if keys is not None:
+            source = getattr(mhdata, self.source)
+            entries = [source[key] for key in keys]
+        return list(self.fn(mhdata, entries))
+
+
+def _entry_hash(value):
+    # DataRows pickle as their keys and values, so this hashes the contents.
+    # Equal contents could pickle differently, which only causes an extra check.
+    return hashlib.sha1(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)).digest()
+
+def hash_entries(value):
+    "Returns a dictionary of key -> content hash for every entry of a mapping or list"
+    if isinstance(value, collections.abc.Mapping):
+        return { key:_entry_hash(entry) for (key, entry) in value.items() }
+    return { idx:_entry_hash(entry) for (idx, entry) in enumerate(value) }
+
+
+class ValidationState:
+    """The entry hashes of the last validation without errors.
+    Stored as a pickle file in state_dir, along with a signature of the mhdata code."""
+
+    def __init__(self, state_dir):
+        self.state_dir = state_dir
+
+    @property
+    def filename(self):
+        return os.path.join(self.state_dir, 'hashes.pickle')
+
+    def load(self):
+        "Returns a dictionary of attribute -> entry hashes, or None if there is no valid state"
+        try:
+            with open(self.filename, 'rb') as f:
+                code_signature, hashes = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return None
+        if code_signature != get_code_signature():
+            return None
+        return hashes
+
+    def save(self, hashes):
+        os.makedirs(self.state_dir, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.state_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump((get_code_signature(), hashes), f, pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.filename)
+        except:
+            os.remove(temp_path)
+            raise
+
+
+def plan_validators(validators, hashes, previous):
+    """Returns a list of (validator, keys) for the validators that need to run.
+    keys is None if the validator should check everything.
+    hashes and previous are the current and last clean entry hashes by attribute."""
+    if previous is None:
+        return [(validator, None) for validator in validators]
+
+    changed_attributes = { attr for (attr, values) in hashes.items() if previous.get(attr, None) != values }
+
+    results = []
+    for validator in validators:
+        if any(attr in changed_attributes for attr in validator.depends):
+            results.append((validator, None))
+        elif validator.source in changed_attributes:
+            old = previous.get(validator.source, {})
+            keys = [key for (key, value) in hashes[validator.source].items() if old.get(key, None) != value]
+            if keys:
+                results.append((validator, keys))
+    return results
+
+
+# The loaded data in worker processes, set by _init_worker
+_worker_data = None
+
+def _init_worker(mhdata):
+    global _worker_data
+    _worker_data = mhdata
+
+def _run_captured(validator, mhdata, keys):
+    "Runs a validator, returning (errors, printed output)"
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        errors = validator.run(mhdata, keys)
+    return (errors, output.getvalue())
+
+def _run_task(task):
+    "Runs a (validator, keys) task in a worker process"
+    validator, keys = task
+    return _run_captured(validator, _worker_data, keys)
+
+
+def run_validators(mhdata, validators, *, parallel=False, state=None):
+    """Runs the validators and returns a list of all errors.
+    Anything printed by the validators is printed once they complete, in validator order.
+
+    If parallel is true, the validators run in a process pool.
+    If a ValidationState is given, only entries that changed since the last
+    run without errors are validated, and the state is updated if there are no errors.
+    """
+    hashes = None
+    tasks = [(validator, None) for validator in validators]
+    if state is not None:
+        attributes = { attr for validator in validators for attr in validator.attributes }
+        hashes = { attr:hash_entries(getattr(mhdata, attr)) for attr in attributes }
+        tasks = plan_validators(validators, hashes, state.load())
+
+    if parallel and len(tasks) > 1:
+        # Workers receive the data once through the initializer, which is free when forking
+        processes = min(len(tasks), os.cpu_count() or 1)
+        with multiprocessing.Pool(processes, initializer=_init_worker, initargs=(mhdata,)) as pool:
+            results = pool.map(_run_task, tasks)
+    else:
+        results = [_run_captured(validator, mhdata, keys) for (validator, keys) in tasks]
+
+    errors = []
+    for task_errors, output in results:
+        print(output, end='')
+        errors.extend(task_errors)
+
+    if state is not None and not errors:
+        state.save(hashes)
+
+    return errors
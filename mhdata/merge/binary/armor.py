@@ -1,9 +1,9 @@
 from mhdata.io import create_writer, DataMap
-from mhdata.load import load_data, schema, datafn
+from mhdata.load import load_data_lazy, schema, datafn
 from mhdata.util import OrderedSet, bidict
 
 from mhw_armor_edit.ftypes import am_dat, eq_crt, arm_up, skl_pt_dat
-from .load import load_schema, load_text, ItemTextHandler, SkillTextHandler, convert_recipe, load_armor_series
+from .load import load_schema, closes_schemas, load_text, ItemTextHandler, SkillTextHandler, convert_recipe, load_armor_series
 from .items import add_missing_items
 
 from mhdata import cfg
@@ -13,6 +13,7 @@ from . import artifacts
 # Index based gender restriction
 gender_list = [None, 'male', 'female', 'both']
 
+@closes_schemas
 def update_armor():
     "Populates and updates armor information using the armorset_base as a source of truth"
     
@@ -27,7 +28,7 @@ def update_armor():
     
     print("Binary armor data loaded")
 
-    mhdata = load_data()
+    mhdata = load_data_lazy()
     print("Existing Data loaded. Using existing armorset data to drive new armor data.")
     
     print("Writing list of armorset names (in order) to artifacts")
@@ -141,38 +142,38 @@ def update_armor():
         new_armorset_bonus_map.insert({ **bonus_entry, 'name': name_dict })
 
     # Write new data
-    writer = create_writer()
-
-    writer.save_base_map_csv(
-        "armors/armorset_base.csv", 
-        new_armorset_map, 
-        schema=schema.ArmorSetSchema(),
-        translation_filename="armors/armorset_base_translations.csv")
-
-    writer.save_base_map_csv(
-        "armors/armor_base.csv", 
-        new_armor_map, 
-        schema=schema.ArmorBaseSchema(),
-        translation_filename="armors/armor_base_translations.csv")
-
-    writer.save_data_csv(
-        "armors/armor_skills_ext.csv",
-        new_armor_map,
-        key="skills"
-    )
-
-    writer.save_data_csv(
-        "armors/armor_craft_ext.csv",
-        new_armor_map,
-        key="craft"
-    )
-
-    writer.save_base_map_csv(
-        "armors/armorset_bonus_base.csv",
-        new_armorset_bonus_map,
-        schema=schema.ArmorSetBonus(),
-        translation_filename="armors/armorset_bonus_base_translations.csv"
-    )
+    # All files are written together once the session ends
+    with create_writer().session() as session:
+        session.save_base_map_csv(
+            "armors/armorset_base.csv", 
+            new_armorset_map, 
+            schema=schema.ArmorSetSchema(),
+            translation_filename="armors/armorset_base_translations.csv")
+
+        session.save_base_map_csv(
+            "armors/armor_base.csv", 
+            new_armor_map, 
+            schema=schema.ArmorBaseSchema(),
+            translation_filename="armors/armor_base_translations.csv")
+
+        session.save_data_csv(
+            "armors/armor_skills_ext.csv",
+            new_armor_map,
+            key="skills"
+        )
+
+        session.save_data_csv(
+            "armors/armor_craft_ext.csv",
+            new_armor_map,
+            key="craft"
+        )
+
+        session.save_base_map_csv(
+            "armors/armorset_bonus_base.csv",
+            new_armorset_bonus_map,
+            schema=schema.ArmorSetBonus(),
+            translation_filename="armors/armorset_bonus_base_translations.csv"
+        )
 
     print("Armor files updated\n")
 
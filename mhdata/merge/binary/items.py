@@ -1,11 +1,11 @@
 from typing import Iterable
 
 from mhdata.io import create_writer, DataMap
-from mhdata.load import load_data, schema
+from mhdata.load import load_data_lazy, schema
 
 from mhw_armor_edit.ftypes import itm
 
-from .load import load_schema, load_text, ItemTextHandler
+from .load import load_schema, closes_schemas, load_text, ItemTextHandler
 
 # Index based item type
 item_type_list = [
@@ -16,9 +16,10 @@ item_type_list = [
     'jewel'
 ]
 
+@closes_schemas
 def add_missing_items(encountered_item_ids: Iterable[int], *, mhdata=None):
     if not mhdata:
-        mhdata = load_data()
+        mhdata = load_data_lazy()
         print("Existing Data loaded. Using to expand item list")
 
     item_data = sorted(
@@ -93,12 +94,10 @@ def add_missing_items(encountered_item_ids: Iterable[int], *, mhdata=None):
     # Third pass. Items need to be reordered based on type
 
     unsorted_item_map = new_item_map # store reference to former map
+    unsorted_item_map.add_index('category').add_index('subcategory')
     def filter_category(category, subcategory=None):
         "helper that returns items and then removes from unsorted item map"
-        results = []
-        for item in unsorted_item_map.values():
-            if item['category'] == category and item['subcategory'] == subcategory:
-                results.append(item)
+        results = unsorted_item_map.where(category=category, subcategory=subcategory)
         for result in results:
             del unsorted_item_map[result.id]
         return results
@@ -1,3 +1,4 @@
+import functools
 from typing import Type, Mapping, Iterable
 from os.path import dirname, abspath, join
 import re
@@ -57,11 +58,33 @@ weapon_types = [
     cfg.CHARGE_BLADE, cfg.INSECT_GLAIVE, cfg.BOW, cfg.HEAVY_BOWGUN, cfg.LIGHT_BOWGUN
 ]
 
+# Read-only struct files opened by load_schema, which are closed by closes_schemas
+_open_schemas = []
+
 def load_schema(schema: Type[ftypes.StructFile], relative_dir: str) -> ftypes.StructFile:
-    "Uses an ftypes struct file class to load() a file relative to the chunk directory"
+    """Uses an ftypes struct file class to load() a file relative to the chunk directory.
+    Struct files are memory-mapped and read-only, so only the entries that are used are read.
+    They stay open until the outermost function decorated with closes_schemas returns."""
     with open(join(CHUNK_DIRECTORY, relative_dir), 'rb') as f:
+        if issubclass(schema, ftypes.StructFile):
+            data = schema.load(f, readonly=True)
+            _open_schemas.append(data)
+            return data
         return schema.load(f)
 
+def closes_schemas(fn):
+    """Decorator that closes the struct files loaded by load_schema during the function once it returns.
+    Entries of those files can't be read afterwards, so they shouldn't be returned"""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = len(_open_schemas)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            while len(_open_schemas) > start:
+                _open_schemas.pop().close()
+    return wrapper
+
 def load_text(basepath: str) -> Mapping[int, Mapping[str, str]]:
     """Parses a series of GMD files, returning a mapping from index -> language -> value
     
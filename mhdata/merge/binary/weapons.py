@@ -1,8 +1,8 @@
 from mhdata.io import create_writer, DataMap
-from mhdata.load import load_data, schema, datafn
+from mhdata.load import load_data_lazy, schema, datafn
 
 from mhw_armor_edit.ftypes import wp_dat, wp_dat_g, wep_wsl, sh_tbl, bbtbl
-from .load import load_schema, load_text, ItemTextHandler, \
+from .load import load_schema, closes_schemas, load_text, ItemTextHandler, \
                     SkillTextHandler, SharpnessDataReader, \
                     WeaponDataLoader, convert_recipe
 from .items import add_missing_items
@@ -168,8 +168,9 @@ class WeaponAmmoLoader():
         raise Exception("No suitable name found")
 
 
+@closes_schemas
 def update_weapons():
-    mhdata = load_data()
+    mhdata = load_data_lazy()
     print("Existing Data loaded. Using to update weapon info")
 
     item_text_handler = ItemTextHandler()
@@ -326,41 +327,41 @@ def update_weapons():
         new_weapon_map.insert(new_entry)
 
     # Write new data
-    writer = create_writer()
-
-    writer.save_base_map_csv(
-        "weapons/weapon_base.csv",
-        new_weapon_map,
-        schema=schema.WeaponBaseSchema(),
-        translation_filename="weapons/weapon_base_translations.csv"
-    )
-
-    writer.save_data_csv(
-        "weapons/weapon_sharpness.csv",
-        new_weapon_map, 
-        key="sharpness",
-        schema=schema.WeaponSharpnessSchema()
-    )
-
-    writer.save_data_csv(
-        "weapons/weapon_bow_ext.csv",
-        new_weapon_map,
-        key="bow",
-        schema=schema.WeaponBowSchema()
-    )
-
-    writer.save_data_csv(
-        "weapons/weapon_craft.csv",
-        new_weapon_map, 
-        key="craft",
-        schema=schema.WeaponCraftSchema()
-    )
-
-    writer.save_keymap_csv(
-        "weapons/weapon_ammo.csv",
-        ammo_reader.data,
-        schema=schema.WeaponAmmoSchema()
-    )
+    # All files are written together once the session ends
+    with create_writer().session() as session:
+        session.save_base_map_csv(
+            "weapons/weapon_base.csv",
+            new_weapon_map,
+            schema=schema.WeaponBaseSchema(),
+            translation_filename="weapons/weapon_base_translations.csv"
+        )
+
+        session.save_data_csv(
+            "weapons/weapon_sharpness.csv",
+            new_weapon_map, 
+            key="sharpness",
+            schema=schema.WeaponSharpnessSchema()
+        )
+
+        session.save_data_csv(
+            "weapons/weapon_bow_ext.csv",
+            new_weapon_map,
+            key="bow",
+            schema=schema.WeaponBowSchema()
+        )
+
+        session.save_data_csv(
+            "weapons/weapon_craft.csv",
+            new_weapon_map, 
+            key="craft",
+            schema=schema.WeaponCraftSchema()
+        )
+
+        session.save_keymap_csv(
+            "weapons/weapon_ammo.csv",
+            ammo_reader.data,
+            schema=schema.WeaponAmmoSchema()
+        )
 
     print("Weapon files updated\n")
 
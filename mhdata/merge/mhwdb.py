@@ -1,6 +1,6 @@
 import requests
 from mhdata.io import create_writer
-from mhdata.load import load_data, schema
+from mhdata.load import load_data_lazy, schema
 
 writer = create_writer()
 
@@ -8,7 +8,7 @@ writer = create_writer()
 
 def merge_weapons():
     inc_data = requests.get("https://mhw-db.com/weapons").json()
-    data = load_data().weapon_map
+    data = load_data_lazy().weapon_map
 
     not_exist = []
     mismatches_atk = []
@@ -26,17 +26,11 @@ def merge_weapons():
         name = weapon_inc['name']
         inc_label = f"{name} ({inc_type})"
 
-        # Our system uses I/II/III, their's uses 1/2/3
-        if name not in data.names('en'):
-            name = name.replace(" 3", " III")
-            name = name.replace(" 2", " II")
-            name = name.replace(" 1", " I")
-
-        if name not in data.names('en'):
+        # Our system uses I/II/III, their's uses 1/2/3. The name search handles both
+        existing = data.find_entry('en', name)
+        if existing is None:
             not_exist.append(f"{name} does not exist ({inc_type} {inc_id}).")
             continue # todo: add to our database
-
-        existing = data.entry_of('en', name)
         
         # Incoming basic data for the weapon entry
         inc_attack = weapon_inc['attack']['display']
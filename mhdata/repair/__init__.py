@@ -2,7 +2,7 @@ from os.path import abspath, join, dirname
 
 from mhdata.io import DataMap, DataReaderWriter
 from mhdata.io.csv import save_csv
-from mhdata.load import load_data, cfg, schema
+from mhdata.load import load_data_lazy, cfg, schema
 
 writer = DataReaderWriter(
     required_languages=cfg.required_languages,
@@ -49,7 +49,7 @@ writer = DataReaderWriter(
 
 def repair_skill_data():
     "Reorganizes skill data ordering to match base map"
-    data = load_data()
+    data = load_data_lazy()
 
     writer.save_data_csv(
         "skills/skill_levels.csv", 
@@ -58,7 +58,7 @@ def repair_skill_data():
         groups=['description'])
 
 def repair_armor_data():
-    data = load_data()
+    data = load_data_lazy()
 
     armor_map = data.armor_map
     armorset_map = data.armorset_map
@@ -88,7 +88,7 @@ def repair_armor_data():
     writer.save_csv("armors/armor_base.csv", result)
 
 def repair_decoration_colors():
-    data = load_data()
+    data = load_data_lazy()
 
     for entry in data.decoration_map.values():
         skill_en = entry['skill_en']
@@ -5,5 +5,6 @@ Use recreate_database if you want to start a build.
 Feel free to copy this module if you want to run queries from your own project.
 """
 
-from .functions import recreate_database, session_scope
+from .functions import recreate_database, open_database, fast_build_database, session_scope
+from .bulk import BulkSession
 from .mappings import *
@@ -0,0 +1,166 @@
+"""
+A write-only replacement for the sqlalchemy session, used to speed up builds.
+
+The ORM unit of work spends most of the build time in bookkeeping.
+The BulkSession accepts the same mapped objects as a regular session,
+but converts them (and their child relationships) to plain row tuples
+using the table metadata. The rows are inserted using executemany on commit.
+"""
+
+import collections
+
+import sqlalchemy
+from sqlalchemy.orm import attributes, interfaces
+
+from .mappings import Base
+
+
+class TableWriter:
+    "Converts column values to row tuples for a single table, and holds them until written"
+
+    def __init__(self, table, dialect):
+        self.table = table
+        self.columns = list(table.columns)
+        self.rows = []
+
+        # Bind processors perform the same conversions the ORM would (bool -> int, etc)
+        self.processors = [c.type.bind_processor(dialect) for c in self.columns]
+
+        # The autoincrement id is computed in advance, so that child rows can link to it.
+        # SQLite assigns max(rowid) + 1, so we can do the same if inserts are in order.
+        pk_columns = list(table.primary_key.columns)
+        self.id_column = None
+        if len(pk_columns) == 1 and isinstance(pk_columns[0].type, sqlalchemy.Integer):
+            self.id_column = pk_columns[0]
+        self.last_id = 0
+
+        self.insert_sql = str(table.insert().compile(
+            dialect=dialect,
+            column_keys=[c.key for c in self.columns]))
+
+    def add(self, values: dict):
+        """Adds a row of column key -> value, and returns the values including defaults.
+        Empty values on columns with defaults use the default, just like the ORM"""
+        result = {}
+        for column in self.columns:
+            value = values.get(column.key, None)
+            if value is None and column.default is not None:
+                if not column.default.is_scalar:
+                    raise Exception(f"Unsupported default for column {column}")
+                value = column.default.arg
+            result[column.key] = value
+
+        if self.id_column is not None:
+            row_id = result[self.id_column.key]
+            if row_id is None:
+                row_id = self.last_id + 1
+                result[self.id_column.key] = row_id
+            self.last_id = max(self.last_id, row_id)
+
+        row = []
+        for column, processor in zip(self.columns, self.processors):
+            value = result[column.key]
+            if processor and value is not None:
+                value = processor(value)
+            row.append(value)
+        self.rows.append(tuple(row))
+
+        return result
+
+
+class BulkSession:
+    """Defines a write-only session that supports add and commit.
+    Objects are converted to rows when added, so they should be complete at that point.
+    """
+
+    def __init__(self, bind):
+        self.bind = bind
+        self._writers = collections.OrderedDict()
+        self._raw_connection = None
+
+    def _writer_for(self, table):
+        writer = self._writers.get(table, None)
+        if writer is None:
+            writer = TableWriter(table, self.bind.dialect)
+            self._writers[table] = writer
+        return writer
+
+    def _add_object(self, obj, overrides={}):
+        "Internal: converts the object and its children to rows"
+        mapper = sqlalchemy.inspect(obj).mapper
+        obj_dict = attributes.instance_dict(obj)
+
+        values = {}
+        for column_prop in mapper.column_attrs:
+            column = column_prop.columns[0]
+            values[column.key] = obj_dict.get(column_prop.key, None)
+        values.update(overrides)
+
+        row = self._writer_for(mapper.local_table).add(values)
+
+        # Depth first over relationships, which matches the order the ORM cascades in
+        for relationship in mapper.relationships:
+            children = obj_dict.get(relationship.key, None)
+            if not children:
+                continue
+
+            if relationship.direction is not interfaces.ONETOMANY:
+                raise Exception(
+                    f"Unsupported relationship {relationship} in bulk session, " +
+                    "assign the foreign key column instead")
+
+            for child in children:
+                child_overrides = {
+                    child_col.key: row[parent_col.key]
+                    for (parent_col, child_col) in relationship.synchronize_pairs
+                }
+                self._add_object(child, child_overrides)
+
+    def add(self, obj):
+        "Converts a mapped object and its child relationships to rows"
+        self._add_object(obj)
+
+    def execute(self, statement):
+        """Executes a core statement (such as a delete) within the session's transaction.
+        Unlike added objects, the statement runs immediately."""
+        compiled = statement.compile(dialect=self.bind.dialect)
+        params = compiled.construct_params()
+        args = [params[key] for key in (compiled.positiontup or [])]
+        self.connection().execute(str(compiled), args)
+
+    def flush(self):
+        "Inserts all pending rows, in table dependency order"
+        cursor = self.connection().cursor()
+        for table in Base.metadata.sorted_tables:
+            writer = self._writers.get(table, None)
+            if writer and writer.rows:
+                cursor.executemany(writer.insert_sql, writer.rows)
+                writer.rows = []
+        cursor.close()
+
+    def connection(self):
+        "Returns the DBAPI connection used by this session"
+        if self._raw_connection is None:
+            self._raw_connection = self.bind.raw_connection()
+        return self._raw_connection
+
+    def commit(self):
+        self.flush()
+        self.connection().commit()
+
+    def rollback(self):
+        self._writers.clear()
+        if self._raw_connection is not None:
+            self._raw_connection.rollback()
+
+    def close(self):
+        if self._raw_connection is not None:
+            self._raw_connection.close()
+            self._raw_connection = None
+
+
+def bulk_sessionmaker(engine):
+    "Returns a function that creates BulkSession objects, usable with session_scope"
+    def create_session():
+        return BulkSession(engine)
+    return create_session
@@ -2,20 +2,75 @@ import os
 
 import sqlalchemy
 import sqlalchemy.orm
+from sqlalchemy.schema import CreateTable, CreateIndex
 from contextlib import contextmanager
 
 from .mappings import Base
+from .bulk import bulk_sessionmaker
 
-def recreate_database(output_filename):
-    "Recreates the database file, returning a session manager"
+def _create_sessionmaker(engine, bulk):
+    if bulk:
+        return bulk_sessionmaker(engine)
+    return sqlalchemy.orm.sessionmaker(bind=engine)
+
+def recreate_database(output_filename, *, bulk=False):
+    """Recreates the database file, returning a session manager.
+    If bulk is true, the sessions are write-only BulkSessions that skip the ORM unit of work."""
     if os.path.exists(output_filename):
         os.remove(output_filename)
-   
+
     dbpath = f'sqlite:///{output_filename}'
     engine = sqlalchemy.create_engine(dbpath, echo=False)
     Base.metadata.create_all(engine)
 
-    return sqlalchemy.orm.sessionmaker(bind=engine)
+    return _create_sessionmaker(engine, bulk)
+
+def open_database(output_filename, *, bulk=False):
+    """Opens an existing database file without clearing it, returning a session manager.
+    Missing tables are created."""
+    dbpath = f'sqlite:///{output_filename}'
+    engine = sqlalchemy.create_engine(dbpath, echo=False)
+    Base.metadata.create_all(engine)
+
+    return _create_sessionmaker(engine, bulk)
+
+@contextmanager
+def fast_build_database(output_filename, *, bulk=False):
+    """Context manager that yields a session manager for a fast build.
+
+    The database is built in memory with journaling and syncing disabled,
+    and indexes are only created once all data has been inserted.
+    On exit, the result is written to output_filename using VACUUM INTO.
+    The resulting contents are the same as recreate_database.
+    """
+    if os.path.exists(output_filename):
+        os.remove(output_filename)
+
+    engine = sqlalchemy.create_engine('sqlite://', echo=False)
+
+    @sqlalchemy.event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=OFF")
+        cursor.execute("PRAGMA synchronous=OFF")
+        cursor.close()
+
+    # Create tables without their indexes. Unique constraints remain inline.
+    for table in Base.metadata.sorted_tables:
+        engine.execute(CreateTable(table))
+
+    yield _create_sessionmaker(engine, bulk)
+
+    for table in Base.metadata.sorted_tables:
+        for index in sorted(table.indexes, key=lambda i: i.name):
+            engine.execute(CreateIndex(index))
+
+    # VACUUM cannot run inside a transaction, so use the dbapi connection directly
+    connection = engine.raw_connection()
+    try:
+        connection.execute("VACUUM INTO ?", (str(output_filename),))
+    finally:
+        connection.close()
 
 # adapted from sqlalchemy docs
 @contextmanager
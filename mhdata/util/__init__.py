@@ -1,5 +1,7 @@
 import collections
 import collections.abc
+import hashlib
+import itertools
 from mhdata import typecheck
 
 from .bidict import bidict
@@ -32,6 +34,15 @@ def get_duplicates(iterable):
     return duplicates
 
 
+def hash_file(path):
+    "Returns the hex sha256 digest of a file's contents"
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
 def joindicts(dest, *dictlist):
     """Merges one or more dictionaries into dest recursively.
     Dictionaries are merged, lists are merged. Scalars and strings are ignored.
@@ -101,6 +112,70 @@ def group_fields(obj, groups=[]):
     return result
 
 
+class GroupPlan:
+    """A group_fields operation compiled for a fixed list of keys, such as a csv header.
+    Each key is matched to its (group, subkey) once, so applying it to a row
+    only needs to distribute the values. Rows with different keys use group_fields.
+    Keys in exclude are left out of the result."""
+
+    def __init__(self, keys, groups=[], exclude=()):
+        if not typecheck.is_list(groups):
+            raise TypeError("groups needs to be a list or tuple")
+
+        self.keys = list(keys)
+        self.groups = groups
+        self.exclude = frozenset(exclude)
+
+        # Mask of the values to keep, or None if all of them are kept
+        self.mask = None
+        kept_keys = self.keys
+        if any(key in self.exclude for key in self.keys):
+            self.mask = [key not in self.exclude for key in self.keys]
+            kept_keys = list(itertools.compress(self.keys, self.mask))
+
+        # Groups that are also keys have to be checked per row, see check_not_grouped
+        self.group_keys = [g for g in groups if g in kept_keys]
+
+        self.plan = []
+        for key in kept_keys:
+            group_name = next((g for g in groups if key.startswith(g+'_')), None)
+            subkey = key[len(group_name)+1:] if group_name else None
+            self.plan.append((key, group_name, subkey))
+
+    def apply(self, obj):
+        "Returns the same result as group_fields(obj, groups), without the excluded keys"
+        if list(obj.keys()) != self.keys:
+            return self._fallback(obj)
+        for group in self.group_keys:
+            if isinstance(obj[group], collections.Mapping):
+                return self._fallback(obj)
+
+        values = obj.values()
+        if self.mask is not None:
+            values = itertools.compress(values, self.mask)
+
+        result = {}
+        for (key, group_name, subkey), value in zip(self.plan, values):
+            if group_name is None:
+                result[key] = value
+            else:
+                result.setdefault(group_name, {})[subkey] = value
+        return result
+
+    def _fallback(self, obj):
+        if self.exclude:
+            obj = { k:v for (k, v) in obj.items() if k not in self.exclude }
+        return group_fields(obj, groups=self.groups)
+
+
+def group_rows(rows, groups=[]):
+    "Returns group_fields applied to every row, using a GroupPlan built from the first row"
+    if not rows:
+        return []
+    plan = GroupPlan(rows[0].keys(), groups)
+    return [plan.apply(row) for row in rows]
+
+
 def ungroup_fields(obj, groups=[]):
     "Returns a new dictionary where keys that are in group are flattened"
     result = {}
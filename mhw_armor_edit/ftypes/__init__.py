@@ -1,5 +1,7 @@
 # coding: utf-8
+import mmap
 import struct
+from collections.abc import Sequence
 
 
 class StructField:
@@ -145,21 +147,55 @@ class StructMeta(type):
     def __new__(cls, name, bases, namespace, **kwargs):
         if name != "Struct":
             StructMeta.init_fields(name, namespace)
+            namespace.setdefault("__slots__", ())
         return type.__new__(cls, name, bases, namespace)
 
 
+class StructEntries(Sequence):
+    """The entries of a StructFile, creating each Struct when it is accessed."""
+
+    def __init__(self, parent, num_entries):
+        self.parent = parent
+        self.num_entries = num_entries
+
+    def _entry(self, index):
+        parent = self.parent
+        factory = parent.EntryFactory
+        offset = parent.ENTRY_OFFSET + index * factory.STRUCT_SIZE
+        return factory(parent, index, parent.data, offset)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return [self._entry(i) for i in range(*item.indices(self.num_entries))]
+        if item < 0:
+            item += self.num_entries
+        if not 0 <= item < self.num_entries:
+            raise IndexError("entry index out of range")
+        return self._entry(item)
+
+    def __iter__(self):
+        for i in range(self.num_entries):
+            yield self._entry(i)
+
+    def __len__(self):
+        return self.num_entries
+
+
 class StructFile:
     EntryFactory = None
     MAGIC = None
     NUM_ENTRY_OFFSET = 2
     ENTRY_OFFSET = 6
 
-    def __init__(self, data):
+    def __init__(self, data, lazy=False):
         self.modified = False
         self.modified_cb = None
         self.data = data
         self.num_entries = self._read_num_entries()
-        self.entries = list(self._load_entries())
+        if lazy:
+            self.entries = StructEntries(self, self.num_entries)
+        else:
+            self.entries = list(self._load_entries())
 
     def _read_num_entries(self):
         result = struct.unpack_from("<I", self.data, self.NUM_ENTRY_OFFSET)
@@ -207,10 +243,33 @@ class StructFile:
         return True
 
     @classmethod
-    def load(cls, fp):
-        data = bytearray(fp.read())
-        cls.check_header(data)
-        return cls(data)
+    def load(cls, fp, readonly=False):
+        """Loads the file. If readonly is true, the file is memory-mapped instead of read,
+        entries are created when accessed, and fields can't be changed.
+        Use close() or a with block to close the file when done."""
+        if readonly:
+            data = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            data = bytearray(fp.read())
+        try:
+            cls.check_header(data)
+        except:
+            if readonly:
+                data.close()
+            raise
+        return cls(data, lazy=readonly)
+
+    def close(self):
+        """Closes the memory-mapped file of a read-only StructFile.
+        Its entries can't be read afterwards. Does nothing for other files."""
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def save(self, fp):
         fp.write(self.data)
@@ -229,6 +288,8 @@ class StructFile:
 
 
 class Struct(metaclass=StructMeta):
+    __slots__ = ("parent", "index", "data", "offset")
+
     def __init__(self, parent, index, data, offset):
         self.parent = parent
         self.index = index
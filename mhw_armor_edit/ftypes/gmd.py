@@ -21,6 +21,8 @@ class GmdHeader(Struct):
     string_block_size: ft.uint()
     name_size: ft.uint()
 
+    __slots__ = ("name",)
+
     def __init__(self, parent, index, data, offset):
         super().__init__(parent, index, data, offset)
         self.name = self.read_name()
@@ -1,6 +1,8 @@
+import os
 import pytest
 
 from mhdata.io import DataMap
+from mhdata.io.datamap import MergeSource
 
 def create_test_entry(name_map, extradata={}):
     return { 'name': name_map, **extradata }
@@ -180,3 +182,291 @@ def test_merged_names_update_lookup():
     
     assert 'NAME ES' in datamap.names('es'), "Spanish existance check should work"
     assert datamap.entry_of('es', 'NAME ES') != None, "Name lookup on merged language should work"
+
+def test_merge_all_joins_on_names_from_earlier_sources():
+    datamap = DataMap({
+        1: create_test_entry({'en': 'NAME EN'})
+    })
+
+    datamap.merge_all([
+        MergeSource({ 'NAME EN': { 'name': { 'es': 'NAME ES'}}}, 'en', None, 'names.csv'),
+        MergeSource({ 'NAME ES': { 'data': 5 }}, 'es', 'extra', 'extra.csv'),
+        MergeSource({ 'NAME EN': { 'more': 6 }}, 'en', None, 'more.csv')
+    ])
+
+    assert datamap[1]['extra'] == { 'data': 5 }
+    assert datamap[1]['more'] == 6
+    assert datamap.entry_of('es', 'NAME ES') == datamap[1]
+
+def test_merge_all_unlinked_leaves_map_untouched():
+    datamap = DataMap({
+        1: create_test_entry_en('test1')
+    })
+
+    with pytest.raises(Exception) as ex:
+        datamap.merge_all([
+            MergeSource({ 'test1': { 'data': 1 }}, 'en', None, 'good.csv'),
+            MergeSource({ 'missing': { 'data': 1 }}, 'en', None, 'bad.csv')
+        ])
+
+    assert 'bad.csv' in str(ex.value) and 'missing' in str(ex.value)
+    assert 'data' not in datamap[1], "expected no data to be merged"
+
+def test_merge_all_collision_names_source():
+    datamap = DataMap({
+        1: create_test_entry_en('test1', { 'data': 1 })
+    })
+
+    with pytest.raises(Exception) as ex:
+        datamap.merge_all([MergeSource({ 'test1': { 'data': 2 }}, 'en', None, 'collide.csv')])
+
+    assert 'collide.csv' in str(ex.value) and 'test1' in str(ex.value)
+
+def test_columnar_map_behaves_like_regular_map():
+    entries = [
+        { 'name': { 'en': 'Blade', 'ja': 'ブレード' }, 'weapon_type': 'great-sword', 'attack': 480 },
+        { 'name': { 'en': 'Bow' }, 'weapon_type': 'bow', 'attack': None, 'extra': [1, 2] },
+        { 'name': { 'en': 'Sword' }, 'weapon_type': 'great-sword', 'attack': 500 },
+    ]
+    regular = DataMap()
+    regular.extend(entries)
+    columnar = DataMap(columnar=True)
+    columnar.extend(entries)
+
+    assert columnar.to_dict() == regular.to_dict()
+    assert columnar.entry_of('ja', 'ブレード').id == 1
+    assert [e.id for e in columnar.scan('weapon_type', 'great-sword')] == [1, 3]
+    assert [e.id for e in columnar.scan('attack', None)] == [2]
+
+    # edits go through the views
+    entry = columnar[2]
+    entry['attack'] = 1.5
+    entry.set_value('rarity', 3, after='name')
+    entry['name']['fr'] = 'Arc'
+    assert list(columnar[2].keys()) == ['id', 'name', 'rarity', 'weapon_type', 'attack', 'extra']
+    assert columnar[2]['attack'] == 1.5
+    assert columnar.entry_of('en', 'Bow')['name'] == { 'en': 'Bow', 'fr': 'Arc' }
+
+    del columnar[1]
+    assert list(columnar.keys()) == [2, 3]
+    assert [e.id for e in columnar.scan('weapon_type', 'great-sword')] == [3]
+
+def test_to_columnar_keeps_data():
+    map = DataMap()
+    map.insert(create_test_entry_en('test1', { 'rarity': 1 }))
+    map.insert(create_test_entry_en('test2', { 'description': { 'en': 'desc' }, 'rarity': 2 }))
+    expected = map.to_dict()
+
+    map.to_columnar()
+    assert map.columnar
+    assert map.to_dict() == expected
+    assert list(map[2].keys()) == ['id', 'name', 'description', 'rarity']
+    assert map.copy().to_dict() == expected
+
+def test_rows_share_key_layout():
+    map = DataMap()
+    row1 = map.insert(create_test_entry_en('test1', { 'rarity': 1 }))
+    row2 = map.insert(create_test_entry_en('test2', { 'rarity': 2 }))
+    assert row1._layout is row2._layout
+
+    # gaining a key moves the row to a new layout without affecting the others
+    row2['extra'] = True
+    del row2['rarity']
+    assert row1._layout is not row2._layout
+    assert list(row1.keys()) == ['id', 'name', 'rarity']
+    assert list(row2.keys()) == ['id', 'name', 'extra']
+    assert dict(row2) == { 'id': 2, 'name': { 'en': 'test2' }, 'extra': True }
+
+def test_rows_can_be_pickled():
+    import pickle
+    map = DataMap()
+    map.insert(create_test_entry_en('test1', { 'rarity': 1 }))
+    map.insert(create_test_entry_en('test2', { 'rarity': 2 }))
+
+    loaded = pickle.loads(pickle.dumps(map))
+    assert loaded.to_dict() == map.to_dict()
+    assert loaded[1]._layout is loaded[2]._layout
+    loaded[1]['extra'] = 5
+    assert list(loaded[1].keys()) == ['id', 'name', 'rarity', 'extra']
+
+def test_indexes_follow_inserts_and_deletes():
+    map = DataMap(indexes=['category'])
+    map.insert(create_test_entry_en('test1', { 'category': 'a', 'rarity': 1 }))
+    map.insert(create_test_entry_en('test2', { 'category': 'b', 'rarity': 1 }))
+    map.insert(create_test_entry_en('test3', { 'category': 'a', 'rarity': 2 }))
+    map.add_index('rarity')
+
+    assert [e.id for e in map.lookup('category', 'a')] == [1, 3]
+    assert [e.id for e in map.where(category='a', rarity=2)] == [3]
+    assert list(map.group_by('rarity').keys()) == [1, 2]
+
+    del map[1]
+    map.pop(2)
+    map.insert(create_test_entry_en('test4', { 'category': 'a' }))
+    assert [e.id for e in map.lookup('category', 'a')] == [3, 4]
+    assert map.lookup('category', 'b') == []
+    assert [e.id for e in map.lookup('rarity', 2)] == [3]
+
+def test_indexes_follow_merges():
+    map = DataMap(indexes=['category', ('extra', 'kind')])
+    map.insert(create_test_entry_en('test1'))
+    map.insert(create_test_entry_en('test2', { 'category': 'b' }))
+
+    map.merge({ 'test1': { 'category': 'b' } })
+    map.merge({ 'test2': { 'kind': 'x' } }, key='extra')
+
+    assert [e.id for e in map.lookup('category', 'b')] == [1, 2]
+    assert [e.id for e in map.lookup(('extra', 'kind'), 'x')] == [2]
+
+def test_find_id_uses_normalized_names():
+    map = DataMap(languages=['en'])
+    map.insert(create_test_entry_en('Buster Sword III'))
+    map.insert(create_test_entry_en('Leather Headgear α+'))
+    map.insert(create_test_entry_en('Ｆｕｌｌ Width'))
+
+    assert map.find_id('en', 'Buster Sword III') == 1
+    assert map.find_id('en', 'buster sword 3') == 1
+    assert map.find_id('en', 'Leather Headgear Alpha +') == 2
+    assert map.find_id('en', 'full width') == 3
+    assert map.find_id('en', 'Buster Sword 2') is None
+
+def test_name_search_follows_changes():
+    map = DataMap()
+    map.insert(create_test_entry_en('Iron Sword I'))
+    map.insert(create_test_entry_en('Iron Sword II'))
+    map.insert(create_test_entry_en('Bone Blade'))
+    assert [e.id for e in map.search_prefix('en', 'iron sword')] == [1, 2]
+
+    del map[1]
+    map.insert(create_test_entry_en('Iron Axe'))
+    map.merge({ 'Bone Blade': { 'name': { 'ja': 'ボーンブレード' } } })
+
+    assert [e.id for e in map.search_prefix('en', 'Iron ')] == [4, 2]
+    assert [e.id for e in map.search_prefix('en', 'iron sword i')] == [2]
+    assert map.find_id('ja', 'ボーンブレード') == 3
+    assert map.find_id('en', 'Iron Sword 1') is None
+
+def test_lazy_languages_are_indexed_on_lookup():
+    map = DataMap(lazy_languages=['ja'])
+    map.insert(create_test_entry({ 'en': 'test1', 'ja': 'テスト' }))
+    map.insert(create_test_entry({ 'en': 'test2', 'ja': 'テスト' }))
+    assert 'ja' not in map._reverse_entries
+    assert map.id_of('en', 'test2') == 2
+
+    # duplicates in a lazy language are found on the first lookup
+    with pytest.raises(ValueError):
+        map.id_of('ja', 'テスト')
+
+    del map[2]
+    map.insert(create_test_entry({ 'en': 'test3', 'ja': 'テスト3' }))
+    assert map.id_of('ja', 'テスト') == 1
+    assert map.id_of('ja', 'テスト3') == 3
+
+    del map[3]
+    assert map.id_of('ja', 'テスト3') is None
+
+def test_copy_shares_rows_until_changed():
+    map = DataMap(languages=['en'])
+    map.insert(create_test_entry_en('test1', { 'craft': [{ 'item': 'Iron' }] }))
+    map.insert(create_test_entry_en('test2', { 'rarity': 1 }))
+    clone = map.copy()
+    assert clone.to_dict() == map.to_dict()
+    assert clone[2]._values is map[2]._values
+
+    # nested values are copied before they can be changed
+    clone[1]['craft'][0]['item'] = 'Bone'
+    clone[1]['name']['en'] = 'changed'
+    clone[2]['rarity'] = 2
+    assert map[1]['craft'] == [{ 'item': 'Iron' }]
+    assert map[1].name('en') == 'test1'
+    assert map[2]['rarity'] == 1
+
+    # name lookups are independent
+    clone.insert(create_test_entry_en('test3'))
+    del map[2]
+    assert map.id_of('en', 'test3') is None
+    assert clone.id_of('en', 'test2') == 2
+    assert clone.insert(create_test_entry_en('test4')).id == 4
+
+def test_pickled_map_rebuilds_indexes():
+    import pickle
+    map = DataMap(languages=['en'], indexes=['rarity'])
+    map.insert(create_test_entry_en('test1', { 'rarity': 1 }))
+    map.insert(create_test_entry_en('test2', { 'rarity': 2 }))
+    map[2].set_value('extra', True, after='name')
+
+    loaded = pickle.loads(pickle.dumps(map))
+    assert loaded.to_dict() == map.to_dict()
+    assert list(loaded[2].keys()) == ['id', 'name', 'extra', 'rarity']
+    assert not loaded._reverse_entries
+    assert loaded.id_of('en', 'test2') == 2
+    assert [e.id for e in loaded.lookup('rarity', 1)] == [1]
+    assert loaded.insert(create_test_entry_en('test3')).id == 3
+
+def test_pickled_columnar_map():
+    import pickle
+    map = DataMap(columnar=True)
+    map.insert(create_test_entry_en('test1', { 'rarity': 1 }))
+    loaded = pickle.loads(pickle.dumps(map))
+    assert loaded.columnar
+    assert loaded.to_dict() == map.to_dict()
+
+def test_export_shared():
+    map = DataMap()
+    map.insert(create_test_entry_en('test1', { 'rarity': 1 }))
+    with map.export_shared() as handle:
+        import pickle
+        loaded = pickle.loads(pickle.dumps(handle)).load()
+        assert not loaded._rows, "expected rows to be read when accessed"
+        assert loaded.entry_of('en', 'test1')['rarity'] == 1
+        assert loaded.to_dict() == map.to_dict()
+        assert handle.load() is loaded
+    assert not os.path.exists(handle.path)
+
+def test_snapshot_reads_rows_on_access(tmpdir):
+    from decimal import Decimal
+    from mhdata.io.snapshot import write_snapshot, open_snapshot
+
+    map = DataMap(languages=['en'])
+    map.insert(create_test_entry({ 'en': 'test1', 'ja': 'テスト' }, { 'chance': Decimal('0.5') }))
+    map.insert(create_test_entry_en('test2', { 'craft': [{ 'item': 'Iron' }] }))
+
+    path = str(tmpdir.join('map.snapshot'))
+    write_snapshot(map, path)
+    with open_snapshot(path) as snapshot:
+        assert not snapshot._rows
+        assert snapshot.id_of('en', 'test2') == 2
+        assert snapshot.id_of('ja', 'テスト') is None
+        assert list(snapshot._rows.keys()) == []
+
+        assert snapshot.entry_of('en', 'test1')['chance'] == Decimal('0.5')
+        assert list(snapshot._rows.keys()) == [1]
+
+        assert list(snapshot.keys()) == [1, 2]
+        assert 'test2' in snapshot.names('en')
+        assert snapshot.to_dict() == map.to_dict()
+
+def test_snapshot_duplicate_names_raise_like_datamap(tmpdir):
+    from mhdata.io.snapshot import write_snapshot, open_snapshot
+
+    map = DataMap(lazy_languages=['ja'])
+    map.insert(create_test_entry({ 'en': 'test1', 'ja': 'テスト' }))
+    map.insert(create_test_entry({ 'en': 'test2', 'ja': 'テスト' }))
+
+    path = str(tmpdir.join('map.snapshot'))
+    write_snapshot(map, path)
+    with open_snapshot(path) as snapshot:
+        assert snapshot.id_of('en', 'test2') == map.id_of('en', 'test2') == 2
+        for data_map in (map, snapshot, snapshot.to_datamap()):
+            with pytest.raises(ValueError, match="Duplicate name"):
+                data_map.id_of('ja', 'テスト')
+
+def test_duplicate_names_in_lazy_languages():
+    map = DataMap(lazy_languages=['ja'])
+    map.insert(create_test_entry({ 'en': 'test1', 'ja': 'テスト' }))
+    map.insert(create_test_entry({ 'en': 'test2', 'ja': 'テスト' }))
+    map.insert(create_test_entry({ 'en': 'test3', 'ja': None }))
+    map.insert(create_test_entry({ 'en': 'test4', 'ja': None }))
+
+    assert map.duplicate_names() == [('ja', 'テスト')]
+    assert map._reverse_entries.get('ja') is None, "Expected the check to not index the language"
@@ -0,0 +1,41 @@
+import os
+import pytest
+
+from mhdata.load.cache import LoadCache
+
+@pytest.fixture()
+def cache(tmpdir):
+    "Returns a cache with a single domain folder containing one file"
+    data_dir = tmpdir.mkdir('data')
+    data_dir.mkdir('items').join('item_base.csv').write('name_en\ntest1\n')
+    return LoadCache(str(data_dir), str(tmpdir.join('cache')))
+
+def write_item_file(cache, contents):
+    path = os.path.join(cache.data_path, 'items', 'item_base.csv')
+    with open(path, 'w') as f:
+        f.write(contents)
+    return path
+
+def test_missing_entry_returns_none(cache):
+    assert cache.get('items') is None, "expected no entry for an empty cache"
+
+def test_returns_stored_data(cache):
+    cache.put('items', cache.signatures('items'), { 'item_map': [1, 2, 3] })
+    assert cache.get('items') == { 'item_map': [1, 2, 3] }
+
+def test_changed_file_invalidates(cache):
+    cache.put('items', cache.signatures('items'), { 'item_map': [1, 2, 3] })
+    write_item_file(cache, 'name_en\ntest2\n')
+    assert cache.get('items') is None, "expected changed contents to invalidate the cache"
+
+def test_added_file_invalidates(cache):
+    cache.put('items', cache.signatures('items'), { 'item_map': [1, 2, 3] })
+    with open(os.path.join(cache.data_path, 'items', 'new.csv'), 'w') as f:
+        f.write('name_en\n')
+    assert cache.get('items') is None, "expected a new file to invalidate the cache"
+
+def test_touched_file_remains_valid(cache):
+    cache.put('items', cache.signatures('items'), { 'item_map': [1, 2, 3] })
+    path = write_item_file(cache, 'name_en\ntest1\n')
+    os.utime(path, ns=(0, 0))
+    assert cache.get('items') == { 'item_map': [1, 2, 3] }, "expected same contents to be valid"
@@ -5,6 +5,8 @@ import shutil
 import json
 
 from mhdata.io import DataReader
+from mhdata.io.csv import read_csv
+from mhdata.load import schema
 
 def save_json(obj, path):
     with open(path, 'w') as f:
@@ -64,3 +66,38 @@ def test_load_split_data_map(loader_mock, basedata, subdata):
 
     names = [entry.name('en') for entry in datamap.values()]
     assert names == ['test1', 'test2'], "Expected names to match in basemap order"
+
+def save_text(text, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def test_read_csv_sets_empty_to_none(tmpdir):
+    path = str(tmpdir.join('test.csv'))
+    save_text("name_en,data\ntest1,\n\ntest2,value\ntest3\n", path)
+
+    rows = read_csv(path)
+    assert rows == [
+        { 'name_en': 'test1', 'data': None },
+        { 'name_en': 'test2', 'data': 'value' },
+        { 'name_en': 'test3', 'data': None }
+    ]
+
+def test_read_csv_warns_untrimmed(tmpdir, capsys):
+    path = str(tmpdir.join('test.csv'))
+    save_text("name_en,data \ntest1,value\ntest2, value\n", path)
+
+    read_csv(path)
+    output = capsys.readouterr().out
+    assert "keys in CSV are not trimmed" in output
+    assert "cells: (2, 2)" in output
+
+def test_read_csv_types_columns_from_schema(tmpdir):
+    path = str(tmpdir.join('test.csv'))
+    save_text("key,normal1_clip,normal1_rapid,name_en\ntest,3,TRUE,4\ntest2,bad,,\n", path)
+
+    rows = read_csv(path, column_types=schema.WeaponAmmoSchema().get_column_types)
+    assert rows[0]['normal1_clip'] == 3
+    assert rows[0]['normal1_rapid'] is True
+    assert rows[0]['name_en'] == '4', "expected unknown columns to be left as is"
+    assert rows[1]['normal1_clip'] == 'bad', "expected invalid values to be left for the schema"
+    assert rows[1]['normal1_rapid'] is None
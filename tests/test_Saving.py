@@ -98,3 +98,94 @@ def test_save_split_data_map_symmetric(writer):
     new_data = writer.load_split_data_map(basedata, 'split')
 
     assert extdata.to_dict() == new_data.to_dict(), "expected data to match"
+
+def test_save_csv_only_writes_changes(writer):
+    rows = [{ 'name': 'test1', 'value': 1 }, { 'name': 'test2', 'value': None }]
+
+    assert writer.save_csv('test.csv', rows), "expected the new file to be written"
+    assert not writer.save_csv('test.csv', rows), "expected unchanged contents to be skipped"
+    assert writer.save_csv('test.csv', rows[:1]), "expected changed contents to be written"
+    assert writer.load_list_csv('test.csv') == [{ 'name': 'test1', 'value': '1' }]
+    assert os.listdir(writer.data_path) == ['test.csv']
+
+def test_save_csv_fields_from_all_rows(writer):
+    rows = [{ 'name': 'test1' }, { 'name': 'test2', 'value': 2 }]
+    writer.save_csv('test.csv', rows)
+    assert writer.load_list_csv('test.csv') == [
+        { 'name': 'test1', 'value': None },
+        { 'name': 'test2', 'value': '2' }
+    ]
+
+def test_save_csv_requires_flat_rows(writer):
+    with pytest.raises(Exception):
+        writer.save_csv('test.csv', [{ 'name': 'test1', 'values': [1, 2] }])
+    assert os.listdir(writer.data_path) == []
+
+def test_session_writes_files_on_exit(writer):
+    data = DataMap()
+    data.add_entry(1, create_entry_en('test1', { 'data': { 'a': 1 } }))
+    data.add_entry(2, create_entry_en('test2', { 'data': { 'a': 2 } }))
+
+    with writer.session(parallel=False) as session:
+        session.save_base_map_csv('base.csv', data, groups=['name', 'description', 'data'])
+        session.save_data_csv('data.csv', data, key='data')
+        assert os.listdir(writer.data_path) == [], "expected files to be written at the end"
+
+    writer.save_data_csv('data_direct.csv', data, key='data')
+    with open(writer.get_data_path('data.csv')) as f1, open(writer.get_data_path('data_direct.csv')) as f2:
+        assert f1.read() == f2.read()
+
+    new_data = writer.load_base_csv('base.csv', groups=['description', 'data'])
+    assert new_data[2]['data']['a'] == '2'
+
+def test_session_failure_writes_nothing(writer):
+    with pytest.raises(Exception):
+        with writer.session(parallel=False) as session:
+            session.save_csv('test.csv', [{ 'name': 'test1' }])
+            session.save_csv('bad.csv', [{ 'name': 'test2', 'values': [1, 2] }])
+
+    assert os.listdir(writer.data_path) == []
+
+def test_save_csv_streams_with_fields(writer):
+    rows = ({ 'name': f'test{i}', 'value': i } for i in range(3))
+    writer.save_csv('test.csv', rows, fields=['name', 'value'])
+    assert [r['value'] for r in writer.load_list_csv('test.csv')] == ['0', '1', '2']
+
+def test_stage_csv_uses_unique_temporary_files(writer):
+    from mhdata.io.csv import stage_csv, commit_staged
+
+    location = writer.get_data_path('test.csv')
+    first = stage_csv([{ 'name': 'test1' }], location)
+    second = stage_csv([{ 'name': 'test2' }], location)
+    assert first != second, "expected writers staging the same file to not share a temporary file"
+
+    commit_staged(first, location)
+    commit_staged(second, location)
+    assert writer.load_list_csv('test.csv') == [{ 'name': 'test2' }]
+    assert os.listdir(writer.data_path) == ['test.csv']
+
+    umask = os.umask(0)
+    os.umask(umask)
+    assert os.stat(location).st_mode & 0o777 == 0o666 & ~umask
+
+def test_session_queues_json_files(writer):
+    data = DataMap()
+    data.add_entry(1, create_entry_en('test1', { 'type': 'a', 'data': 1 }))
+    data.add_entry(2, create_entry_en('test2', { 'type': 'b', 'data': 2 }))
+    base = DataMap({ entry_id:create_entry(entry['name']) for (entry_id, entry) in data.items() })
+
+    session = writer.session(parallel=False)
+    session.save_base_map('base.json', base)
+    assert session.save_data_json('data.json', data, fields=['data']) is None
+    session.save_split_data_map('split', base, data, 'type')
+    assert sorted(os.listdir(writer.data_path)) == ['split'], "expected files to be written on commit"
+
+    changed = session.commit()
+    assert changed == [writer.get_data_path(path) for path in
+        ('base.json', 'data.json', 'split/a.json', 'split/b.json')]
+
+    # Unchanged files aren't rewritten
+    session.save_base_map('base.json', base)
+    assert session.commit() == []
+
+    assert writer.load_data_json(base, 'data.json')[2]['data'] == 2
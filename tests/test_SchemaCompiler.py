@@ -0,0 +1,64 @@
+from marshmallow import Schema
+
+from mhdata.load import schema
+
+def uncompiled_load(schema_obj, data, many=False):
+    return Schema.load(schema_obj, data, many=many)
+
+def uncompiled_dump(schema_obj, obj, many=False):
+    return Schema.dump(schema_obj, obj, many=many)
+
+weapon_row = {
+    'id': '5',
+    'name_en': 'Test Blade',
+    'name_ja': 'テスト',
+    'weapon_type': 'great-sword',
+    'attack': '480',
+    'affinity': '0',
+    'element_hidden': 'TRUE',
+    'slot_1': '1', 'slot_2': '0', 'slot_3': '0',
+    'notes': 'WRB',
+    'sharpness': { 'maxed': 'FALSE', 'red': '50' },
+    'gun': { 'normal1_clip': '3', 'normal1_rapid': None },
+}
+
+def test_schemas_are_compiled():
+    assert schema.WeaponSchema().get_compiled() is not None
+    assert schema.ItemSchema().get_compiled() is not None
+    assert schema.WeaponSchema(only=('id',)).get_compiled() is None
+
+def test_compiled_load_matches_marshmallow():
+    weapon_schema = schema.WeaponSchema()
+    expected = uncompiled_load(weapon_schema, weapon_row)
+    result = weapon_schema.load(weapon_row)
+
+    assert result == expected
+    assert result.data['name'] == { 'en': 'Test Blade', 'ja': 'テスト' }
+    assert result.data['gun']['normal1'] == { 'clip': 3, 'rapid': False }
+
+def test_compiled_load_many_matches_marshmallow():
+    rows = [
+        { 'id': '1', 'result': 'Potion', 'first': 'Herb', 'quantity': '1' },
+        { 'id': '2', 'result': 'Mega Potion', 'first': 'Potion', 'second': 'Honey', 'quantity': '1' }
+    ]
+    combination_schema = schema.ItemCombinationSchema()
+    assert combination_schema.load(rows, many=True) == uncompiled_load(combination_schema, rows, many=True)
+
+def test_compiled_load_reports_same_errors():
+    bad_row = { **weapon_row, 'id': 'x', 'element_hidden': 'maybe', 'notes': 'WWW', 'elderseal': 'huge' }
+    weapon_schema = schema.WeaponSchema()
+    expected = uncompiled_load(weapon_schema, bad_row)
+    result = weapon_schema.load(bad_row)
+
+    assert result.errors, "expected errors to be reported"
+    assert result == expected
+
+def test_compiled_dump_matches_marshmallow():
+    weapon_schema = schema.WeaponSchema()
+    loaded = weapon_schema.load(weapon_row).data
+
+    expected = uncompiled_dump(weapon_schema, [loaded], many=True)
+    result = weapon_schema.dump([loaded], many=True)
+    assert result == expected
+    assert result.data[0]['name_ja'] == 'テスト'
+    assert result.data[0]['element_hidden'] == 'TRUE'
@@ -0,0 +1,83 @@
+import struct
+
+import pytest
+
+from mhw_armor_edit.ftypes.arm_up import ArmUp
+
+
+def write_arm_up(path, rows):
+    data = struct.pack("<HI", ArmUp.MAGIC, len(rows))
+    for row in rows:
+        data += struct.pack("<11h", *row)
+    path.write_binary(data)
+
+def test_readonly_load_matches_default(tmpdir):
+    path = tmpdir.join('test.arm_up')
+    write_arm_up(path, [range(i, i + 11) for i in range(0, 50, 10)])
+
+    with path.open('rb') as f:
+        loaded = ArmUp.load(f)
+    with path.open('rb') as f:
+        mapped = ArmUp.load(f, readonly=True)
+
+    assert len(mapped) == len(loaded) == 5
+    assert [e.as_dict() for e in mapped.entries] == [e.as_dict() for e in loaded.entries]
+    assert mapped[-1].unk1 == 40 and mapped[-1].index == 4
+    assert [e.unk2 for e in mapped.entries[1:3]] == [11, 21]
+    assert mapped.find_first(unk1=20).index == 2
+    with pytest.raises(IndexError):
+        mapped[5]
+
+    with pytest.raises(TypeError):
+        mapped[0].unk1 = 5
+
+def test_struct_entries_have_no_dict(tmpdir):
+    path = tmpdir.join('test.arm_up')
+    write_arm_up(path, [range(11)])
+    with path.open('rb') as f:
+        entry = ArmUp.load(f)[0]
+    assert not hasattr(entry, '__dict__')
+
+def test_readonly_load_closes_file(tmpdir):
+    path = tmpdir.join('test.arm_up')
+    write_arm_up(path, [range(11)])
+
+    with path.open('rb') as f:
+        with ArmUp.load(f, readonly=True) as mapped:
+            assert mapped[0].unk2 == 1
+    assert mapped.data.closed
+    with pytest.raises(ValueError):
+        mapped[0].unk2
+
+def test_readonly_load_closes_file_with_invalid_header(tmpdir, monkeypatch):
+    import mmap
+    from mhw_armor_edit import ftypes
+
+    opened = []
+    class TrackedMmap(mmap.mmap):
+        def __init__(self, *args, **kwargs):
+            opened.append(self)
+
+    monkeypatch.setattr(ftypes.mmap, 'mmap', TrackedMmap)
+    path = tmpdir.join('test.arm_up')
+    path.write_binary(struct.pack("<HI", 0x1234, 0) + bytes(4))
+
+    with path.open('rb') as f:
+        with pytest.raises(ftypes.InvalidDataError):
+            ArmUp.load(f, readonly=True)
+    assert [m.closed for m in opened] == [True]
+
+def test_closes_schemas_closes_loaded_files(tmpdir, monkeypatch):
+    from mhdata.merge.binary import load
+
+    write_arm_up(tmpdir.join('test.arm_up'), [range(11)])
+    monkeypatch.setattr(load, 'CHUNK_DIRECTORY', str(tmpdir))
+
+    @load.closes_schemas
+    def read_file():
+        data = load.load_schema(ArmUp, 'test.arm_up')
+        assert not data.data.closed
+        return data
+
+    assert read_file().data.closed
+    assert load._open_schemas == []
@@ -0,0 +1,133 @@
+import importlib
+import pytest
+from types import SimpleNamespace
+
+from mhdata.io import DataMap
+from mhdata.load.validate import validate_monster_rewards, _failed_group_sums
+from mhdata.load.references import Reference, check_references
+
+# mhdata.load exports a validate function that hides the module of the same name
+validate_module = importlib.import_module('mhdata.load.validate')
+
+def create_map(*names, **extradata):
+    map = DataMap(languages=['en'])
+    for name in names:
+        map.insert({ 'name': { 'en': name }, **extradata.get(name, {}) })
+    return map
+
+def test_reference_field_reports_missing_names():
+    data = SimpleNamespace(
+        item_map=create_map('Potion', 'Herb'),
+        location_map=create_map('Forest', 'Desert', **{
+            'Forest': { 'items': [{ 'item': 'Potion', 'item_lang': 'en' }, { 'item': 'Rock', 'item_lang': 'en' }] },
+            'Desert': { 'items': [{ 'item': 'Rock', 'item_lang': 'en' }, { 'item': None }] }
+        }))
+
+    reference = Reference('location_map', 'item_map', "{name} in {entry} doesn't exist",
+        field=('items', 'item'), lang_field='item_lang')
+
+    assert [(e.name('en'), name) for (e, name) in reference.missing(data)] == [('Forest', 'Rock'), ('Desert', 'Rock')]
+    assert reference.errors(data) == ["Rock in Forest doesn't exist", "Rock in Desert doesn't exist"]
+
+def test_reference_fn_uses_first_value_of_tuples():
+    data = SimpleNamespace(
+        item_map=create_map('Potion'),
+        combos=[{ 'items': [('Potion', 1), ('Rock', 2)] }, { 'items': [('Rock', 1)] }])
+
+    reference = Reference('combos', 'item_map', "{name} doesn't exist", fn=lambda c: c['items'])
+    assert check_references(data, [reference]) == ["Rock doesn't exist"]
+
+@pytest.fixture(params=['numpy', 'python'])
+def group_sums_impl(request, monkeypatch):
+    "Runs a test with the numpy group sums, and again with the pure python fallback"
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(validate_module, 'np', None)
+    return request.param
+
+def test_failed_group_sums(group_sums_impl):
+    codes = [0, 0, 1, 2, 2, 3, 3, 4]
+    values = [60, 40, 90, 50, 70, 99, 1, 100]
+    capped = [True, True, True, False, False, True]
+
+    # Group 5 has no values, so sums to 0
+    assert _failed_group_sums(codes, values, capped) == [1, 2, 5]
+
+def test_reward_percentages_warn_per_group(capsys, group_sums_impl):
+    rewards = [
+        { 'rank': 'LR', 'condition_en': 'Carve', 'item_en': 'Scale', 'percentage': 60 },
+        { 'rank': 'LR', 'condition_en': 'Carve', 'item_en': 'Scale', 'percentage': 40 },
+        { 'rank': 'HR', 'condition_en': 'Carve', 'item_en': 'Scale', 'percentage': 90 },
+        { 'rank': 'LR', 'condition_en': 'Quest Reward (Bronze)', 'item_en': 'Scale', 'percentage': 120 },
+    ]
+    data = SimpleNamespace(
+        item_map=create_map('Scale'),
+        monster_reward_conditions_map=create_map('Carve', 'Quest Reward (Bronze)'),
+        monster_map=create_map('Rathalos', 'Anjanath', **{
+            'Rathalos': { 'rewards': rewards },
+            'Anjanath': { 'rewards': [{ **rewards[0], 'item_en': 'Fang' }] }
+        }))
+
+    errors = validate_monster_rewards(data)
+    assert errors == { "Monster reward item Fang doesn't exist" }
+
+    output = capsys.readouterr().out
+    assert output == "WARNING: Rewards %'s for monster Rathalos (rank HR condition Carve) does not sum to 100\n"
+
+def test_incremental_validation_checks_changed_entries(tmpdir):
+    from mhdata.load.validation import Validator, ValidationState, run_validators
+
+    checked = []
+    def validate_names(mhdata, entries):
+        entries = mhdata.item_map.values() if entries is None else entries
+        checked.append(sorted(entry.name('en') for entry in entries))
+        return [f"{entry.name('en')} is invalid" for entry in entries if entry.get('invalid', False)]
+
+    data = SimpleNamespace(item_map=create_map('Potion', 'Herb'))
+    validators = [Validator(validate_names, source='item_map')]
+    state = ValidationState(str(tmpdir))
+
+    assert run_validators(data, validators, state=state) == []
+    assert run_validators(data, validators, state=state) == []
+    assert checked == [['Herb', 'Potion']], "expected unchanged entries to be skipped"
+
+    data.item_map[2]['invalid'] = True
+    data.item_map.insert({ 'name': { 'en': 'Antidote' } })
+    assert run_validators(data, validators, state=state) == ['Herb is invalid']
+    assert run_validators(data, validators, state=state) == ['Herb is invalid'], "failed runs should not be saved"
+    assert checked[1:] == [['Antidote', 'Herb']] * 2
+
+    assert run_validators(data, validators) == ['Herb is invalid']
+    assert checked[-1] == ['Antidote', 'Herb', 'Potion']
+
+def test_validation_reruns_when_dependencies_change():
+    from mhdata.load.validation import Validator, plan_validators, hash_entries
+
+    validator = Validator(None, source='armor_map', depends=['item_map'])
+    previous = { 'armor_map': hash_entries([1, 2]), 'item_map': hash_entries(['a']) }
+
+    assert plan_validators([validator], previous, previous) == []
+    assert plan_validators([validator], { **previous, 'armor_map': hash_entries([1, 3]) }, previous) == [(validator, [1])]
+    assert plan_validators([validator], { **previous, 'item_map': hash_entries(['b']) }, previous) == [(validator, None)]
+
+def test_reference_in_unknown_language_is_missing():
+    data = SimpleNamespace(
+        item_map=create_map('Potion'),
+        location_map=create_map('Forest', **{
+            'Forest': { 'items': [{ 'item': 'Potion', 'item_lang': 'xx' }] }
+        }))
+
+    reference = Reference('location_map', 'item_map', "{name} in {entry} doesn't exist",
+        field=('items', 'item'), lang_field='item_lang')
+    assert reference.errors(data) == ["Potion in Forest doesn't exist"]
+
+def test_unique_names_reports_lazy_language_duplicates():
+    from mhdata.load.validate import unique_name_maps, validate_unique_names
+
+    data = SimpleNamespace(**{ attr:DataMap() for attr in unique_name_maps })
+    data.item_map = DataMap(lazy_languages=['ja'])
+    data.item_map.insert({ 'name': { 'en': 'Potion', 'ja': '回復薬' } })
+    data.item_map.insert({ 'name': { 'en': 'Mega Potion', 'ja': '回復薬' } })
+
+    assert validate_unique_names(data) == ["Duplicate name (ja, 回復薬) in item_map"]
@@ -1,9 +1,11 @@
 import os
 import os.path
 import pytest
+import sqlite3
 
 from mhdata import build
-from mhdata.load import load_data, load_data_processed, validate
+from mhdata.io import DataMap
+from mhdata.load import load_data, load_data_processed, load_data_lazy, validate
 
 @pytest.fixture()
 def mhdata_raw():
@@ -16,6 +18,29 @@ def mhdata():
 def test_validates(mhdata_raw):
     assert validate(mhdata_raw), "Validation should have succeeded"
 
+def test_parallel_load_matches_sequential_load(mhdata_raw):
+    parallel_data = load_data(use_cache=False, parallel=True)
+
+    assert list(vars(parallel_data).keys()) == list(vars(mhdata_raw).keys())
+    for key, expected in vars(mhdata_raw).items():
+        loaded = getattr(parallel_data, key)
+        if isinstance(expected, DataMap):
+            assert loaded.to_dict() == expected.to_dict(), f"Expected {key} to match"
+        else:
+            assert loaded == expected, f"Expected {key} to match"
+
+def test_lazy_load_only_loads_accessed_domains():
+    data = load_data_lazy(processed=True)
+    assert data.loaded_domains() == []
+
+    decoration = next(iter(data.decoration_map.values()))
+    assert data.loaded_domains() == ['decorations']
+    assert 'chances' in decoration, "Expected lazy data to be post processed"
+
+    data.skill_map
+    data.skill_map
+    assert data.loaded_domains() == ['decorations', 'skills']
+
 def test_builds_sql(tmpdir, mhdata):
     "Integration test to ensure the database builds"
 
@@ -25,3 +50,106 @@ def test_builds_sql(tmpdir, mhdata):
 
     dbexists = os.path.exists(fname)
     assert dbexists, 'Database should have been created'
+
+def assert_same_database(fname_a, fname_b, ignore_table=''):
+    "Helper to check that two databases contain the same schema and rows"
+    conn_a = sqlite3.connect(fname_a)
+    conn_b = sqlite3.connect(fname_b)
+
+    schema_query = ("SELECT type, name, sql FROM sqlite_master " +
+        f"WHERE tbl_name != '{ignore_table}' ORDER BY type, name")
+    assert conn_a.execute(schema_query).fetchall() == conn_b.execute(schema_query).fetchall()
+
+    tables_query = ("SELECT name FROM sqlite_master " +
+        f"WHERE type='table' AND name != '{ignore_table}' ORDER BY name")
+    for (table,) in conn_a.execute(tables_query).fetchall():
+        query = f'SELECT * FROM "{table}" ORDER BY rowid'
+        rows_a = conn_a.execute(query).fetchall()
+        rows_b = conn_b.execute(query).fetchall()
+        assert rows_a == rows_b, f"Expected rows in {table} to match"
+
+def test_bulk_build_matches_orm_build(tmpdir, mhdata):
+    "The bulk insert build should create the same rows as the ORM build"
+    orm_fname = str(tmpdir.join('orm.sql'))
+    bulk_fname = str(tmpdir.join('bulk.sql'))
+    build.build_sql_database(orm_fname, mhdata)
+    build.build_sql_database(bulk_fname, mhdata, bulk=True)
+
+    assert_same_database(orm_fname, bulk_fname)
+
+def test_fast_build_matches_orm_build(tmpdir, mhdata):
+    "The in-memory build with deferred indexes should create the same database"
+    orm_fname = str(tmpdir.join('orm.sql'))
+    fast_fname = str(tmpdir.join('fast.sql'))
+    build.build_sql_database(orm_fname, mhdata)
+    build.build_sql_database(fast_fname, mhdata, bulk=True, fast=True)
+
+    assert_same_database(orm_fname, fast_fname)
+
+def test_incremental_build_rebuilds_changed_tables(tmpdir, mhdata):
+    "Changed source files should only rebuild their steps, and match a full build"
+    full_fname = str(tmpdir.join('full.sql'))
+    incremental_fname = str(tmpdir.join('incremental.sql'))
+    build.build_sql_database(full_fname, mhdata, bulk=True)
+    build.build_sql_database(incremental_fname, mhdata, bulk=True, incremental=True)
+
+    # Simulate a change to the weapon files by altering the stored hash
+    conn = sqlite3.connect(incremental_fname)
+    conn.execute("UPDATE build_manifest SET hash='changed' WHERE path='weapons/weapon_craft.csv'")
+    conn.execute("DELETE FROM weapon_recipe")
+    conn.commit()
+    conn.close()
+
+    build.build_sql_database(incremental_fname, mhdata, bulk=True, incremental=True)
+    assert_same_database(full_fname, incremental_fname, ignore_table='build_manifest')
+
+def test_parallel_build_matches_orm_build(tmpdir, mhdata):
+    "Merging per-step shard databases should create the same database"
+    orm_fname = str(tmpdir.join('orm.sql'))
+    parallel_fname = str(tmpdir.join('parallel.sql'))
+    build.build_sql_database(orm_fname, mhdata)
+    build.build_sql_database(parallel_fname, mhdata, bulk=True, parallel=True)
+
+    assert_same_database(orm_fname, parallel_fname)
+
+def test_incremental_build_rebuilds_when_code_changes(tmpdir, mhdata, monkeypatch):
+    "A database built by different code should be fully rebuilt"
+    fname = str(tmpdir.join('incremental.sql'))
+    build.build_sql_database(fname, mhdata, bulk=True, incremental=True)
+
+    rebuilt_steps = []
+    monkeypatch.setattr(build.sql, 'build_components',
+        lambda sessionbuilder, mhdata, steps=None, **kwargs: rebuilt_steps.append(steps))
+
+    build.build_sql_database(fname, mhdata, bulk=True, incremental=True)
+    assert rebuilt_steps == [], "Expected an unchanged database to be up to date"
+
+    monkeypatch.setattr(build.sql, 'get_code_signature', lambda: 'changed')
+    build.build_sql_database(fname, mhdata, bulk=True, incremental=True)
+    assert rebuilt_steps == [None], "Expected a full build"
+
+class RecordingData:
+    "Wraps loaded data, recording the attributes that are read"
+    def __init__(self, data):
+        self._data = data
+        self.read = set()
+
+    def __getattr__(self, name):
+        self.read.add(name)
+        return getattr(self._data, name)
+
+def test_build_step_sources_cover_read_data(tmpdir, mhdata):
+    "Every build step should list the source folders of all data it reads"
+    from mhdata import sql as db
+    from mhdata.build.sql import build_steps
+    from mhdata.load.loaddata import attribute_domains
+
+    sessionbuilder = db.recreate_database(str(tmpdir.join('steps.sql')), bulk=True)
+    for step in build_steps:
+        data = RecordingData(mhdata)
+        with db.session_scope(sessionbuilder) as session:
+            step.build_fn(session, data)
+
+        read_domains = { attribute_domains[attr] for attr in data.read }
+        missing = read_domains - set(step.sources)
+        assert not missing, f"{step.build_fn.__name__} reads {missing} but doesn't list them as sources"
@@ -7,3 +7,65 @@ def test_group_fields():
 
     expected = { 'level': 2, 'description': { 'en': 'test', 'ja': None } }
     assert grouped == expected, "description should have been grouped"
+
+def test_group_plan_matches_group_fields():
+    rows = [
+        { 'name_en': 'a', 'level': 2, 'description_en': 'test', 'description_ja': None },
+        { 'name_en': 'b', 'level': 3, 'description_en': 'test2', 'description_ja': 'j' }
+    ]
+    groups = ('name', 'description')
+    plan = util.GroupPlan(rows[0].keys(), groups)
+
+    for row in rows:
+        assert plan.apply(row) == util.group_fields(row, groups=groups)
+
+def test_group_plan_falls_back_for_different_rows():
+    plan = util.GroupPlan(['level', 'description_en'], ('description',))
+
+    other_keys = { 'description_en': 'test', 'level': 1, 'extra': 5 }
+    assert plan.apply(other_keys) == { 'description': { 'en': 'test' }, 'level': 1, 'extra': 5 }
+
+    already_grouped = { 'level': 1, 'description': { 'en': 'test' } }
+    assert plan.apply(already_grouped) == already_grouped
+
+def test_group_plan_excludes_keys():
+    rows = [
+        { 'id': 1, 'name_en': 'test1', 'level': 1 },
+        { 'id': 2, 'level': 2, 'name_en': 'test2' }
+    ]
+    plan = util.GroupPlan(rows[0].keys(), groups=('name',), exclude=['id'])
+    assert [plan.apply(row) for row in rows] == [
+        { 'name': { 'en': 'test1' }, 'level': 1 },
+        { 'level': 2, 'name': { 'en': 'test2' } }
+    ]
+
+def test_flatten_unflatten_roundtrip():
+    from mhdata.io.functions import iter_flatten, flatten, unflatten
+
+    nested = {
+        'a': { 'x': [{ 'v': 1 }, { 'v': 2 }], 'y': [{ 'v': 3 }] },
+        'b': { 'z': [{ 'v': 4 }] }
+    }
+    rows = flatten(nested, nest=['first', 'second'])
+    assert rows[0] == { 'first': 'a', 'second': 'x', 'v': 1 }
+    assert rows == list(iter_flatten(nested, nest=['first', 'second']))
+
+    copied_rows = [dict(row) for row in rows]
+    assert unflatten(rows, nest=['first', 'second'], leaftype='list') == nested
+    assert rows == copied_rows, "unflatten should not change its input"
+
+def test_unflatten_dict_rejects_duplicates():
+    from mhdata.io.functions import unflatten
+
+    rows = [{ 'name': 'a', 'v': 1 }, { 'name': 'a', 'v': 2 }]
+    with pytest.raises(Exception):
+        unflatten(rows, nest=['name'], leaftype='dict')
+
+def test_to_basic_copies_containers():
+    from collections import OrderedDict
+    from mhdata.io.functions import to_basic
+
+    value = OrderedDict([('a', (1, 2)), ('b', { 'c': ['d'] }), ('e', 'text')])
+    result = to_basic(value)
+    assert type(result) is dict and result == { 'a': [1, 2], 'b': { 'c': ['d'] }, 'e': 'text' }
+    assert result['b']['c'] is not value['b']['c']